@@ -17,7 +17,7 @@ from src.api.exceptions import setup_exception_handlers
 from src.utils.logger import get_logger, setup_logging
 from src.core.config import Config
 from src.core.models import QueryRequest, QueryType
-from src.api.dependencies import get_query_service, get_document_service, init_services
+from src.api.dependencies import get_query_service, get_document_service, get_ingestion_worker, init_services
 
 # Setup logging
 setup_logging()
@@ -43,6 +43,9 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
     )
 
 from src.utils.cloud_sync import CloudSyncService
+from src.utils.worker_pools import WorkerPools
+from src.core.registry import ResourceRegistry
+from src.utils.rate_scheduler import LLMPriority, llm_priority
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -67,10 +70,22 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error initializing services: {e}")
     
+    # Start draining the durable ingestion queue (recovers jobs interrupted by a crash)
+    ingestion_worker = None
+    try:
+        ingestion_worker = get_ingestion_worker()
+        await ingestion_worker.start()
+    except Exception as e:
+        logger.error(f"Error starting ingestion worker: {e}", exc_info=True)
+    
     yield
     
-    # Shutdown: Backup vector store
+    # Shutdown: Stop ingestion workers, then backup vector store
     logger.info("Shutting down LLM DocWrangler application")
+    if ingestion_worker is not None:
+        await ingestion_worker.stop()
+    WorkerPools.shutdown()
+    ResourceRegistry.close_llm_client()
     try:
         CloudSyncService.upload_vector_store()
     except Exception as e:
@@ -182,8 +197,9 @@ async def webhook_query(request: Request):
             query_type=QueryType.GENERAL
         )
         
-        # Process using real service
-        result = await query_service.process_query(query_request)
+        # Process using real service; webhook traffic yields to interactive queries for LLM capacity
+        with llm_priority(LLMPriority.BULK):
+            result = await query_service.process_query(query_request)
         
         # Map response to match old webhook format
         return {
@@ -238,8 +254,9 @@ async def webhook_insurance_claim(request: Request):
             query_type=QueryType.INSURANCE_CLAIM
         )
         
-        # Process using real service
-        result = await query_service.process_query(query_request)
+        # Process using real service; webhook traffic yields to interactive queries for LLM capacity
+        with llm_priority(LLMPriority.BULK):
+            result = await query_service.process_query(query_request)
         
         # Map response to match old webhook format
         is_approved = result.decision.decision.lower() == "approved"
@@ -1,40 +1,51 @@
-import os
-import asyncio
+import argparse
 from pathlib import Path
-from src.services.document_service import DocumentService
+from src.core.config import Config
 from src.api.dependencies import init_services, get_document_service
+from src.services.ingestion_pipeline import BulkIngestionPipeline
 from src.utils.logger import setup_logging, get_logger
 
 logger = get_logger(__name__)
 
-async def seed():
+def seed(data_dir: str, pattern: str, workers: int, batch_size: int):
     setup_logging()
     init_services()
     service = get_document_service()
     
-    data_dir = Path("data")
-    if not data_dir.exists():
+    data_path = Path(data_dir)
+    if not data_path.exists():
         print("Data directory not found.")
         return
         
-    pdf_files = list(data_dir.glob("*.pdf"))
-    if not pdf_files:
-        print("No PDF files found in data/.")
+    files = sorted(str(path) for path in data_path.glob(pattern))
+    if not files:
+        print(f"No files matching {pattern} found in {data_dir}/.")
         return
         
-    print(f"Found {len(pdf_files)} policy documents in data/. Indexing them...")
+    print(f"Found {len(files)} policy documents in {data_dir}/. Indexing them with {workers} workers...")
     
-    for pdf in pdf_files:
-        print(f"Processing {pdf.name}...")
-        try:
-            # Check if this document is already in the system
-            # Since document list matches original filename metadata, we can check list_documents
-            existing_docs = service.list_documents()
-            # Wait, list_documents returns document IDs. Let's index them normally.
-            doc_id = await service.process_document(str(pdf))
-            print(f"Successfully indexed {pdf.name}. ID: {doc_id}")
-        except Exception as e:
-            print(f"Failed to index {pdf.name}: {e}")
+    pipeline = BulkIngestionPipeline(service, workers=workers, batch_size=batch_size)
+    stats = pipeline.run(files)
+    
+    for failed in stats.failed_files:
+        print(f"Failed to index {Path(failed).name}")
+    if stats.duplicates:
+        print(f"Skipped {stats.duplicates} files that were already indexed")
+    
+    summary = stats.summary()
+    print(f"Indexed {summary['files']} files ({summary['pages']} pages, {summary['chunks']} chunks) "
+          f"in {summary['elapsed_seconds']}s")
+    print(f"Throughput: {summary['pages_per_second']} pages/s, "
+          f"{summary['chunks_per_second']} chunks/s, "
+          f"{summary['embeddings_per_second']} embeddings/s")
             
 if __name__ == "__main__":
-    asyncio.run(seed())
+    parser = argparse.ArgumentParser(description="Bulk index policy documents into the vector store")
+    parser.add_argument("--data-dir", default="data", help="Directory containing documents to index")
+    parser.add_argument("--pattern", default="*.pdf", help="Glob pattern of files to index")
+    parser.add_argument("--workers", type=int, default=Config.INGESTION_WORKERS,
+                        help="Extraction worker processes")
+    parser.add_argument("--batch-size", type=int, default=Config.EMBEDDING_BATCH_SIZE,
+                        help="Chunks per embedding batch and collection write")
+    args = parser.parse_args()
+    seed(args.data_dir, args.pattern, args.workers, args.batch_size)
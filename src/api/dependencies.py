@@ -1,9 +1,12 @@
 from src.services.document_service import DocumentService
 from src.services.query_service import QueryService
+from src.services.job_queue import JobQueue, IngestionWorker
 
 # Global instances (can be initialized at startup)
 _document_service = None
 _query_service = None
+_job_queue = None
+_ingestion_worker = None
 
 def get_document_service() -> DocumentService:
     """Get or create DocumentService instance"""
@@ -19,6 +22,20 @@ def get_query_service() -> QueryService:
         _query_service = QueryService()
     return _query_service
 
+def get_job_queue() -> JobQueue:
+    """Get or create the durable ingestion JobQueue"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+def get_ingestion_worker() -> IngestionWorker:
+    """Get or create the IngestionWorker for this process"""
+    global _ingestion_worker
+    if _ingestion_worker is None:
+        _ingestion_worker = IngestionWorker(get_job_queue(), get_document_service())
+    return _ingestion_worker
+
 def init_services():
     """Initialize services explicitly (e.g. at startup)"""
     get_document_service()
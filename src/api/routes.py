@@ -1,86 +1,110 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Request
+from typing import List, Optional, Dict, Any, Tuple
+import asyncio
 import os
 import time
 import uuid
 from pathlib import Path
 
 from src.core.models import QueryRequest, ProcessingResponse
-from src.api.dependencies import get_document_service, get_query_service
+from src.api.dependencies import get_document_service, get_query_service, get_job_queue, get_ingestion_worker
+from src.api.uploads import MultipartFileStream, UploadTooLargeError, check_content_length, save_upload
+from src.document_processor.processor_factory import ProcessorFactory
+from src.services.job_queue import JobOperation, JobStatus
 from src.core.config import Config
 from src.utils.logger import get_logger
-
-from src.utils.cloud_sync import CloudSyncService
+from src.utils.rate_scheduler import LLMPriority, llm_priority
 
 logger = get_logger(__name__)
 router = APIRouter()
 
-# Global dictionary to track progress of background indexing tasks
-processing_tasks: Dict[str, Dict[str, Any]] = {}
+# Request body of the upload endpoints, which read the multipart stream themselves
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
 
-async def process_document_background(document_id: str, file_path: str):
-    """Background task to run heavy indexing steps"""
-    try:
-        service = get_document_service()
-        await service.process_document(file_path, document_id=document_id)
-        
-        # Trigger background upload sync if configured
-        try:
-            CloudSyncService.upload_vector_store()
-        except Exception as se:
-            logger.error(f"Failed to sync vector store update to S3: {se}")
+async def _receive_upload(request: Request) -> Tuple[Path, str, str]:
+    """Validate and store an uploaded file; returns its path, SHA-256 and original filename.
 
-        processing_tasks[document_id] = {
-            "status": "completed",
-            "filename": processing_tasks[document_id]["filename"],
-            "error": None
-        }
-        logger.info(f"Background indexing completed successfully for document {document_id}")
-    except Exception as e:
-        logger.error(f"Background indexing failed for document {document_id}: {e}", exc_info=True)
-        processing_tasks[document_id] = {
-            "status": "failed",
-            "filename": processing_tasks[document_id]["filename"],
-            "error": str(e)
-        }
+    The multipart body is parsed as it arrives, so an unsupported file type
+    is rejected after its part headers and an oversized file as soon as it
+    passes MAX_FILE_SIZE (or up front, from Content-Length).
+    """
+    try:
+        check_content_length(request, Config.MAX_FILE_SIZE)
+        upload = MultipartFileStream(request)
+        filename = await upload.open()
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="File too large")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Validate file type
+    file_extension = Path(filename).suffix.lower()
+    if not ProcessorFactory.is_supported(file_extension):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    # Save uploaded file with unique name to prevent silent overwriting
+    upload_path = Path(Config.UPLOAD_DIRECTORY)
+    upload_path.mkdir(exist_ok=True)
+    
+    unique_filename = f"{uuid.uuid4().hex}_{filename}"
+    file_path = upload_path / unique_filename
+    try:
+        size, content_hash = await save_upload(upload, file_path, Config.MAX_FILE_SIZE)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="File too large")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Uploaded file {filename} (saved as {unique_filename}) size: {size} bytes sha256: {content_hash}")
+    return file_path, content_hash, filename
 
-@router.post("/upload", response_model=dict)
-async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    """Upload and process a document in the background"""
+@router.post("/upload", response_model=dict, openapi_extra=_UPLOAD_BODY)
+async def upload_document(request: Request):
+    """Upload a document and queue it for indexing"""
     try:
-        # Validate file type
-        file_extension = Path(file.filename).suffix.lower()
-        if file_extension not in ['.pdf', '.docx', '.doc', '.eml', '.msg', '.txt', '.jpg', '.jpeg', '.png']:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-        
-        # Save uploaded file with unique name to prevent silent overwriting
-        upload_path = Path(Config.UPLOAD_DIRECTORY)
-        upload_path.mkdir(exist_ok=True)
+        file_path, content_hash, filename = await _receive_upload(request)
         
-        unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
-        file_path = upload_path / unique_filename
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            if len(content) > Config.MAX_FILE_SIZE:
-                raise HTTPException(status_code=400, detail="File too large")
-            buffer.write(content)
-            logger.info(f"Uploaded file {file.filename} (saved as {unique_filename}) size: {len(content)} bytes")
-        
-        # Initialize background task tracking
-        document_id = str(uuid.uuid4())
-        processing_tasks[document_id] = {
-            "status": "processing",
-            "filename": file.filename,
-            "error": None
-        }
+        # Identical bytes resolve to the document they were already indexed as
+        catalog = get_document_service().catalog
+        document_id, is_new = await asyncio.to_thread(
+            catalog.register, content_hash, str(uuid.uuid4()), filename, str(file_path)
+        )
+        if not is_new:
+            await asyncio.to_thread(os.remove, file_path)
+            job = await asyncio.to_thread(get_job_queue().get, document_id)
+            status = "processing" if job and job["status"] in (JobStatus.QUEUED, JobStatus.PROCESSING) \
+                else "completed"
+            logger.info(f"Upload {filename} is a duplicate of document {document_id}")
+            return {
+                "message": "Document already indexed",
+                "document_id": document_id,
+                "filename": filename,
+                "status": status,
+                "duplicate": True
+            }
         
-        # Queue the indexing task
-        background_tasks.add_task(process_document_background, document_id, str(file_path))
+        # Queue the indexing job in the durable job queue
+        try:
+            await asyncio.to_thread(
+                get_job_queue().enqueue, document_id, str(file_path), filename, content_hash
+            )
+        except Exception:
+            await asyncio.to_thread(catalog.release, document_id)
+            raise
+        get_ingestion_worker().notify()
         
         return {
             "message": "Document upload accepted and indexing started in the background",
             "document_id": document_id,
-            "filename": file.filename,
+            "filename": filename,
             "status": "processing"
         }
         
@@ -98,7 +122,8 @@ async def process_query(request: QueryRequest):
         
         # Process the query
         service = get_query_service()
-        result = await service.process_query(request)
+        with llm_priority(LLMPriority.INTERACTIVE):
+            result = await service.process_query(request)
         
         processing_time = time.time() - start_time
         result.processing_time = processing_time
@@ -123,6 +148,68 @@ async def list_documents():
         logger.error(f"Error listing documents: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/documents/duplicates", response_model=dict)
+async def list_duplicates(limit: int = 100):
+    """List recently detected duplicate uploads"""
+    try:
+        catalog = get_document_service().catalog
+        duplicates = await asyncio.to_thread(catalog.duplicates, limit)
+        return {"duplicates": duplicates, "count": len(duplicates)}
+    except Exception as e:
+        logger.error(f"Error listing duplicates: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/documents/{document_id}", response_model=dict, openapi_extra=_UPLOAD_BODY)
+async def update_document(document_id: str, request: Request):
+    """Upload a new version of a document and queue an incremental re-index"""
+    try:
+        file_path, content_hash, filename = await _receive_upload(request)
+        
+        catalog = get_document_service().catalog
+        current = await asyncio.to_thread(catalog.get, document_id)
+        if current and current["content_hash"] == content_hash:
+            await asyncio.to_thread(os.remove, file_path)
+            return {
+                "message": "Document content is unchanged",
+                "document_id": document_id,
+                "filename": filename,
+                "status": "completed"
+            }
+        
+        owner = await asyncio.to_thread(catalog.reassign, document_id, content_hash, filename, str(file_path))
+        if owner != document_id:
+            await asyncio.to_thread(os.remove, file_path)
+            raise HTTPException(status_code=409, detail=f"Identical content is already indexed as document {owner}")
+        
+        try:
+            await asyncio.to_thread(
+                get_job_queue().enqueue, document_id, str(file_path), filename, content_hash,
+                JobOperation.UPDATE
+            )
+        except ValueError as e:
+            # An earlier job is still running; put the catalog back the way it was
+            if current:
+                await asyncio.to_thread(catalog.reassign, document_id, current["content_hash"],
+                                        current["filename"], current["file_path"])
+            else:
+                await asyncio.to_thread(catalog.release, document_id)
+            await asyncio.to_thread(os.remove, file_path)
+            raise HTTPException(status_code=409, detail=str(e))
+        get_ingestion_worker().notify()
+        
+        return {
+            "message": "Document update accepted and re-indexing started in the background",
+            "document_id": document_id,
+            "filename": filename,
+            "status": "processing"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating document {document_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/documents/{document_id}")
 async def delete_document(document_id: str):
     """Delete a document from the system"""
@@ -148,7 +235,10 @@ async def get_stats():
         stats = {
             "total_documents": get_document_service().get_document_count(),
             "upload_directory": Config.UPLOAD_DIRECTORY,
-            "vector_store_path": Config.CHROMA_PERSIST_DIRECTORY
+            "vector_store_path": Config.CHROMA_PERSIST_DIRECTORY,
+            "query_embedding_cache": get_query_service().get_cache_stats(),
+            "ingestion_jobs": get_job_queue().counts(),
+            "document_catalog": get_document_service().catalog.stats()
         }
         return stats
     except HTTPException:
@@ -160,7 +250,16 @@ async def get_stats():
 @router.get("/tasks/{document_id}", response_model=dict)
 async def get_task_status(document_id: str):
     """Get the status of a background document indexing task"""
-    task = processing_tasks.get(document_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task or document ID not found")
-    return task
\ No newline at end of file
+    job = await asyncio.to_thread(get_job_queue().get, document_id)
+    if not job:
+        # Finished jobs expire from the queue; the catalog still knows the document
+        entry = await asyncio.to_thread(get_document_service().catalog.get, document_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Task or document ID not found")
+        return {"status": JobStatus.COMPLETED, "filename": entry["filename"], "error": None, "attempts": 0}
+    return {
+        "status": job["status"],
+        "filename": job["filename"],
+        "error": job["error"],
+        "attempts": job["attempts"]
+    }
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Streaming upload handling
+"""
+import asyncio
+import hashlib
+import os
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Deque, Dict, Tuple, Union
+
+from fastapi import Request, UploadFile
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Size of each block read from the request and written to disk
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+# Allowance for multipart boundaries and part headers when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+    pass
+
+
+class MultipartFileStream:
+    """The file part of a multipart/form-data request, read as the body arrives.
+
+    Unlike an `UploadFile` parameter, which Starlette only hands over once
+    the whole body has been received and spooled, this parses the request
+    stream incrementally, so the caller can stop reading (and reject the
+    upload) at any point. At most one received network chunk is buffered.
+    """
+
+    def __init__(self, request: Request, field_name: str = "file"):
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise ValueError("Expected a multipart/form-data upload")
+        self.field_name = field_name.encode()
+        self.filename = ""
+        self._stream = request.stream().__aiter__()
+        self._events: Deque[Tuple[str, Any]] = deque()
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._parser = MultipartParser(options[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self._events.append(("headers", self._headers)),
+            "on_part_data": lambda data, start, end: self._events.append(("data", bytes(data[start:end]))),
+            "on_part_end": lambda: self._events.append(("end", None)),
+        })
+
+    async def open(self) -> str:
+        """Read up to the start of the file's content and return its filename"""
+        while True:
+            kind, headers = await self._next_event()
+            if kind != "headers":
+                continue
+            _, options = parse_options_header(headers.get(b"content-disposition", b""))
+            if options.get(b"name") == self.field_name and b"filename" in options:
+                self.filename = options[b"filename"].decode("utf-8", errors="replace")
+                return self.filename
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """The file's content, in the blocks it arrives in"""
+        while True:
+            kind, data = await self._next_event()
+            if kind == "end":
+                return
+            if kind == "data" and data:
+                yield data
+
+    async def _next_event(self) -> Tuple[str, Any]:
+        while not self._events:
+            try:
+                chunk = await self._stream.__anext__()
+            except StopAsyncIteration:
+                raise ValueError(f"Upload has no complete '{self.field_name.decode()}' file part") from None
+            if chunk:
+                self._parser.write(chunk)
+        return self._events.popleft()
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+
+def check_content_length(request: Request, max_size: int) -> None:
+    """Reject an upload whose declared body size cannot fit under `max_size`, before reading it"""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_size + MULTIPART_OVERHEAD:
+        raise UploadTooLargeError(f"Upload exceeds the {max_size} byte limit")
+
+
+async def _read_blocks(file: UploadFile, block_size: int) -> AsyncIterator[bytes]:
+    while True:
+        block = await file.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+async def save_upload(source: Union[UploadFile, AsyncIterable[bytes]], destination: Path, max_size: int,
+                      block_size: int = UPLOAD_BLOCK_SIZE) -> Tuple[int, str]:
+    """Stream an upload to `destination` block by block.
+
+    `source` is an `UploadFile` (read in `block_size` blocks) or an async
+    iterable of blocks such as a `MultipartFileStream`. The SHA-256 of the
+    content is computed while streaming, and reading stops as soon as the
+    upload exceeds `max_size`. Data is written to a `.part` file that is
+    only renamed to `destination` once complete, so rejected or failed
+    uploads never leave a partial file behind. Peak memory is one block.
+
+    Returns the size in bytes and the hex SHA-256 digest.
+    """
+    blocks = _read_blocks(source, block_size) if isinstance(source, UploadFile) else source
+    partial_path = destination.with_name(destination.name + ".part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(partial_path, "wb") as buffer:
+            async for block in blocks:
+                size += len(block)
+                if size > max_size:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_size} byte limit")
+                digest.update(block)
+                await asyncio.to_thread(buffer.write, block)
+        os.replace(partial_path, destination)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise
+
+    return size, digest.hexdigest()
@@ -21,6 +21,20 @@ class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")  # Updated to replace decommissioned llama3-70b-8192
     GROQ_VISION_MODEL = os.getenv("GROQ_VISION_MODEL", "llama-3.2-11b-vision-preview")
+    # Shared LLM client: requests in flight, per-attempt timeout and retries with jittered backoff
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+    # Client-side budgets per minute (0 = rely on the provider's rate limit headers) and the
+    # completion size assumed when reserving tokens for a call
+    LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+    LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+    LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "512"))
+    # Budgets are enforced per process: ingestion worker processes (vision OCR) split this fraction of
+    # LLM_MAX_CONCURRENCY / LLM_RPM_LIMIT / LLM_TPM_LIMIT between them and the app process gets the rest.
+    # With several server workers, divide the limits by their number.
+    LLM_INGESTION_SHARE = float(os.getenv("LLM_INGESTION_SHARE", "0.25"))
 
     # Vector DB
     CHROMA_PERSIST_DIRECTORY = os.getenv(
@@ -28,13 +42,69 @@ class Config:
         os.path.join("data", "vector_store", "local_chroma_db"),
     )
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "insurance_docs")
+    # Lexical (BM25) inverted index, stored next to the Chroma directory
+    BM25_INDEX_PATH = os.getenv(
+        "BM25_INDEX_PATH",
+        os.path.join("data", "vector_store", "bm25_index.db"),
+    )
+    # Content-hash catalog of indexed files, used to skip re-indexing identical uploads
+    DOCUMENT_CATALOG_PATH = os.getenv(
+        "DOCUMENT_CATALOG_PATH",
+        os.path.join("data", "vector_store", "document_catalog.db"),
+    )
 
     # Document processing / retrieval
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # Token cap per chunk; all-MiniLM-L6-v2 truncates at 256 tokens including two special
+    # tokens, and a little slack covers words cut at chunk edges. 0 disables the cap.
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "250"))
+    # Bulk ingestion: extraction worker processes and chunks per embedding batch
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", str(os.cpu_count() or 1)))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    # Files at least this large are streamed page by page, in EMBEDDING_BATCH_SIZE chunk batches,
+    # on upload, update and bulk ingestion; keep it below MAX_FILE_SIZE for uploads to ever stream
+    STREAMING_INGESTION_MIN_BYTES = int(os.getenv("STREAMING_INGESTION_MIN_BYTES", "8388608"))  # 8MB
+    # Durable ingestion job queue
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join("data", "ingestion_jobs.db"))
+    INGESTION_CONCURRENCY = int(os.getenv("INGESTION_CONCURRENCY", "2"))  # jobs per app worker
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "86400"))  # keep finished jobs for a day
+    # Threads for embedding, vector store writes and other blocking ingestion IO
+    INGESTION_IO_THREADS = int(os.getenv("INGESTION_IO_THREADS", "4"))
+    # PDFs with at least this many pages are extracted in page ranges across the process pool
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+    # Extra document processors, registered in the app and every worker process: ".ext=module:Class,..."
+    PROCESSOR_PLUGINS = os.getenv("PROCESSOR_PLUGINS", "")
+    # Hybrid PDF OCR: pages with less extracted text than this are OCRed ("off" disables it)
+    PDF_OCR_MODE = os.getenv("PDF_OCR_MODE", "hybrid")
+    OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "vision")  # "vision" (Groq) or "stub" (placeholder text, no API key)
+    OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "4"))  # OCR calls in flight per process
+    # OCR output cache keyed by image content hash; empty disables it
+    OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("data", "vector_store", "ocr_cache.db"))
+    # Images are downscaled to this longest side, grayscaled and recompressed before OCR
+    OCR_MAX_IMAGE_SIDE = int(os.getenv("OCR_MAX_IMAGE_SIDE", "1600"))
+    OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+    # Email attachments extracted at once per message
+    EMAIL_ATTACHMENT_CONCURRENCY = int(os.getenv("EMAIL_ATTACHMENT_CONCURRENCY", "4"))
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "5"))
+    # Content-addressed chunk embedding cache used at ingestion; empty disables it
+    EMBEDDING_CACHE_PATH = os.getenv(
+        "EMBEDDING_CACHE_PATH",
+        os.path.join("data", "vector_store", "embedding_cache.db"),
+    )
+    # Query embedding LRU cache; set a spill path to keep evicted entries on disk
+    QUERY_EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_BYTES", "8388608"))  # 8MB
+    QUERY_EMBEDDING_CACHE_SPILL_PATH = os.getenv("QUERY_EMBEDDING_CACHE_SPILL_PATH", "")
     # Fix #2: Read from env var; default 0.3 is a sensible middle ground
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.3"))
+    # Settle queries that a deterministic rule decides from the regex parse and request context, before any LLM call or retrieval
+    RULES_FAST_PATH = os.getenv("RULES_FAST_PATH", "true").lower() == "true"
+    # "two_call": LLM parse, then LLM decision; "combined": local parse and a single LLM call that does both
+    PIPELINE_MODE = os.getenv("PIPELINE_MODE", "two_call")
 
     # API — Fix #3: default to 8000 to match uvicorn convention
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
@@ -35,6 +35,16 @@ class DocumentChunk(BaseModel):
     metadata: Dict[str, Any]
     embedding: Optional[List[float]] = None
 
+class ParsedDocument(BaseModel):
+    text: str
+    metadata: Dict[str, Any]
+    page_offsets: Optional[List[int]] = Field(None, description="Offset in text where each page starts")
+    tables: List[List[List[str]]] = Field(default_factory=list, description="Rows of cell text per table")
+    parts: List[Dict[str, Any]] = Field(default_factory=list, description="MIME parts of an email")
+    attachments: List[Dict[str, Any]] = Field(default_factory=list, description="Extracted attachments and the text range each occupies")
+    headings: List[Dict[str, Any]] = Field(default_factory=list, description="Offset, level and text of each heading")
+    section_offsets: Optional[List[int]] = Field(None, description="Offset in text where each section starts")
+
 class RetrievalResult(BaseModel):
     chunk_id: str
     document_id: str
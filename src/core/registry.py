@@ -0,0 +1,161 @@
+"""
+Process-wide registry of heavy shared resources
+"""
+import threading
+from typing import Any, Optional
+
+from src.core.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ResourceRegistry:
+    """Owns the embedding model, the Chroma client/collection and the LLM client.
+
+    Each resource is created at most once per process, under a lock, and the
+    same instance is handed to every service. This keeps a single copy of the
+    SentenceTransformer model in memory and a single PersistentClient on the
+    Chroma directory, even when several `asyncio.to_thread` calls race on
+    first use.
+    """
+
+    _lock = threading.RLock()
+    _heavy_deps_available: Optional[bool] = None
+    _embedding_model: Any = None
+    _tokenizer: Any = None
+    _tokenizer_loaded = False
+    _chroma_client: Any = None
+    _collection: Any = None
+    _llm_client: Any = None
+    _vector_store: Any = None
+
+    @classmethod
+    def heavy_deps_available(cls) -> bool:
+        """Check once whether chromadb and sentence-transformers can be imported"""
+        if cls._heavy_deps_available is None:
+            with cls._lock:
+                if cls._heavy_deps_available is None:
+                    try:
+                        import chromadb  # noqa: F401
+                        logger.info("ChromaDB imported successfully")
+                        import sentence_transformers  # noqa: F401
+                        logger.info("SentenceTransformers imported successfully")
+                        cls._heavy_deps_available = True
+                    except ImportError as e:
+                        logger.warning(f"Heavy dependencies not found: {e}. Running in lightweight mode.")
+                        cls._heavy_deps_available = False
+                    except Exception as e:
+                        logger.error(f"Error during initialization of heavy dependencies: {e}", exc_info=True)
+                        cls._heavy_deps_available = False
+        return cls._heavy_deps_available
+
+    @classmethod
+    def get_embedding_model(cls):
+        """Get the shared SentenceTransformer model"""
+        if cls._embedding_model is None:
+            with cls._lock:
+                if cls._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    logger.info(f"Loading embedding model: {Config.EMBEDDING_MODEL}")
+                    cls._embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        return cls._embedding_model
+
+    @classmethod
+    def get_tokenizer(cls):
+        """Get the embedding model's tokenizer, or None when it cannot be loaded.
+
+        Chunking runs in worker processes that never load the embedding
+        model, so the tokenizer is loaded on its own there.
+        """
+        if not cls._tokenizer_loaded:
+            with cls._lock:
+                if not cls._tokenizer_loaded:
+                    cls._tokenizer = cls._load_tokenizer()
+                    cls._tokenizer_loaded = True
+        return cls._tokenizer
+
+    @classmethod
+    def _load_tokenizer(cls):
+        if cls._embedding_model is not None:
+            return getattr(cls._embedding_model, "tokenizer", None)
+        if not cls.heavy_deps_available():
+            return None
+        try:
+            from transformers import AutoTokenizer
+            name = Config.EMBEDDING_MODEL
+            if "/" not in name:
+                name = f"sentence-transformers/{name}"
+            return AutoTokenizer.from_pretrained(name)
+        except Exception as e:
+            logger.warning(f"Embedding model tokenizer unavailable, approximating token counts: {e}")
+            return None
+
+    @classmethod
+    def get_chroma_client(cls):
+        """Get the shared ChromaDB persistent client"""
+        if cls._chroma_client is None:
+            with cls._lock:
+                if cls._chroma_client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    logger.info("Initializing ChromaDB client...")
+                    cls._chroma_client = chromadb.PersistentClient(
+                        path=Config.CHROMA_PERSIST_DIRECTORY,
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+        return cls._chroma_client
+
+    @classmethod
+    def get_collection(cls):
+        """Get the shared document collection"""
+        if cls._collection is None:
+            with cls._lock:
+                if cls._collection is None:
+                    cls._collection = cls.get_chroma_client().get_or_create_collection(
+                        name=Config.COLLECTION_NAME,
+                        metadata={"hnsw:space": "cosine"}
+                    )
+        return cls._collection
+
+    @classmethod
+    def get_llm_client(cls):
+        """Get the shared LLM client (one connection pool and concurrency limit per process)"""
+        if cls._llm_client is None:
+            with cls._lock:
+                if cls._llm_client is None:
+                    from src.utils.llm_client import LLMClient
+                    cls._llm_client = LLMClient()
+        return cls._llm_client
+
+    @classmethod
+    def close_llm_client(cls) -> None:
+        """Close the LLM client's connections (called on application shutdown)"""
+        with cls._lock:
+            client, cls._llm_client = cls._llm_client, None
+        if client is not None:
+            client.close()
+
+    @classmethod
+    def get_vector_store(cls):
+        """Get the shared VectorStore used by all services"""
+        if cls._vector_store is None:
+            with cls._lock:
+                if cls._vector_store is None:
+                    from src.retrieval.vector_store import VectorStore
+                    cls._vector_store = VectorStore()
+        return cls._vector_store
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop all shared instances (used by tests)"""
+        cls.close_llm_client()
+        with cls._lock:
+            cls._heavy_deps_available = None
+            cls._embedding_model = None
+            cls._tokenizer = None
+            cls._tokenizer_loaded = False
+            cls._chroma_client = None
+            cls._collection = None
+            cls._llm_client = None
+            cls._vector_store = None
@@ -1,21 +1,34 @@
-from typing import List, Dict, Any, Optional
-from groq import Groq
+from typing import List, Dict, Any, Optional, Tuple
 from src.core.models import ParsedQuery, RetrievalResult, DecisionResult
 from src.core.config import Config
 from src.decision_engine.rules import RulesEngine
+from src.core.registry import ResourceRegistry
+from src.query_engine.parser import LLM_QUERY_FIELDS
 import json
 
 class DecisionEvaluator:
     """Evaluate queries against retrieved documents to make decisions"""
     
     def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
+        self.client = ResourceRegistry.get_llm_client()
         self.model = Config.GROQ_MODEL
     
     def evaluate(self, parsed_query: ParsedQuery, 
                  retrieved_docs: List[RetrievalResult],
                  context: Optional[Dict[str, Any]] = None) -> DecisionResult:
         """Evaluate query against retrieved documents"""
+        return self.client.run(self.evaluate_async(parsed_query, retrieved_docs, context))
+    
+    def evaluate_combined(self, parsed_query: ParsedQuery,
+                          retrieved_docs: List[RetrievalResult],
+                          context: Optional[Dict[str, Any]] = None) -> Tuple[ParsedQuery, DecisionResult]:
+        """Blocking form of `evaluate_combined_async`"""
+        return self.client.run(self.evaluate_combined_async(parsed_query, retrieved_docs, context))
+    
+    async def evaluate_async(self, parsed_query: ParsedQuery,
+                             retrieved_docs: List[RetrievalResult],
+                             context: Optional[Dict[str, Any]] = None) -> DecisionResult:
+        """Evaluate without holding a thread while the LLM call is in flight"""
         
         # Run deterministic rules pre-screening first
         rule_decision = RulesEngine.evaluate_rules(parsed_query, context)
@@ -23,15 +36,7 @@ class DecisionEvaluator:
             return rule_decision
         
         if not retrieved_docs:
-            return DecisionResult(
-                decision="insufficient_information",
-                payment_mode="unknown",
-                amount=None,
-                justification="No relevant documents found to make a decision",
-                source_clauses=[],
-                confidence_score=0.0,
-                metadata={}
-            )
+            return self._no_documents()
         
         # Prepare context for LLM
         context = self._prepare_context(retrieved_docs)
@@ -40,40 +45,96 @@ class DecisionEvaluator:
         decision_prompt = self._create_decision_prompt(parsed_query, context)
         
         try:
-            # Call Groq API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": decision_prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            # Parse response
-            text = response.choices[0].message.content
-            decision_data = json.loads(text)
-            
-            return DecisionResult(
-                decision=decision_data.get("decision", "pending"),
-                payment_mode=decision_data.get("payment_mode", "unknown"),
-                amount=decision_data.get("amount"),
-                justification=decision_data.get("justification", ""),
-                source_clauses=decision_data.get("source_clauses", []),
-                confidence_score=decision_data.get("confidence_score", 0.5),
-                metadata=decision_data.get("metadata", {})
-            )
+            decision_data = await self._complete(decision_prompt)
+            return self._decision_from_json(decision_data)
             
         except Exception as e:
-            return DecisionResult(
-                decision="error",
-                payment_mode="unknown",
-                amount=None,
-                justification=f"Error in decision evaluation: {str(e)}",
-                source_clauses=[],
-                confidence_score=0.0,
-                metadata={}
+            return self._error(e)
+    
+    async def evaluate_combined_async(self, parsed_query: ParsedQuery,
+                                      retrieved_docs: List[RetrievalResult],
+                                      context: Optional[Dict[str, Any]] = None) -> Tuple[ParsedQuery, DecisionResult]:
+        """Extract the LLM query fields and decide in a single LLM call.
+
+        `parsed_query` is the local (regex) parse. Returns it enriched with
+        the extracted fields, together with the decision. Rules are applied
+        before the call and again on the extracted fields, as they would be
+        after a separate LLM parse.
+        """
+        rule_decision = RulesEngine.evaluate_rules(parsed_query, context)
+        if rule_decision is not None:
+            return parsed_query, rule_decision
+        
+        if not retrieved_docs:
+            return parsed_query, self._no_documents()
+        
+        prompt = self._create_combined_prompt(parsed_query, self._prepare_context(retrieved_docs))
+        try:
+            data = await self._complete(prompt)
+        except Exception as e:
+            return parsed_query, self._error(e)
+        
+        fields = data.pop("extracted_fields", None)
+        if isinstance(fields, dict):
+            parsed_query = parsed_query.model_copy(
+                update={"structured_data": {**parsed_query.structured_data, **fields}}
             )
+            rule_decision = RulesEngine.evaluate_rules(parsed_query, context)
+            if rule_decision is not None:
+                return parsed_query, rule_decision
+        
+        try:
+            return parsed_query, self._decision_from_json(data)
+        except Exception as e:
+            return parsed_query, self._error(e)
+    
+    async def _complete(self, prompt: str) -> Dict[str, Any]:
+        """Send a decision prompt to the LLM and parse its JSON reply"""
+        text = await self.client.chat(
+            [
+                {"role": "system", "content": self._get_system_prompt()},
+                {"role": "user", "content": prompt}
+            ],
+            model=self.model,
+            json_response=True
+        )
+        return json.loads(text)
+    
+    @staticmethod
+    def _decision_from_json(decision_data: Dict[str, Any]) -> DecisionResult:
+        return DecisionResult(
+            decision=decision_data.get("decision", "pending"),
+            payment_mode=decision_data.get("payment_mode", "unknown"),
+            amount=decision_data.get("amount"),
+            justification=decision_data.get("justification", ""),
+            source_clauses=decision_data.get("source_clauses", []),
+            confidence_score=decision_data.get("confidence_score", 0.5),
+            metadata=decision_data.get("metadata", {})
+        )
+    
+    @staticmethod
+    def _no_documents() -> DecisionResult:
+        return DecisionResult(
+            decision="insufficient_information",
+            payment_mode="unknown",
+            amount=None,
+            justification="No relevant documents found to make a decision",
+            source_clauses=[],
+            confidence_score=0.0,
+            metadata={}
+        )
+    
+    @staticmethod
+    def _error(error: Exception) -> DecisionResult:
+        return DecisionResult(
+            decision="error",
+            payment_mode="unknown",
+            amount=None,
+            justification=f"Error in decision evaluation: {str(error)}",
+            source_clauses=[],
+            confidence_score=0.0,
+            metadata={}
+        )
     
     def _prepare_context(self, retrieved_docs: List[RetrievalResult]) -> str:
         """Prepare context from retrieved documents"""
@@ -128,6 +189,15 @@ class DecisionEvaluator:
         4. **Justification**: Must cite the exact section/clause used.
         """
     
+    def _create_combined_prompt(self, parsed_query: ParsedQuery, context: str) -> str:
+        """Decision prompt that also asks for the fields the LLM query parse would extract"""
+        return f"""
+        First, extract structured information from the original query below, returning it under
+        "extracted_fields" with these fields if present:{LLM_QUERY_FIELDS}
+        Take the extracted fields into account in your decision, and add "extracted_fields" as an
+        extra top-level key of the JSON response described below.
+        {self._create_decision_prompt(parsed_query, context)}"""
+    
     def _get_system_prompt(self) -> str:
         """Get system prompt for decision making"""
         return """
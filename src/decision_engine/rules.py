@@ -40,9 +40,10 @@ class RulesEngine:
             except (ValueError, TypeError):
                 claim_amount = None
 
-        # 2. Rule: Explicit Exclusions
+        # 2. Rule: Explicit Exclusions (only on a named procedure; a mention in
+        #    free text may be negated, e.g. "not cosmetic surgery")
         for exclusion in cls.STANDARD_EXCLUSIONS:
-            if exclusion in procedure:
+            if procedure and exclusion in procedure:
                 return DecisionResult(
                     decision="rejected",
                     payment_mode="unknown",
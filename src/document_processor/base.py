@@ -1,10 +1,32 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
-from src.core.models import DocumentChunk, DocumentType
+from typing import List, Dict, Any, Iterator, Tuple
+from src.core.config import Config
+from src.core.models import DocumentChunk, DocumentType, ParsedDocument
+from src.core.registry import ResourceRegistry
+from .chunker import TextChunker
+
+
+def join_pages(pages: List[str]) -> Tuple[str, List[int]]:
+    """Join page texts with newlines; returns the text and the offset at which each page starts"""
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1
+    text = "\n".join(pages)
+    stripped = text.lstrip()
+    lead = len(text) - len(stripped)
+    return stripped.rstrip(), [max(0, offset - lead) for offset in offsets]
+
 
 class BaseDocumentProcessor(ABC):
     """Base class for document processors"""
     
+    # True when iter_segments yields one segment per page
+    paged = False
+    # Whether one instance can serve every document (no per-document state)
+    reusable = True
+    
     @abstractmethod
     def extract_text(self, file_path: str) -> str:
         """Extract text content from document"""
@@ -15,52 +37,32 @@ class BaseDocumentProcessor(ABC):
         """Extract metadata from document"""
         pass
     
+    def parse(self, file_path: str) -> ParsedDocument:
+        """Extract text, metadata and structural hints in a single pass over the file.
+
+        Processors that would otherwise open and parse the file twice
+        override this; `extract_text` and `extract_metadata` remain for
+        callers that need only one of the two.
+        """
+        return ParsedDocument(text=self.extract_text(file_path), metadata=self.extract_metadata(file_path))
+    
+    def iter_segments(self, file_path: str) -> Iterator[str]:
+        """Yield the document text in consecutive pieces (pages, parts, blocks).
+
+        The concatenation of the segments is the document text. Processors
+        that can read incrementally override this so very large files never
+        have to be held in memory as a whole.
+        """
+        yield self.parse(file_path).text
+    
+    def make_chunker(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> TextChunker:
+        """Chunker that also keeps chunks within CHUNK_MAX_TOKENS embedding model tokens"""
+        max_tokens = Config.CHUNK_MAX_TOKENS
+        tokenizer = ResourceRegistry.get_tokenizer() if max_tokens else None
+        return TextChunker(chunk_size, chunk_overlap, max_tokens=max_tokens or None, tokenizer=tokenizer)
+    
     def chunk_document(self, text: str, document_id: str, chunk_size: int = 1000, 
                       chunk_overlap: int = 200) -> List[DocumentChunk]:
         """Split document into chunks for processing"""
-        if chunk_size <= 0:
-            chunk_size = 1000
-        if chunk_overlap >= chunk_size or chunk_overlap < 0:
-            chunk_overlap = chunk_size // 5  # default to 20% of chunk size to avoid loops
-
-        chunks = []
-        start = 0
-        chunk_id = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            chunk_text = text[start:end]
-            
-            # Try to break at logical layout boundary (double newline, single newline, period)
-            if end < len(text):
-                last_double_newline = chunk_text.rfind('\n\n')
-                if last_double_newline > chunk_size // 2:
-                    end = start + last_double_newline + 2
-                    chunk_text = text[start:end]
-                else:
-                    last_newline = chunk_text.rfind('\n')
-                    if last_newline > chunk_size // 2:
-                        end = start + last_newline + 1
-                        chunk_text = text[start:end]
-                    else:
-                        last_period = chunk_text.rfind('.')
-                        if last_period > chunk_size // 2:
-                            end = start + last_period + 1
-                            chunk_text = text[start:end]
-            
-            chunk = DocumentChunk(
-                chunk_id=f"{document_id}_chunk_{chunk_id}",
-                document_id=document_id,
-                content=chunk_text.strip(),
-                metadata={
-                    "chunk_index": chunk_id,
-                    "start_position": start,
-                    "end_position": end
-                }
-            )
-            chunks.append(chunk)
-            
-            start = end - chunk_overlap
-            chunk_id += 1
-            
-        return chunks
\ No newline at end of file
+        records = self.make_chunker(chunk_size, chunk_overlap).iter_records([text])
+        return [record.to_chunk(document_id) for record in records]
@@ -0,0 +1,172 @@
+"""
+Linear-time text chunker sized in characters and embedding model tokens
+"""
+import re
+import string
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.core.models import DocumentChunk
+
+# Approximates word-piece tokens when the model tokenizer is unavailable
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_WORD_BYTES = (string.ascii_letters + string.digits + "_" + string.whitespace).encode()
+
+
+class ChunkRecord:
+    """Lightweight chunk produced by the chunker; converted to a DocumentChunk once, at the end"""
+    __slots__ = ("index", "start", "end", "text")
+
+    def __init__(self, index: int, start: int, end: int, text: str):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def to_chunk(self, document_id: str, metadata: Optional[Dict[str, Any]] = None) -> DocumentChunk:
+        chunk_metadata = {
+            "chunk_index": self.index,
+            "start_position": self.start,
+            "end_position": self.end
+        }
+        if metadata:
+            chunk_metadata.update(metadata)
+        return DocumentChunk(
+            chunk_id=f"{document_id}_chunk_{self.index}",
+            document_id=document_id,
+            content=self.text,
+            metadata=chunk_metadata
+        )
+
+
+def page_span(start: int, end: int, page_offsets: List[int]) -> Tuple[int, int]:
+    """1-based first and last page covered by the text range [start, end)"""
+    return bisect_right(page_offsets, start), bisect_right(page_offsets, max(start, end - 1))
+
+
+class TextChunker:
+    """Splits text into overlapping chunks at layout boundaries.
+
+    A chunk is at most `chunk_size` characters and, when `max_tokens` is
+    set, at most `max_tokens` model tokens. Only each chunk's candidate
+    window is tokenized, and only when it could hold more tokens than the
+    cap. Boundaries are found with bounded `str.rfind` calls on the buffer
+    instead of scanning sliced copies of each window, so chunking is linear
+    in the input size.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 max_tokens: Optional[int] = None, tokenizer: Any = None):
+        if chunk_size <= 0:
+            chunk_size = 1000
+        if chunk_overlap >= chunk_size or chunk_overlap < 0:
+            chunk_overlap = chunk_size // 5  # default to 20% of chunk size to avoid loops
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # Every token spans at least one character, so a cap of chunk_size or more never applies
+        self.max_tokens = max(1, max_tokens) if max_tokens and max_tokens < chunk_size else None
+        self.tokenizer = tokenizer
+        # Matches the first `max_tokens` pattern tokens; a word must run to its end, so a
+        # failed match does not backtrack into splitting words
+        self._capped = re.compile(r"(?:\s*(?:\w+(?!\w)|[^\w\s])){%d}" % self.max_tokens) if self.max_tokens else None
+
+    def _token_limit(self, buffer: str, base: int, start: int, limit: int) -> int:
+        """Start of the first token past the cap in the window [start, limit), or `limit`"""
+        lo = start - base
+        hi = limit - base
+        if self.tokenizer is not None:
+            encoding = self.tokenizer(buffer[lo:hi], add_special_tokens=False, return_offsets_mapping=True,
+                                      return_attention_mask=False, verbose=False)
+            offsets = encoding["offset_mapping"]
+            return start + offsets[self.max_tokens][0] if len(offsets) > self.max_tokens else limit
+        # Cheap upper bound on the pattern's tokens: each other byte adds at most one word and itself
+        window = buffer[lo:hi]
+        if len(window.split()) + 2 * len(window.encode().translate(None, _WORD_BYTES)) <= self.max_tokens:
+            return limit
+        match = self._capped.match(buffer, lo, hi)
+        if match is None:
+            return limit
+        following = _TOKEN_PATTERN.search(buffer, match.end(), hi)
+        return base + following.start() if following else limit
+
+    def iter_records(self, segments: Iterable[str], segment_offsets: Optional[List[int]] = None,
+                     breaks: Optional[List[int]] = None) -> Iterator[ChunkRecord]:
+        """Chunk a stream of text segments, yielding each chunk as soon as it is complete.
+
+        Only the text from the current chunk start onwards is buffered. When
+        `segment_offsets` is given, the offset at which each segment starts
+        is appended to it as the segment is consumed. `breaks` are sorted
+        offsets of structural boundaries (headings, sections); a chunk ends
+        at one in preference to any layout boundary, and the next chunk then
+        starts there without overlap.
+        """
+        breaks = breaks or []
+        break_set = set(breaks)
+        buffer = ""
+        base = 0  # offset of buffer[0] in the whole text
+        start = 0
+        index = 0
+
+        for segment in segments:
+            total = base + len(buffer)
+            if segment_offsets is not None:
+                segment_offsets.append(total)
+            buffer += segment
+            total += len(segment)
+
+            # A chunk is final once the text extends past its maximum end
+            while start + self.chunk_size < total:
+                end, limit = self._chunk_end(buffer, base, start, total, breaks)
+                yield ChunkRecord(index, start, end, buffer[start - base:end - base].strip())
+                start = end if end in break_set else self._next_start(start, end, limit)
+                index += 1
+
+            buffer = buffer[start - base:]
+            base = start
+
+        total = base + len(buffer)
+        while start < total:
+            end, limit = self._chunk_end(buffer, base, start, total, breaks)
+            yield ChunkRecord(index, start, end, buffer[start - base:end - base].strip())
+            start = end if end in break_set else self._next_start(start, end, limit)
+            index += 1
+
+    def _next_start(self, start: int, end: int, limit: int) -> int:
+        # Shrink the overlap with the window when the token cap narrowed it
+        overlap = self.chunk_overlap * (limit - start) // self.chunk_size
+        return max(end - overlap, start + 1)
+
+    def _chunk_end(self, buffer: str, base: int, start: int, total: int,
+                   breaks: List[int]) -> Tuple[int, int]:
+        """End of the chunk starting at `start`, at a logical layout boundary where possible.
+
+        Also returns the window the end was chosen from, which is narrower
+        than `chunk_size` when the token cap applies.
+        """
+        limit = start + self.chunk_size
+        if self.max_tokens is not None:
+            # A token cut by the chunk start still counts
+            limit = self._token_limit(buffer, base, start, min(limit, total))
+        if limit >= total:
+            return start + self.chunk_size, start + self.chunk_size
+
+        # Prefer a structural boundary, unless it would leave a very short chunk
+        if breaks:
+            position = bisect_right(breaks, limit) - 1
+            if position >= 0 and breaks[position] - start > (limit - start) // 4:
+                return breaks[position], limit
+
+        # Try to break at logical layout boundary (double newline, single newline, period)
+        lo = start - base
+        hi = limit - base
+        half = (limit - start) // 2
+        position = buffer.rfind('\n\n', lo, hi)
+        if position != -1 and position - lo > half:
+            return base + position + 2, limit
+        position = buffer.rfind('\n', lo, hi)
+        if position != -1 and position - lo > half:
+            return base + position + 1, limit
+        position = buffer.rfind('.', lo, hi)
+        if position != -1 and position - lo > half:
+            return base + position + 1, limit
+        return limit, limit
@@ -1,50 +1,251 @@
-from docx import Document
-from typing import Dict, Any
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Tuple
 from .base import BaseDocumentProcessor
+from src.core.models import ParsedDocument
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_CORE_NAMESPACES = {
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+}
+_HEADING_STYLE = re.compile(r"heading\s*(\d)", re.IGNORECASE)
+
+
+class DocxBlock(NamedTuple):
+    """A top-level paragraph or table of the document body"""
+    text: str
+    heading_level: Optional[int] = None  # set for headings (1 for the document title)
+    rows: Optional[List[List[str]]] = None  # cell text per row, for tables
+    ends_section: bool = False
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[DocxBlock]:
+    """Stream the body of a DOCX file as blocks, in document order.
+
+    `word/document.xml` is read with an incremental parser and each block
+    is released once it has been yielded, so memory stays bounded by the
+    largest paragraph or table rather than the document.
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        depth = 0
+        body = None
+        for event, element in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    body = element
+                continue
+
+            depth -= 1
+            if depth != 2:
+                continue
+            if element.tag == _W + "p":
+                yield _paragraph_block(element)
+            elif element.tag == _W + "tbl":
+                rows = _table_rows(element)
+                yield DocxBlock(text="\n".join(" | ".join(cell for cell in row if cell) for row in rows),
+                                rows=rows)
+            body.clear()
+
+
+def count_docx_blocks(file_path: str) -> Tuple[int, int]:
+    """Number of top-level paragraphs and tables, counted without reading their text"""
+    paragraphs = tables = 0
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        depth = 0
+        body = None
+        for event, element in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    body = element
+                continue
+
+            depth -= 1
+            if depth != 2:
+                continue
+            if element.tag == _W + "p":
+                paragraphs += 1
+            elif element.tag == _W + "tbl":
+                tables += 1
+            body.clear()
+    return paragraphs, tables
+
+
+def _paragraph_block(paragraph: ET.Element) -> DocxBlock:
+    properties = paragraph.find(_W + "pPr")
+    level = None
+    ends_section = False
+    if properties is not None:
+        style = properties.find(_W + "pStyle")
+        style_id = style.get(_W + "val", "") if style is not None else ""
+        match = _HEADING_STYLE.match(style_id)
+        if match:
+            level = int(match.group(1))
+        elif style_id.lower() == "title":
+            level = 1
+        outline = properties.find(_W + "outlineLvl")
+        if level is None and outline is not None and outline.get(_W + "val", "").isdigit():
+            level = int(outline.get(_W + "val")) + 1
+        ends_section = properties.find(_W + "sectPr") is not None
+    return DocxBlock(text=_paragraph_text(paragraph), heading_level=level, ends_section=ends_section)
+
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == _W + "t":
+            parts.append(node.text or "")
+        elif node.tag == _W + "tab":
+            parts.append("\t")
+        elif node.tag in (_W + "br", _W + "cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _table_rows(table: ET.Element) -> List[List[str]]:
+    """Cell text per row, with each merged cell appearing once"""
+    rows = []
+    for row in table.iterfind(_W + "tr"):
+        cells = []
+        for cell in row.iterfind(_W + "tc"):
+            properties = cell.find(_W + "tcPr")
+            if properties is not None:
+                vertical_merge = properties.find(_W + "vMerge")
+                # Continuation of a cell merged from the row above
+                if vertical_merge is not None and vertical_merge.get(_W + "val", "continue") == "continue":
+                    continue
+            # A horizontally merged cell is a single w:tc, whatever its gridSpan
+            cells.append("\n".join(_paragraph_text(p) for p in cell.iter(_W + "p")).strip())
+        rows.append(cells)
+    return rows
+
 
 class DocxProcessor(BaseDocumentProcessor):
-    """DOCX document processor"""
-    
+    """DOCX document processor.
+
+    The body XML is walked once in document order, so paragraphs and tables
+    are interleaved as they appear. Headings and section breaks start a new
+    blank-line separated block, which the chunker prefers as a split point,
+    and their offsets are returned for chunk metadata.
+    """
+
     def extract_text(self, file_path: str) -> str:
         """Extract text from DOCX file"""
+        return self.parse(file_path).text
+
+    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
+        """Extract metadata from DOCX without building its text (streaming ingestion reads it first)"""
         try:
-            doc = Document(file_path)
-            text = ""
-            
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            
-            # Extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + " "
-                    text += "\n"
-            
-            return text.strip()
-            
+            metadata = self._metadata(file_path)
+            metadata["paragraph_count"], metadata["table_count"] = count_docx_blocks(file_path)
+            return metadata
+        except Exception as e:
+            return {"file_type": "docx", "file_path": file_path, "extraction_error": str(e)}
+
+    def parse(self, file_path: str) -> ParsedDocument:
+        """Extract text, tables, headings, sections and metadata in one pass over the body"""
+        try:
+            pieces: List[str] = []
+            length = 0
+            tables = []
+            headings = []
+            section_offsets = [0]
+            paragraph_count = 0
+            for block, separator in self._separated(iter_docx_blocks(file_path)):
+                if block.rows is not None:
+                    tables.append(block.rows)
+                else:
+                    paragraph_count += 1
+                length += len(separator)
+                if block.heading_level is not None and block.text.strip():
+                    headings.append({"start": length, "level": block.heading_level, "text": block.text.strip()})
+                pieces.append(separator)
+                pieces.append(block.text)
+                length += len(block.text)
+                if block.ends_section:
+                    section_offsets.append(length)
+
+            text = "".join(pieces)
+            metadata = self._metadata(file_path)
+            metadata.update({"paragraph_count": paragraph_count, "table_count": len(tables)})
+
         except Exception as e:
             raise Exception(f"Error processing DOCX: {str(e)}") from e
-    
-    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
-        """Extract metadata from DOCX"""
+
+        # A break after the last paragraph does not start a new section
+        section_offsets = [offset for offset in section_offsets if offset < len(text.rstrip())]
+        return ParsedDocument(text=text.rstrip(), metadata=metadata, tables=tables,
+                              headings=headings, section_offsets=section_offsets)
+
+    def iter_segments(self, file_path: str) -> Iterator[str]:
+        """Yield the text of one block at a time"""
+        try:
+            for block, separator in self._separated(iter_docx_blocks(file_path)):
+                yield separator + block.text
+        except Exception as e:
+            raise Exception(f"Error processing DOCX: {str(e)}") from e
+
+    @staticmethod
+    def _separated(blocks: Iterator[DocxBlock]) -> Iterator[Tuple[DocxBlock, str]]:
+        """Pair each non-empty block with the separator that precedes it.
+
+        Headings and the first block of a section are preceded by a blank
+        line; other blocks by a newline.
+        """
+        first = True
+        new_section = False
+        for block in blocks:
+            if block.text.strip():
+                if first:
+                    separator = ""
+                elif block.heading_level is not None or new_section:
+                    separator = "\n\n"
+                else:
+                    separator = "\n"
+                first = False
+                new_section = False
+                yield block, separator
+            else:
+                yield block._replace(text=""), ""
+            if block.ends_section:
+                new_section = True
+
+    @staticmethod
+    def _metadata(file_path: str) -> Dict[str, Any]:
         metadata = {"file_type": "docx", "file_path": file_path}
-        
+
         try:
-            doc = Document(file_path)
-            core_props = doc.core_properties
-            
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+                core = ET.fromstring(archive.read("docProps/core.xml")) if "docProps/core.xml" in names else None
+
+            def prop(name: str) -> str:
+                node = core.find(name, _CORE_NAMESPACES) if core is not None else None
+                return (node.text or "").strip() if node is not None else ""
+
             metadata.update({
-                "title": core_props.title or "",
-                "author": core_props.author or "",
-                "subject": core_props.subject or "",
-                "created": str(core_props.created) if core_props.created else "",
-                "modified": str(core_props.modified) if core_props.modified else "",
-                "paragraph_count": len(doc.paragraphs),
-                "table_count": len(doc.tables)
+                "title": prop("dc:title"),
+                "author": prop("dc:creator"),
+                "subject": prop("dc:subject"),
+                "created": DocxProcessor._timestamp(prop("dcterms:created")),
+                "modified": DocxProcessor._timestamp(prop("dcterms:modified")),
             })
-            
+
         except Exception as e:
             metadata["extraction_error"] = str(e)
-        
-        return metadata
\ No newline at end of file
+
+        return metadata
+
+    @staticmethod
+    def _timestamp(value: str) -> str:
+        """Format a W3CDTF core property timestamp as str(datetime), as python-docx reports it"""
+        if not value:
+            return ""
+        try:
+            return str(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            return value
@@ -1,55 +1,195 @@
-import email
-from typing import Dict, Any
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from .base import BaseDocumentProcessor
+from .processor_factory import ProcessorFactory
+from src.core.config import Config
+from src.core.models import ParsedDocument
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
 
 class EmailProcessor(BaseDocumentProcessor):
-    """Email document processor"""
-    
+    """Email document processor.
+
+    Messages are parsed from bytes, including messages nested inside them.
+    Attachments are extracted concurrently by the processor registered for
+    their file extension and their text follows the body, so a claim email
+    and everything attached to it are indexed as one document.
+    """
+
     def extract_text(self, file_path: str) -> str:
         """Extract text from email file"""
+        return self.parse(file_path).text
+
+    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
+        """Extract metadata from email"""
+        try:
+            msg = self._read(file_path)
+            metadata = self._metadata(file_path, msg)
+            metadata["attachment_count"] = len(self._split(msg)[1])
+            return metadata
+        except Exception as e:
+            return {"file_type": "email", "file_path": file_path, "extraction_error": str(e)}
+
+    def parse(self, file_path: str) -> ParsedDocument:
+        """Extract headers, body, MIME parts and attachments from a single read of the message.
+
+        Each extracted attachment records the range of the text it occupies
+        (starting at its "[Attachment: ...]" line), so chunks can be traced
+        back to it.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                msg = email.message_from_file(file)
-            
+            msg = self._read(file_path)
+            body, attachments, parts = self._split(msg)
+
             text = ""
-            
-            # Extract headers
-            text += f"From: {msg.get('From', '')}\n"
-            text += f"To: {msg.get('To', '')}\n"
-            text += f"Subject: {msg.get('Subject', '')}\n"
-            text += f"Date: {msg.get('Date', '')}\n\n"
-            
-            # Extract body
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        text += part.get_payload(decode=True).decode('utf-8', errors='ignore')
-            else:
-                text += msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-            
-            return text.strip()
-            
+            ranges = []
+            for segment, attachment in self._segments(msg, body, attachments):
+                if attachment is not None:
+                    attachment["start"] = len(text)
+                    if attachment.get("page_offsets"):
+                        # Page offsets become offsets in the email text; page 1 includes the heading line
+                        content_start = len(text) + len(segment) - len(attachment["text"])
+                        attachment["page_offsets"] = [len(text)] + [
+                            content_start + offset for offset in attachment["page_offsets"][1:]
+                        ]
+                    attachment["end"] = len(text) + len(segment)
+                    del attachment["text"]
+                    ranges.append(attachment)
+                text += segment
+
         except Exception as e:
             raise Exception(f"Error processing email: {str(e)}") from e
-    
-    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
-        """Extract metadata from email"""
-        metadata = {"file_type": "email", "file_path": file_path}
-        
+
+        metadata = self._metadata(file_path, msg)
+        metadata["attachment_count"] = len(attachments)
+        metadata["attachments_extracted"] = len(ranges)
+        return ParsedDocument(text=text.strip(), metadata=metadata, parts=parts, attachments=ranges)
+
+    def iter_segments(self, file_path: str) -> Iterator[str]:
+        """Yield the headers, each plain-text part, then the text of each attachment"""
+        msg = self._read(file_path)
+        body, attachments, _ = self._split(msg)
+        for segment, _ in self._segments(msg, body, attachments):
+            yield segment
+
+    def _segments(self, msg: EmailMessage, body: List[str],
+                  attachments: List[EmailMessage]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Text pieces of the message, with attachment details for the attachment pieces"""
+        yield self._headers(msg), None
+        for text in body:
+            yield text, None
+        for attachment in self._extract_attachments(attachments):
+            if attachment is not None:
+                yield f"\n\n[Attachment: {attachment['filename']}]\n{attachment['text']}", attachment
+
+    @staticmethod
+    def _split(msg: EmailMessage) -> Tuple[List[str], List[EmailMessage], List[Dict[str, Any]]]:
+        """Body texts, attachment parts and a description of every MIME part.
+
+        `walk` descends into attached messages, so their bodies and
+        attachments are included too. Inline images referenced from the
+        body (signature logos such as image001.png) are only treated as
+        attachments when the message has no other content.
+        """
+        body: List[str] = []
+        attachments: List[EmailMessage] = []
+        inline_images: List[EmailMessage] = []
+        parts: List[Dict[str, Any]] = []
+        for part in msg.walk():
+            if msg.is_multipart():
+                parts.append({
+                    "content_type": part.get_content_type(),
+                    "filename": part.get_filename() or ""
+                })
+            if part.is_multipart():
+                continue
+            disposition = part.get_content_disposition()
+            if part.get_content_maintype() == "image" and part["Content-ID"] and disposition != "attachment":
+                inline_images.append(part)
+            elif part.get_filename() or disposition == "attachment":
+                attachments.append(part)
+            elif part.get_content_type() == "text/plain" or not msg.is_multipart():
+                body.append(EmailProcessor._decode(part))
+        if not attachments and not any(text.strip() for text in body):
+            attachments = inline_images
+        return body, attachments, parts
+
+    def _extract_attachments(self, attachments: List[EmailMessage]) -> List[Optional[Dict[str, Any]]]:
+        """Extract every attachment's text concurrently, keeping attachment order"""
+        if not attachments:
+            return []
+        workers = max(1, min(Config.EMAIL_ATTACHMENT_CONCURRENCY, len(attachments)))
+        with tempfile.TemporaryDirectory(prefix="email-attachments-") as directory:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-attachment") as executor:
+                futures = [executor.submit(self._extract_attachment, part, index, directory)
+                           for index, part in enumerate(attachments)]
+                return [future.result() for future in futures]
+
+    @staticmethod
+    def _extract_attachment(part: EmailMessage, index: int, directory: str) -> Optional[Dict[str, Any]]:
+        filename = part.get_filename() or f"attachment-{index}"
+        extension = Path(filename).suffix.lower()
+        if not ProcessorFactory.is_supported(extension):
+            logger.info(f"Skipping attachment {filename}: unsupported file type")
+            return None
+
+        # Processors read from a path, so the payload is written to a scratch file
+        file_path = os.path.join(directory, f"{index}{extension}")
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                msg = email.message_from_file(file)
-            
-            metadata.update({
-                "from": msg.get('From', ''),
-                "to": msg.get('To', ''),
-                "subject": msg.get('Subject', ''),
-                "date": msg.get('Date', ''),
-                "message_id": msg.get('Message-ID', ''),
-                "content_type": msg.get_content_type()
-            })
-            
+            with open(file_path, 'wb') as file:
+                file.write(part.get_payload(decode=True) or b"")
+            parsed = ProcessorFactory.get_processor_by_extension(extension).parse(file_path)
         except Exception as e:
-            metadata["extraction_error"] = str(e)
-        
-        return metadata
\ No newline at end of file
+            logger.warning(f"Could not extract attachment {filename}: {e}")
+            return None
+
+        text = parsed.text.strip()
+        if not text:
+            return None
+        return {
+            "index": index,
+            "filename": filename,
+            "content_type": part.get_content_type(),
+            "file_type": parsed.metadata.get("file_type", ""),
+            "text": text,
+            "page_offsets": parsed.page_offsets if parsed.text == text else None,
+        }
+
+    @staticmethod
+    def _decode(part: EmailMessage) -> str:
+        payload = part.get_payload(decode=True) or b""
+        try:
+            return payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+        except LookupError:
+            return payload.decode('utf-8', errors='ignore')
+
+    @staticmethod
+    def _headers(msg: EmailMessage) -> str:
+        return (f"From: {msg.get('From', '')}\nTo: {msg.get('To', '')}\n"
+                f"Subject: {msg.get('Subject', '')}\nDate: {msg.get('Date', '')}\n\n")
+
+    @staticmethod
+    def _read(file_path: str) -> EmailMessage:
+        with open(file_path, 'rb') as file:
+            return BytesParser(policy=policy.default).parse(file)
+
+    @staticmethod
+    def _metadata(file_path: str, msg: EmailMessage) -> Dict[str, Any]:
+        return {
+            "file_type": "email",
+            "file_path": file_path,
+            "from": str(msg.get('From', '')),
+            "to": str(msg.get('To', '')),
+            "subject": str(msg.get('Subject', '')),
+            "date": str(msg.get('Date', '')),
+            "message_id": str(msg.get('Message-ID', '')),
+            "content_type": msg.get_content_type()
+        }
@@ -1,53 +1,25 @@
-import base64
 import mimetypes
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .base import BaseDocumentProcessor
-from groq import Groq
-from src.core.config import Config
+from .ocr import OCRBackend, get_ocr_backend, ocr_image_bytes
 
 class ImageProcessor(BaseDocumentProcessor):
-    """Processor for image files (JPG, PNG) using Groq Vision"""
+    """Processor for image files (JPG, PNG) using the OCR backend (Groq Vision by default)"""
     
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
-        self.model = Config.GROQ_VISION_MODEL
+    def __init__(self, ocr_backend: Optional[OCRBackend] = None):
+        self.ocr_backend = ocr_backend or get_ocr_backend()
     
     def extract_text(self, file_path: str) -> str:
-        """Extract text from image using Groq Vision"""
+        """Extract text from image using the OCR backend (cached by image content)"""
         try:
-            prompt = """
-            You are an expert OCR system for insurance documents. 
-            Transcribe the text from this image exactly as it appears. 
-            Preserve the structure, headings, and key details like policy numbers, names, and coverage limits.
-            If the image is blurry or unreadable, state that clearly.
-            """
-            
-            # Read and encode image in base64
             with open(file_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+                image = image_file.read()
             
             mime_type, _ = mimetypes.guess_type(file_path)
             if not mime_type:
                 mime_type = "image/jpeg"
                 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{encoded_string}"
-                                }
-                            }
-                        ]
-                    }
-                ]
-            )
-            return response.choices[0].message.content
+            return ocr_image_bytes(self.ocr_backend, image, mime_type)
         except Exception as e:
             raise Exception(f"Error processing image: {str(e)}") from e
     
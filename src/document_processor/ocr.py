@@ -0,0 +1,209 @@
+"""
+Pluggable OCR backends used for images and scanned PDF pages
+"""
+import base64
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple, Type
+
+from PIL import Image, ImageOps
+
+from src.core.config import Config
+from src.core.registry import ResourceRegistry
+from src.utils.logger import get_logger
+from src.utils.rate_scheduler import LLMPriority
+
+logger = get_logger(__name__)
+
+OCR_PROMPT = """
+You are an expert OCR system for insurance documents.
+Transcribe the text from this image exactly as it appears.
+Preserve the structure, headings, and key details like policy numbers, names, and coverage limits.
+If the image is blurry or unreadable, state that clearly.
+"""
+
+
+class OCRBackend(ABC):
+    """Turns an image into text"""
+
+    name = "base"
+
+    def cache_key(self) -> str:
+        """Identifies this backend's output in the OCR cache"""
+        return self.name
+
+    @abstractmethod
+    def recognize(self, image: bytes, mime_type: str = "image/jpeg") -> str:
+        """Text in `image`"""
+        pass
+
+
+class VisionOCRBackend(OCRBackend):
+    """OCR through the Groq vision model"""
+
+    name = "vision"
+
+    def __init__(self, model: Optional[str] = None):
+        self.client = ResourceRegistry.get_llm_client()
+        self.model = model or Config.GROQ_VISION_MODEL
+
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def recognize(self, image: bytes, mime_type: str = "image/jpeg") -> str:
+        encoded_string = base64.b64encode(image).decode('utf-8')
+        return self.client.chat_sync(
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": OCR_PROMPT},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{encoded_string}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            model=self.model,
+            priority=LLMPriority.BULK
+        )
+
+
+class StubOCRBackend(OCRBackend):
+    """Stand-in that needs no API key, for local runs and tests: returns a placeholder per image"""
+
+    name = "stub"
+
+    def recognize(self, image: bytes, mime_type: str = "image/jpeg") -> str:
+        return f"[Image not transcribed: {mime_type}, {len(image)} bytes]"
+
+
+_BACKENDS: Dict[str, Type[OCRBackend]] = {
+    VisionOCRBackend.name: VisionOCRBackend,
+    StubOCRBackend.name: StubOCRBackend,
+}
+
+
+def register_ocr_backend(backend: Type[OCRBackend]) -> None:
+    """Make a backend selectable through OCR_BACKEND"""
+    _BACKENDS[backend.name] = backend
+
+
+def get_ocr_backend(name: Optional[str] = None) -> OCRBackend:
+    """Create the configured OCR backend"""
+    name = name or Config.OCR_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return _BACKENDS[name]()
+
+
+class OCRCache:
+    """SQLite-backed store of OCR output keyed by `(image hash, backend)`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            " key TEXT NOT NULL, backend TEXT NOT NULL, text TEXT NOT NULL,"
+            " PRIMARY KEY (key, backend)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, backend: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_results WHERE key = ? AND backend = ?", (key, backend)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, backend: str, text: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, backend, text) VALUES (?, ?, ?)",
+                (key, backend, text)
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, OCRCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """The process-wide OCR cache at OCR_CACHE_PATH, or None when caching is disabled"""
+    path = Config.OCR_CACHE_PATH
+    if not path:
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                _caches[path] = OCRCache(path)
+            except Exception as e:
+                logger.error(f"Could not open OCR cache: {e}")
+                return None
+        return _caches[path]
+
+
+def preprocess_image(image: bytes, mime_type: str = "image/jpeg", max_side: Optional[int] = None,
+                     quality: Optional[int] = None) -> Tuple[bytes, str]:
+    """Downscale, grayscale and recompress an image as JPEG before OCR.
+
+    Images are scaled so their longest side is at most `max_side` pixels.
+    Returns the new bytes and MIME type; images Pillow cannot read are
+    returned unchanged so the backend can still try them.
+    """
+    max_side = max_side or Config.OCR_MAX_IMAGE_SIDE
+    quality = quality or Config.OCR_JPEG_QUALITY
+    try:
+        with Image.open(io.BytesIO(image)) as source:
+            processed = ImageOps.exif_transpose(source).convert("L")
+            processed.thumbnail((max_side, max_side))
+            output = io.BytesIO()
+            processed.save(output, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not pre-process image for OCR, sending it as is: {e}")
+        return image, mime_type
+    return output.getvalue(), "image/jpeg"
+
+
+def ocr_image_bytes(backend: OCRBackend, image: bytes, mime_type: str = "image/jpeg") -> str:
+    """OCR an image through `backend`, reusing cached output for identical images.
+
+    The cache is keyed by the SHA-256 of the original bytes together with
+    the backend and pre-processing settings, so a repeated upload costs no
+    backend call. Cache misses are pre-processed before they are sent.
+    Empty output is not cached, so a transient failure can be retried.
+    """
+    cache = get_ocr_cache()
+    key = hashlib.sha256(image).hexdigest()
+    backend_key = f"{backend.cache_key()}:{Config.OCR_MAX_IMAGE_SIDE}:{Config.OCR_JPEG_QUALITY}"
+    if cache is not None:
+        cached = cache.get(key, backend_key)
+        if cached is not None:
+            return cached
+
+    text = backend.recognize(*preprocess_image(image, mime_type))
+    if cache is not None and text.strip():
+        cache.put(key, backend_key, text)
+    return text
@@ -1,43 +1,223 @@
+import mimetypes
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
 import pypdf
-from typing import Dict, Any
-from .base import BaseDocumentProcessor
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from .base import BaseDocumentProcessor, join_pages
+from .ocr import OCRBackend, get_ocr_backend, ocr_image_bytes
+from src.core.config import Config
+from src.core.models import ParsedDocument
+from src.utils.logger import get_logger
+from src.utils.worker_pools import WorkerPools
+
+logger = get_logger(__name__)
+
+
+# A page's text and, when its text layer is too sparse, the images to OCR instead
+PageContent = Tuple[str, Optional[List[Tuple[bytes, str]]]]
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[PageContent]:
+    """Read pages [start, stop) with `read_page` (runs in a worker process)"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = pypdf.PdfReader(file)
+        return [read_page(pdf_reader.pages[i]) for i in range(start, stop)]
+
+
+def page_count(file_path: str) -> int:
+    """Number of pages, read from the page tree without extracting any text"""
+    with open(file_path, 'rb') as file:
+        return len(pypdf.PdfReader(file).pages)
+
+
+def page_images(page: pypdf.PageObject) -> List[Tuple[bytes, str]]:
+    """Raw bytes and MIME type of every image drawn on a page"""
+    images = []
+    for image in page.images:
+        mime_type, _ = mimetypes.guess_type(image.name)
+        images.append((image.data, mime_type or "image/jpeg"))
+    return images
+
+
+def needs_ocr(text: str) -> bool:
+    """Whether a page's extracted text is too sparse to use in hybrid OCR mode"""
+    return Config.PDF_OCR_MODE == "hybrid" and len(text.strip()) < Config.OCR_MIN_PAGE_CHARS
+
+
+def read_page(page: pypdf.PageObject) -> PageContent:
+    """A page's text, with its images when it needs OCR, from the one reader already open"""
+    text = page.extract_text()
+    if not needs_ocr(text):
+        return text, None
+    try:
+        return text, page_images(page)
+    except Exception as e:
+        logger.warning(f"Could not read images for OCR: {e}")
+        return text, []
+
 
 class PDFProcessor(BaseDocumentProcessor):
-    """PDF document processor"""
+    """PDF document processor.
+
+    In hybrid OCR mode, pages without a usable text layer (scans) are sent
+    through the OCR backend, while pages with text are extracted as usual.
+    """
+    
+    paged = True
+    
+    def __init__(self, ocr_backend: Optional[OCRBackend] = None):
+        self._ocr_backend = ocr_backend
+    
+    @property
+    def ocr_backend(self) -> OCRBackend:
+        """OCR backend, created on first use so text-only PDFs never need one"""
+        if self._ocr_backend is None:
+            self._ocr_backend = get_ocr_backend()
+        return self._ocr_backend
     
     def extract_text(self, file_path: str) -> str:
         """Extract text from PDF file"""
-        text = ""
+        return self.parse(file_path).text
+    
+    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
+        """Extract metadata from PDF"""
+        try:
+            with open(file_path, 'rb') as file:
+                return self._metadata(file_path, pypdf.PdfReader(file))
+        except Exception as e:
+            return {"file_type": "pdf", "file_path": file_path, "extraction_error": str(e)}
+    
+    def parse(self, file_path: str) -> ParsedDocument:
+        """Extract text, page offsets and metadata with a single PdfReader.
+
+        Large PDFs are split into contiguous page ranges that are extracted
+        in parallel on the ingestion process pool. The images of pages
+        without a text layer are collected in the same pass (by the shard
+        workers for large PDFs) and OCRed concurrently.
+        """
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = pypdf.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                metadata = self._metadata(file_path, pdf_reader)
+                shards = self._page_ranges(len(pdf_reader.pages))
+                if len(shards) <= 1:
+                    pages, ocr_pages = self._collect(read_page(page) for page in pdf_reader.pages)
+            
+            if len(shards) > 1:
+                executor = WorkerPools.cpu_executor()
+                futures = [executor.submit(extract_page_range, file_path, start, stop) for start, stop in shards]
+                pages, ocr_pages = self._collect(page for future in futures for page in future.result())
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}") from e
         
-        return text.strip()
+        if ocr_pages:
+            metadata["ocr_pages"] = ocr_pages
+            metadata["ocr_backend"] = self.ocr_backend.name
+        text, page_offsets = join_pages(pages)
+        return ParsedDocument(text=text, metadata=metadata, page_offsets=page_offsets)
     
-    def extract_metadata(self, file_path: str) -> Dict[str, Any]:
-        """Extract metadata from PDF"""
-        metadata = {"file_type": "pdf", "file_path": file_path}
-        
+    def iter_segments(self, file_path: str) -> Iterator[str]:
+        """Yield the text of one page at a time, in order, while later pages are OCRed"""
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = pypdf.PdfReader(file)
-                
-                if pdf_reader.metadata:
-                    metadata.update({
-                        "title": pdf_reader.metadata.get("/Title", ""),
-                        "author": pdf_reader.metadata.get("/Author", ""),
-                        "subject": pdf_reader.metadata.get("/Subject", ""),
-                        "creator": pdf_reader.metadata.get("/Creator", ""),
-                        "creation_date": str(pdf_reader.metadata.get("/CreationDate", "")),
-                    })
-                
-                metadata["page_count"] = len(pdf_reader.pages)
-                
+                for text, _ in self._with_ocr(read_page(page) for page in pdf_reader.pages):
+                    yield text + "\n"
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}") from e
+    
+    def _collect(self, pages: Iterable[PageContent]) -> Tuple[List[str], List[int]]:
+        """Page texts, with OCR text for sparse pages, and the 1-based numbers of the OCRed pages"""
+        texts = []
+        ocr_pages = []
+        for number, (text, from_ocr) in enumerate(self._with_ocr(pages), 1):
+            texts.append(text)
+            if from_ocr:
+                ocr_pages.append(number)
+        return texts, ocr_pages
+    
+    def _with_ocr(self, pages: Iterable[PageContent]) -> Iterator[Tuple[str, bool]]:
+        """Each page's text in order, and whether it came from OCR.
+
+        OCR calls run on the bounded OCR thread pool while later pages are
+        read; at most two OCR pages per OCR thread are in flight at once.
+        """
+        pending: "deque[Tuple[str, Optional[List[Future]]]]" = deque()
+        in_flight = 0
+        window = 2 * max(1, Config.OCR_CONCURRENCY)
+        
+        def finish(text: str, futures: Optional[List[Future]]) -> Tuple[str, bool]:
+            ocr_text = self._join_ocr(futures) if futures is not None else ""
+            return (ocr_text, True) if ocr_text else (text, False)
+        
+        for text, images in pages:
+            futures = None
+            if images is not None:
+                futures = self._submit_ocr(images)
+                in_flight += 1
+            pending.append((text, futures))
+            # Yield what is ready; wait on the oldest OCR page only once the window is full
+            while pending:
+                head = pending[0][1]
+                if head is not None and in_flight < window and not all(f.done() for f in head):
+                    break
+                if head is not None:
+                    in_flight -= 1
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+    
+    def _submit_ocr(self, images: List[Tuple[bytes, str]]) -> List[Future]:
+        executor = WorkerPools.ocr_executor()
+        return [executor.submit(ocr_image_bytes, self.ocr_backend, data, mime_type) for data, mime_type in images]
+    
+    @staticmethod
+    def _join_ocr(futures: List[Future]) -> str:
+        """OCR text of a page's images; empty if OCR failed or found nothing"""
+        texts = []
+        for future in futures:
+            try:
+                texts.append(future.result().strip())
+            except Exception as e:
+                logger.warning(f"OCR failed for a PDF page image: {e}")
+        return "\n".join(t for t in texts if t)
+    
+    @staticmethod
+    def _page_ranges(page_count: int) -> List[Tuple[int, int]]:
+        """Split pages into one contiguous range per worker, or a single range for small PDFs"""
+        # Worker processes extract serially; the parent already parallelizes across them
+        if page_count < Config.PDF_PARALLEL_MIN_PAGES or multiprocessing.parent_process() is not None:
+            return [(0, page_count)]
+        
+        min_shard = max(1, Config.PDF_PARALLEL_MIN_PAGES // 2)
+        shard_count = max(1, min(Config.INGESTION_WORKERS, page_count // min_shard))
+        size, extra = divmod(page_count, shard_count)
+        ranges = []
+        start = 0
+        for i in range(shard_count):
+            stop = start + size + (1 if i < extra else 0)
+            ranges.append((start, stop))
+            start = stop
+        return ranges
+    
+    @staticmethod
+    def _metadata(file_path: str, pdf_reader: pypdf.PdfReader) -> Dict[str, Any]:
+        metadata = {"file_type": "pdf", "file_path": file_path}
+        
+        try:
+            if pdf_reader.metadata:
+                metadata.update({
+                    "title": pdf_reader.metadata.get("/Title", ""),
+                    "author": pdf_reader.metadata.get("/Author", ""),
+                    "subject": pdf_reader.metadata.get("/Subject", ""),
+                    "creator": pdf_reader.metadata.get("/Creator", ""),
+                    "creation_date": str(pdf_reader.metadata.get("/CreationDate", "")),
+                })
+            
+            metadata["page_count"] = len(pdf_reader.pages)
+            
         except Exception as e:
             metadata["extraction_error"] = str(e)
         
-        return metadata
\ No newline at end of file
+        return metadata
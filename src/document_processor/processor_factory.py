@@ -1,50 +1,151 @@
-from typing import Dict, Type
+import importlib
+import threading
+from typing import Any, Dict, List, Type, Union
 from .base import BaseDocumentProcessor
-from .pdf_processor import PDFProcessor
-from .docx_processor import DocxProcessor
-from .email_processor import EmailProcessor
-from .text_processor import TextProcessor
-from .image_processor import ImageProcessor
+from src.core.config import Config
 from src.core.models import DocumentType
 
+# A processor given as a "module:Class" path (imported on first use), a class or an instance
+ProcessorSpec = Union[str, Type[BaseDocumentProcessor], BaseDocumentProcessor]
+
+
 class ProcessorFactory:
-    """Factory for creating document processors"""
-    
-    _processors: Dict[DocumentType, Type[BaseDocumentProcessor]] = {
-        DocumentType.PDF: PDFProcessor,
-        DocumentType.DOCX: DocxProcessor,
-        DocumentType.EMAIL: EmailProcessor,
-        DocumentType.TEXT: TextProcessor,
-        DocumentType.IMAGE: ImageProcessor,
+    """Registry of document processors by document type and file extension.
+
+    Processor modules are imported only when a processor is first needed,
+    so importing the factory does not pull in pypdf, python-docx or the OCR
+    client. Processors that are safe to share (`reusable`) are created once
+    and handed out for every document.
+
+    Registrations are class state, so they only exist in the process that
+    made them. Extra formats that must also work in the ingestion worker
+    processes are listed in PROCESSOR_PLUGINS (loaded on first use in every
+    process), and the worker pools replay the parent's `register` calls
+    through `register_all` when they start.
+    """
+
+    _processors: Dict[DocumentType, ProcessorSpec] = {
+        DocumentType.PDF: "src.document_processor.pdf_processor:PDFProcessor",
+        DocumentType.DOCX: "src.document_processor.docx_processor:DocxProcessor",
+        DocumentType.EMAIL: "src.document_processor.email_processor:EmailProcessor",
+        DocumentType.TEXT: "src.document_processor.text_processor:TextProcessor",
+        DocumentType.IMAGE: "src.document_processor.image_processor:ImageProcessor",
+    }
+
+    _extensions: Dict[str, Union[DocumentType, ProcessorSpec]] = {
+        '.pdf': DocumentType.PDF,
+        '.docx': DocumentType.DOCX,
+        '.doc': DocumentType.DOCX,
+        '.eml': DocumentType.EMAIL,
+        '.msg': DocumentType.EMAIL,
+        '.txt': DocumentType.TEXT,
+        '.jpg': DocumentType.IMAGE,
+        '.jpeg': DocumentType.IMAGE,
+        '.png': DocumentType.IMAGE,
     }
-    
+
+    # Mappings added with `register`, replayed in worker processes
+    _registered: Dict[str, Union[DocumentType, ProcessorSpec]] = {}
+    _plugins_loaded = False
+    _instances: Dict[Any, BaseDocumentProcessor] = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def register(cls, file_extension: str, processor: Union[DocumentType, ProcessorSpec]) -> None:
+        """Map a file extension to a document type or processor, replacing any existing mapping.
+
+        To reach worker processes the processor must be picklable (a
+        document type, a "module:Class" path or an importable class), and
+        it must be registered before the worker pools start.
+        """
+        extension = file_extension.lower()
+        if not extension.startswith('.'):
+            extension = '.' + extension
+        with cls._lock:
+            cls._extensions[extension] = processor
+            cls._registered[extension] = processor
+
+    @classmethod
+    def registrations(cls) -> Dict[str, Union[DocumentType, ProcessorSpec]]:
+        """The mappings added with `register` in this process"""
+        with cls._lock:
+            return dict(cls._registered)
+
+    @classmethod
+    def register_all(cls, registrations: Dict[str, Union[DocumentType, ProcessorSpec]]) -> None:
+        """Apply mappings from `registrations` (called by the worker process initializer)"""
+        for extension, processor in registrations.items():
+            cls.register(extension, processor)
+
+    @classmethod
+    def supported_extensions(cls) -> List[str]:
+        cls._load_plugins()
+        return sorted(cls._extensions)
+
+    @classmethod
+    def is_supported(cls, file_extension: str) -> bool:
+        cls._load_plugins()
+        return file_extension.lower() in cls._extensions
+
     @classmethod
     def get_processor(cls, document_type: DocumentType) -> BaseDocumentProcessor:
         """Get appropriate processor for document type"""
-        processor_class = cls._processors.get(document_type)
-        if not processor_class:
+        spec = cls._processors.get(document_type)
+        if not spec:
             raise ValueError(f"No processor available for document type: {document_type}")
-        
-        return processor_class()
-    
+
+        return cls._resolve(spec)
+
     @classmethod
     def get_processor_by_extension(cls, file_extension: str) -> BaseDocumentProcessor:
         """Get processor based on file extension"""
-        extension_mapping = {
-            '.pdf': DocumentType.PDF,
-            '.docx': DocumentType.DOCX,
-            '.doc': DocumentType.DOCX,
-            '.eml': DocumentType.EMAIL,
-            '.msg': DocumentType.EMAIL,
-            '.txt': DocumentType.TEXT,
-            '.jpg': DocumentType.IMAGE,
-            '.jpeg': DocumentType.IMAGE,
-            '.png': DocumentType.IMAGE,
-        }
-
-        
-        document_type = extension_mapping.get(file_extension.lower())
-        if not document_type:
+        cls._load_plugins()
+        spec = cls._extensions.get(file_extension.lower())
+        if not spec:
             raise ValueError(f"Unsupported file extension: {file_extension}")
-        
-        return cls.get_processor(document_type)
\ No newline at end of file
+
+        if isinstance(spec, DocumentType):
+            return cls.get_processor(spec)
+        return cls._resolve(spec)
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop cached processor instances (used by tests)"""
+        with cls._lock:
+            cls._instances.clear()
+
+    @classmethod
+    def _load_plugins(cls) -> None:
+        """Register the PROCESSOR_PLUGINS mappings (".ext=module:Class", comma separated) once"""
+        if cls._plugins_loaded:
+            return
+        with cls._lock:
+            if cls._plugins_loaded:
+                return
+            for entry in filter(None, (item.strip() for item in Config.PROCESSOR_PLUGINS.split(','))):
+                extension, _, spec = entry.partition('=')
+                if not extension.strip() or ':' not in spec:
+                    raise ValueError(f"Invalid PROCESSOR_PLUGINS entry (expected .ext=module:Class): {entry}")
+                cls.register(extension.strip(), spec.strip())
+            cls._plugins_loaded = True
+
+    @classmethod
+    def _resolve(cls, spec: ProcessorSpec) -> BaseDocumentProcessor:
+        if isinstance(spec, BaseDocumentProcessor):
+            return spec
+
+        with cls._lock:
+            processor = cls._instances.get(spec)
+            if processor is not None:
+                return processor
+
+            processor_class = cls._import(spec) if isinstance(spec, str) else spec
+            processor = processor_class()
+            if processor_class.reusable:
+                cls._instances[spec] = processor
+            return processor
+
+    @staticmethod
+    def _import(path: str) -> Type[BaseDocumentProcessor]:
+        module_name, _, class_name = path.partition(':')
+        return getattr(importlib.import_module(module_name), class_name)
@@ -1,14 +1,23 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from .base import BaseDocumentProcessor
 
 class TextProcessor(BaseDocumentProcessor):
     """Processor for plain text files"""
     
+    # Characters per segment when streaming
+    BLOCK_SIZE = 1024 * 1024
+    
     def extract_text(self, file_path: str) -> str:
         """Extract text from .txt file"""
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             return f.read()
     
+    def iter_segments(self, file_path: str) -> Iterator[str]:
+        """Read the file in fixed-size blocks"""
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for block in iter(lambda: f.read(self.BLOCK_SIZE), ""):
+                yield block
+    
     def extract_metadata(self, file_path: str) -> Dict[str, Any]:
         """Extract metadata from .txt file"""
         import os
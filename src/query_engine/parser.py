@@ -1,17 +1,42 @@
+import json
 import re
-from typing import Dict, Any, List
-from groq import Groq
+from typing import Dict, Any, List, Optional
 from src.core.models import ParsedQuery, QueryType
 from src.core.config import Config
+from src.core.registry import ResourceRegistry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# An amount is only taken as the claim amount without the LLM when it carries a currency marker
+_CURRENCY_AMOUNT = re.compile(r'(?:[\$₹]|\bRs\.?|\bINR)\s*(\d+(?:,\d+)*(?:\.\d+)?)', re.IGNORECASE)
+# A procedure named in the query ("cosmetic surgery", "teeth whitening") and a negation just before it
+_PROCEDURE = re.compile(
+    r'\b([a-z]+)[\s-]+(surgery|surgeries|procedure|treatment|therapy|transplant|replacement|'
+    r'cleaning|filling|whitening|implant)\b', re.IGNORECASE
+)
+_NEGATION = re.compile(r'\b(?:not|no|non|excluding|except|without)\b[\s-]*(?:[a-z]+[\s-]+){0,2}$', re.IGNORECASE)
+_PROCEDURE_STOPWORDS = {
+    "a", "an", "the", "my", "his", "her", "their", "our", "your", "this", "that", "any", "some",
+    "for", "of", "to", "in", "after", "before", "and", "or",
+    "is", "was", "had", "have", "need", "needs", "get", "got", "undergo", "underwent",
+}
+
+# Fields the LLM extracts from a query, listed in the extraction prompts
+LLM_QUERY_FIELDS = """
+        - medical_procedure: any medical procedure mentioned
+        - insurance_type: type of insurance
+        - policy_details: policy-related information
+        - claim_type: type of claim
+        - urgency: urgency level
+        - additional_context: any other relevant information
+"""
+
 class QueryParser:
     """Parse natural language queries into structured data"""
     
     def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
+        self.client = ResourceRegistry.get_llm_client()
         self.model_name = Config.GROQ_MODEL
     
     def parse_query(self, query: str) -> ParsedQuery:
@@ -24,6 +49,52 @@ class QueryParser:
         llm_parsed = self._llm_parse(query)
         structured_data.update(llm_parsed)
         
+        return self._build(query, structured_data)
+    
+    async def parse_query_async(self, query: str) -> ParsedQuery:
+        """Parse a query without holding a thread while the LLM call is in flight"""
+        structured_data = self._extract_patterns(query)
+        structured_data.update(await self._llm_parse_async(query))
+        return self._build(query, structured_data)
+    
+    def parse_query_fast(self, query: str) -> ParsedQuery:
+        """Parse a query with the regex patterns only (no LLM call)"""
+        return self._build(query, self._extract_patterns(query))
+    
+    def parse_query_strict(self, query: str) -> ParsedQuery:
+        """Regex parse keeping only values unambiguous enough to decide a query without the LLM.
+
+        A number is only the claim amount when it carries a currency marker,
+        so policy numbers and claim references are not mistaken for one, and
+        a procedure is only kept when exactly one is named and not negated.
+        """
+        structured_data = self._extract_patterns(query)
+        structured_data.pop('amount', None)
+        amount_match = _CURRENCY_AMOUNT.search(query)
+        if amount_match:
+            structured_data['amount'] = float(amount_match.group(1).replace(',', ''))
+        procedure = self._extract_procedure(query)
+        if procedure:
+            structured_data['medical_procedure'] = procedure
+        return self._build(query, structured_data)
+    
+    @staticmethod
+    def _extract_procedure(query: str) -> Optional[str]:
+        """The one procedure a query names, or None when it names several or negates one.
+
+        "not cosmetic surgery", "excluding teeth whitening" and "non-cosmetic
+        surgery" leave the procedure to the LLM parse.
+        """
+        procedures = set()
+        for match in _PROCEDURE.finditer(query):
+            if _NEGATION.search(query, 0, match.start(1)):
+                return None
+            qualifier, kind = match.group(1).lower(), match.group(2).lower()
+            if qualifier not in _PROCEDURE_STOPWORDS:  # "my procedure" names nothing
+                procedures.add(f"{qualifier} {kind}")
+        return procedures.pop() if len(procedures) == 1 else None
+    
+    def _build(self, query: str, structured_data: Dict[str, Any]) -> ParsedQuery:
         # Determine query type
         query_type = self._determine_query_type(query, structured_data)
         
@@ -74,32 +145,23 @@ class QueryParser:
     
     def _llm_parse(self, query: str) -> Dict[str, Any]:
         """Use LLM to extract structured information"""
+        return self.client.run(self._llm_parse_async(query))
+    
+    async def _llm_parse_async(self, query: str) -> Dict[str, Any]:
         prompt = f"""
         Parse the following query and extract structured information:
         Query: "{query}"
         
-        Extract and return JSON with these fields if present:
-        - medical_procedure: any medical procedure mentioned
-        - insurance_type: type of insurance
-        - policy_details: policy-related information
-        - claim_type: type of claim
-        - urgency: urgency level
-        - additional_context: any other relevant information
-        
+        Extract and return JSON with these fields if present:{LLM_QUERY_FIELDS}
         Return only valid JSON:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            text = await self.client.chat(
+                [{"role": "user", "content": prompt}],
                 model=self.model_name,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
+                json_response=True
             )
-            
-            import json
-            text = response.choices[0].message.content
             # Try to find JSON in the response
             json_start = text.find('{')
             json_end = text.rfind('}') + 1
@@ -0,0 +1,531 @@
+"""
+Persistent, incrementally maintained inverted index for BM25 lexical search
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from heapq import heappush, heapreplace
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+# Sentinel ordinal for an exhausted postings cursor
+_EXHAUSTED = sys.maxsize
+
+# Relative slack applied to score upper bounds so that floating point
+# rounding can never make a bound smaller than the score it covers
+_BOUND_SLACK = 1.0 + 1e-9
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by indexing and querying"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with postings lists, chunk lengths and IDF statistics.
+
+    Every chunk receives an internal ordinal when it is added. Ordinals only
+    ever grow, so postings lists stay sorted by appending. Queries run on the
+    in-memory postings and only touch those of the query terms.
+
+    With a `path`, the index is backed by a SQLite database next to the
+    Chroma directory, which holds each chunk's term frequencies and a log of
+    changes. Every add or removal is written incrementally, in a transaction
+    that holds the database's write lock: the writer first applies the
+    changes other processes logged since it last looked, then logs its own.
+    Readers apply new log entries before each query, so app workers and the
+    seeding script share one index without overwriting each other.
+    """
+
+    VERSION = 2
+    K1 = 1.5
+    B = 0.75
+    # Postings per block for block-max upper bounds
+    BLOCK_SIZE = 64
+
+    _shared: Dict[str, "BM25Index"] = {}
+    _shared_lock = threading.Lock()
+
+    # Change log entries kept for processes catching up; older ones make them reload
+    LOG_RETENTION = 10000
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._last_seq = 0  # last change log entry applied in memory
+        self._reset()
+
+    @classmethod
+    def shared(cls, path: str) -> "BM25Index":
+        """Get the process-wide index instance persisted at `path`"""
+        key = os.path.abspath(path)
+        with cls._shared_lock:
+            index = cls._shared.get(key)
+            if index is None:
+                index = cls(path)
+                cls._shared[key] = index
+            return index
+
+    def _reset(self) -> None:
+        # term -> (sorted ordinals, term frequencies)
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._chunk_ids: Dict[int, str] = {}
+        self._ordinals: Dict[str, int] = {}
+        self._document_ids: Dict[int, str] = {}
+        self._lengths: Dict[int, int] = {}
+        self._chunk_terms: Dict[int, List[str]] = {}
+        self._documents: Dict[str, List[int]] = {}
+        # term -> (last ordinal, max tf, min chunk length) per block; derived lazily
+        self._blocks: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+        self._total_length = 0
+        self._next_ordinal = 0
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._chunk_ids)
+
+    @property
+    def average_length(self) -> float:
+        return self._total_length / len(self._lengths) if self._lengths else 0.0
+
+    def document_frequency(self, term: str) -> int:
+        postings = self._postings.get(term)
+        return len(postings[0]) if postings else 0
+
+    def idf(self, term: str) -> float:
+        """BM25 IDF, using the non-negative `log(1 + ...)` variant"""
+        n = self.chunk_count
+        df = self.document_frequency(term)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _term_weight(self, tf: int, length: int, avgdl: float) -> float:
+        norm = self.K1 * (1.0 - self.B + self.B * length / avgdl)
+        return tf * (self.K1 + 1.0) / (tf + norm)
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add(self, entries: Iterable[Tuple[str, str, str]]) -> None:
+        """Index `(chunk_id, document_id, text)` entries, replacing existing chunk IDs"""
+        with self._write() as conn:
+            for chunk_id, document_id, text in entries:
+                if chunk_id in self._ordinals:
+                    self._remove(conn, self._ordinals[chunk_id])
+
+                counts = Counter(tokenize(text))
+                ordinal = self._next_ordinal
+                if conn is not None:
+                    ordinal = conn.execute(
+                        "INSERT INTO chunks (chunk_id, document_id, terms) VALUES (?, ?, ?)",
+                        (chunk_id, document_id, json.dumps(counts, separators=(",", ":")))
+                    ).lastrowid
+                    self._log(conn, "add", ordinal)
+                self._add_ordinal(ordinal, chunk_id, document_id, counts)
+
+    def _add_ordinal(self, ordinal: int, chunk_id: str, document_id: str, counts: Mapping[str, int]) -> None:
+        length = sum(counts.values())
+        for term, tf in counts.items():
+            ordinals, tfs = self._postings.setdefault(term, ([], []))
+            ordinals.append(ordinal)
+            tfs.append(tf)
+            self._blocks.pop(term, None)
+
+        self._chunk_ids[ordinal] = chunk_id
+        self._ordinals[chunk_id] = ordinal
+        self._document_ids[ordinal] = document_id
+        self._lengths[ordinal] = length
+        self._chunk_terms[ordinal] = list(counts)
+        self._documents.setdefault(document_id, []).append(ordinal)
+        self._total_length += length
+        self._next_ordinal = ordinal + 1
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove every chunk of a document. Returns the number of chunks removed."""
+        with self._write() as conn:
+            ordinals = list(self._documents.get(document_id, []))
+            for ordinal in ordinals:
+                self._remove(conn, ordinal)
+            return len(ordinals)
+
+    def remove_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Remove individual chunks by ID. Returns the number of chunks removed."""
+        with self._write() as conn:
+            removed = 0
+            for chunk_id in chunk_ids:
+                ordinal = self._ordinals.get(chunk_id)
+                if ordinal is not None:
+                    self._remove(conn, ordinal)
+                    removed += 1
+            return removed
+
+    def _remove(self, conn: Optional[sqlite3.Connection], ordinal: int) -> None:
+        if conn is not None:
+            conn.execute("DELETE FROM chunks WHERE ordinal = ?", (ordinal,))
+            self._log(conn, "remove", ordinal)
+        self._remove_ordinal(ordinal)
+
+    def _remove_ordinal(self, ordinal: int) -> None:
+        if ordinal not in self._chunk_ids:
+            return
+        for term in self._chunk_terms.pop(ordinal, []):
+            self._blocks.pop(term, None)
+            ordinals, tfs = self._postings[term]
+            i = bisect_left(ordinals, ordinal)
+            if i < len(ordinals) and ordinals[i] == ordinal:
+                del ordinals[i]
+                del tfs[i]
+            if not ordinals:
+                del self._postings[term]
+
+        chunk_id = self._chunk_ids.pop(ordinal)
+        del self._ordinals[chunk_id]
+        document_id = self._document_ids.pop(ordinal)
+        self._total_length -= self._lengths.pop(ordinal)
+
+        siblings = self._documents.get(document_id, [])
+        if ordinal in siblings:
+            siblings.remove(ordinal)
+        if not siblings:
+            self._documents.pop(document_id, None)
+
+    def clear(self) -> None:
+        with self._write() as conn:
+            if conn is not None:
+                conn.execute("DELETE FROM chunks")
+                self._log(conn, "clear", None)
+            self._reset()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, top_k: int,
+               document_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Return the `top_k` `(chunk_id, score)` pairs for a query, best first.
+
+        Uses block-max WAND: postings are walked document-at-a-time and any
+        chunk whose score upper bound cannot beat the current k-th best score
+        is skipped without being scored. The ranking is identical to
+        `search_exhaustive`, including tie-breaking by insertion order.
+        """
+        with self._lock:
+            self.refresh()
+            query_terms = self._query_terms(query)
+            if top_k <= 0 or not query_terms:
+                return []
+
+            allowed = set(document_ids) if document_ids else None
+            avgdl = self.average_length or 1.0
+            cursors = []
+            for term, qtf in query_terms.items():
+                ordinals, tfs = self._postings[term]
+                lasts, max_tfs, min_lengths = self._block_stats(term)
+                idf = self.idf(term) * qtf
+                bounds = [
+                    idf * self._term_weight(tf, length, avgdl) * _BOUND_SLACK
+                    for tf, length in zip(max_tfs, min_lengths)
+                ]
+                cursors.append(_PostingCursor(ordinals, tfs, idf, lasts, bounds, self.BLOCK_SIZE))
+
+            heap: List[Tuple[float, int]] = []  # (score, -ordinal), worst entry first
+            threshold = 0.0
+            while cursors:
+                cursors.sort(key=attrgetter("doc"))
+
+                # Pivot: first cursor at which the summed term upper bounds beat the threshold
+                bound = 0.0
+                pivot = -1
+                for i, cursor in enumerate(cursors):
+                    bound += cursor.upper_bound
+                    if bound > threshold:
+                        pivot = i
+                        break
+                if pivot < 0:
+                    break
+
+                pivot_doc = cursors[pivot].doc
+                while pivot + 1 < len(cursors) and cursors[pivot + 1].doc == pivot_doc:
+                    pivot += 1
+                candidates = cursors[:pivot + 1]
+
+                # Refine with the block maxima of the blocks that contain pivot_doc
+                block_bound = 0.0
+                next_doc = cursors[pivot + 1].doc if pivot + 1 < len(cursors) else _EXHAUSTED
+                for cursor in candidates:
+                    term_bound, block_last = cursor.block_bound(pivot_doc)
+                    block_bound += term_bound
+                    next_doc = min(next_doc, block_last + 1)
+
+                if block_bound <= threshold:
+                    for cursor in candidates:
+                        cursor.advance(next_doc)
+                elif cursors[0].doc == pivot_doc:
+                    if allowed is None or self._document_ids[pivot_doc] in allowed:
+                        length = self._lengths[pivot_doc]
+                        score = math.fsum(
+                            cursor.idf * self._term_weight(cursor.tf, length, avgdl)
+                            for cursor in candidates
+                        )
+                        entry = (score, -pivot_doc)
+                        if len(heap) < top_k:
+                            heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapreplace(heap, entry)
+                        if len(heap) == top_k:
+                            threshold = heap[0][0]
+                    for cursor in candidates:
+                        cursor.advance(pivot_doc + 1)
+                else:
+                    for cursor in candidates:
+                        if cursor.doc < pivot_doc:
+                            cursor.advance(pivot_doc)
+
+                cursors = [cursor for cursor in cursors if cursor.doc != _EXHAUSTED]
+
+            ranked = sorted(heap, reverse=True)
+            return [(self._chunk_ids[-neg_ordinal], score) for score, neg_ordinal in ranked]
+
+    def search_exhaustive(self, query: str, top_k: int,
+                          document_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """Score every chunk in the query terms' postings and keep the best `top_k`"""
+        with self._lock:
+            self.refresh()
+            query_terms = self._query_terms(query)
+            if top_k <= 0 or not query_terms:
+                return []
+
+            allowed = set(document_ids) if document_ids else None
+            avgdl = self.average_length or 1.0
+            contributions: Dict[int, List[float]] = {}
+            for term, qtf in query_terms.items():
+                idf = self.idf(term) * qtf
+                ordinals, tfs = self._postings[term]
+                for ordinal, tf in zip(ordinals, tfs):
+                    if allowed is not None and self._document_ids[ordinal] not in allowed:
+                        continue
+                    weight = idf * self._term_weight(tf, self._lengths[ordinal], avgdl)
+                    contributions.setdefault(ordinal, []).append(weight)
+
+            scores = [(math.fsum(weights), ordinal) for ordinal, weights in contributions.items()]
+            scores.sort(key=lambda item: (-item[0], item[1]))
+            return [(self._chunk_ids[o], s) for s, o in scores[:top_k] if s > 0]
+
+    def _query_terms(self, query: str) -> Counter:
+        return Counter(t for t in tokenize(query) if t in self._postings)
+
+    def _block_stats(self, term: str) -> Tuple[List[int], List[int], List[int]]:
+        """Per-block last ordinal, max term frequency and min chunk length for a term"""
+        stats = self._blocks.get(term)
+        if stats is None:
+            ordinals, tfs = self._postings[term]
+            lasts, max_tfs, min_lengths = [], [], []
+            for start in range(0, len(ordinals), self.BLOCK_SIZE):
+                block = ordinals[start:start + self.BLOCK_SIZE]
+                lasts.append(block[-1])
+                max_tfs.append(max(tfs[start:start + self.BLOCK_SIZE]))
+                min_lengths.append(min(self._lengths[o] for o in block))
+            stats = (lasts, max_tfs, min_lengths)
+            self._blocks[term] = stats
+        return stats
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """The database connection, opened and loaded on first use; None for an in-memory index"""
+        if self._conn is None and self.path:
+            with self._lock:
+                if self._conn is None:
+                    self._open()
+        return self._conn
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction("BEGIN IMMEDIATE") as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, self.VERSION):
+                # The index is derived data; the vector store rebuilds it from the collection
+                logger.warning(f"Discarding BM25 index with unsupported version {version}")
+                conn.execute("DROP TABLE IF EXISTS chunks")
+                conn.execute("DROP TABLE IF EXISTS changes")
+                conn.execute("DROP TABLE IF EXISTS meta")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " ordinal INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " chunk_id TEXT NOT NULL UNIQUE,"
+                " document_id TEXT NOT NULL,"
+                " terms TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " op TEXT NOT NULL,"
+                " ordinal INTEGER)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(f"PRAGMA user_version = {self.VERSION}")
+            self._reload(conn)
+        logger.info(f"Loaded BM25 index with {self.chunk_count} chunks from {self.path}")
+
+    @contextmanager
+    def _transaction(self, begin: str = "BEGIN") -> Iterator[sqlite3.Connection]:
+        self._conn.execute(begin)
+        try:
+            yield self._conn
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def _write(self) -> Iterator[Optional[sqlite3.Connection]]:
+        """Make a change under the database's write lock, after catching up with other writers.
+
+        Yields None for an in-memory index. If the transaction fails, the
+        in-memory index is reloaded so it matches the database again.
+        """
+        with self._lock:
+            if self._connection() is None:
+                yield None
+                return
+            # Commits by others after this point change data_version and are picked up by refresh
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            try:
+                with self._transaction("BEGIN IMMEDIATE") as conn:
+                    self._catch_up(conn)
+                    yield conn
+                    self._prune_log(conn)
+            except BaseException:
+                with self._transaction() as conn:
+                    self._reload(conn)
+                raise
+            self._data_version = data_version
+
+    def refresh(self) -> None:
+        """Load the index, or apply the changes other processes have made since the last call"""
+        if self._connection() is None:
+            return
+        with self._lock:
+            # data_version only changes when another connection commits
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            with self._transaction() as conn:
+                self._catch_up(conn)
+            self._data_version = data_version
+
+    def _log(self, conn: sqlite3.Connection, op: str, ordinal: Optional[int]) -> None:
+        self._last_seq = conn.execute(
+            "INSERT INTO changes (op, ordinal) VALUES (?, ?)", (op, ordinal)
+        ).lastrowid
+
+    def _log_floor(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'log_floor'").fetchone()
+        return row[0] if row else 0
+
+    def _catch_up(self, conn: sqlite3.Connection) -> None:
+        if self._last_seq < self._log_floor(conn):
+            self._reload(conn)
+            return
+        rows = conn.execute(
+            "SELECT c.seq, c.op, c.ordinal, k.chunk_id, k.document_id, k.terms"
+            " FROM changes c LEFT JOIN chunks k ON k.ordinal = c.ordinal"
+            " WHERE c.seq > ? ORDER BY c.seq",
+            (self._last_seq,)
+        ).fetchall()
+        for seq, op, ordinal, chunk_id, document_id, terms in rows:
+            if op == "add" and chunk_id is not None:  # None: removed again later in the log
+                self._add_ordinal(ordinal, chunk_id, document_id, json.loads(terms))
+            elif op == "remove":
+                self._remove_ordinal(ordinal)
+            elif op == "clear":
+                self._reset()
+            self._last_seq = seq
+
+    def _reload(self, conn: sqlite3.Connection) -> None:
+        self._reset()
+        for ordinal, chunk_id, document_id, terms in conn.execute(
+            "SELECT ordinal, chunk_id, document_id, terms FROM chunks ORDER BY ordinal"
+        ):
+            self._add_ordinal(ordinal, chunk_id, document_id, json.loads(terms))
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _prune_log(self, conn: sqlite3.Connection) -> None:
+        floor = self._last_seq - self.LOG_RETENTION
+        if floor > self._log_floor(conn) + self.LOG_RETENTION:
+            conn.execute("DELETE FROM changes WHERE seq <= ?", (floor,))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('log_floor', ?)", (floor,))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class _PostingCursor:
+    """Document-at-a-time cursor over one term's postings with block skipping"""
+
+    __slots__ = ("ordinals", "tfs", "idf", "block_lasts", "block_bounds",
+                 "block_size", "upper_bound", "pos", "block", "doc")
+
+    def __init__(self, ordinals: List[int], tfs: List[int], idf: float,
+                 block_lasts: List[int], block_bounds: List[float], block_size: int):
+        self.ordinals = ordinals
+        self.tfs = tfs
+        self.idf = idf
+        self.block_lasts = block_lasts
+        self.block_bounds = block_bounds
+        self.block_size = block_size
+        self.upper_bound = max(block_bounds)
+        self.pos = 0
+        self.block = 0
+        self.doc = ordinals[0]
+
+    @property
+    def tf(self) -> int:
+        return self.tfs[self.pos]
+
+    def block_bound(self, target: int) -> Tuple[float, int]:
+        """Upper bound and last ordinal of the block covering `target`, without moving"""
+        block = bisect_left(self.block_lasts, target, self.block)
+        if block >= len(self.block_lasts):
+            return 0.0, _EXHAUSTED - 1
+        return self.block_bounds[block], self.block_lasts[block]
+
+    def advance(self, target: int) -> None:
+        """Move to the first posting with ordinal >= `target`"""
+        if target <= self.doc:
+            return
+        block = bisect_left(self.block_lasts, target, self.block)
+        if block >= len(self.block_lasts):
+            self.doc = _EXHAUSTED
+            return
+        self.block = block
+        self.pos = bisect_left(self.ordinals, target, max(self.pos, block * self.block_size))
+        self.doc = self.ordinals[self.pos]
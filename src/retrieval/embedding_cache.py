@@ -0,0 +1,200 @@
+"""
+Embedding caches for query and chunk encodings
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of a chunk's text, used as its content address"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode_vector(vector: Iterable[float]) -> bytes:
+    return array('f', vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    values = array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingStore:
+    """SQLite-backed persistent store of float32 embeddings keyed by `(key, model)`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (key, model)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, model: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND model = ?", (key, model)
+            ).fetchone()
+        return _decode_vector(row[0]) if row else None
+
+    def get_many(self, keys: List[str], model: str) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = _decode_vector(blob)
+        return found
+
+    def put(self, key: str, model: str, vector: Iterable[float]) -> None:
+        self.put_many([(key, vector)], model)
+
+    def put_many(self, items: Iterable[Tuple[str, Iterable[float]]], model: str) -> None:
+        rows = [(key, model, _encode_vector(vector)) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings.
+
+    Entries are keyed by embedding model name and normalized query text and
+    are stored as float32 arrays. The cache is capped by an approximate byte
+    size; least recently used entries are evicted first and, when a spill
+    path is configured, written to an on-disk store that is consulted on
+    in-memory misses.
+    """
+
+    # Approximate per-entry overhead of the key tuple, array header and LRU link
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int, spill_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], array]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.evictions = 0
+        self._spill: Optional[EmbeddingStore] = None
+        if spill_path:
+            try:
+                self._spill = EmbeddingStore(spill_path)
+            except Exception as e:
+                logger.error(f"Could not open query embedding spill store at {spill_path}: {e}")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace and case so trivially different queries share an entry"""
+        return " ".join(text.split()).lower()
+
+    def _entry_size(self, key: Tuple[str, str], vector: array) -> int:
+        return len(key[1]) + vector.itemsize * len(vector) + self.ENTRY_OVERHEAD
+
+    def get(self, text: str, model_name: str) -> Optional[List[float]]:
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+
+        if self._spill is not None:
+            spilled = self._spill.get(key[1], model_name)
+            if spilled is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.spill_hits += 1
+                self._insert(key, array('f', spilled))
+                return spilled
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, model_name: str, embedding: List[float]) -> None:
+        self._insert((model_name, self.normalize(text)), array('f', embedding))
+
+    def _insert(self, key: Tuple[str, str], vector: array) -> None:
+        size = self._entry_size(key, vector)
+        if size > self.max_bytes:
+            return
+
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._entry_size(key, previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_vector)
+                self.evictions += 1
+                evicted.append((old_key, old_vector))
+
+        if self._spill is not None and evicted:
+            try:
+                for (model_name, text), vector in evicted:
+                    self._spill.put(text, model_name, vector)
+            except Exception as e:
+                logger.warning(f"Failed to spill query embeddings to disk: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "spill_hits": self.spill_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "spill_enabled": self._spill is not None,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
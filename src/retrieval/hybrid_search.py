@@ -1,9 +1,10 @@
 import logging
-import re
 from typing import List, Dict, Any, Optional
 from src.core.models import RetrievalResult, DocumentChunk
 from src.core.config import Config
 from src.retrieval.vector_store import VectorStore
+from src.retrieval.bm25_index import tokenize
+from src.core.registry import ResourceRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +12,11 @@ class HybridSearcher:
     """Hybrid Search combining ChromaDB vector search and BM25 lexical search using Reciprocal Rank Fusion (RRF)"""
     
     def __init__(self, vector_store: Optional[VectorStore] = None):
-        self.vector_store = vector_store or VectorStore()
+        self.vector_store = vector_store or ResourceRegistry.get_vector_store()
         
     def _tokenize(self, text: str) -> List[str]:
         """Simple tokenizer for BM25 indexing"""
-        return re.findall(r'\w+', text.lower())
+        return tokenize(text)
         
     def search(self, query: str, top_k: Optional[int] = None, 
                document_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
@@ -50,65 +51,41 @@ class HybridSearcher:
         
     def _bm25_search(self, query: str, top_k: int, 
                     document_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
-        """Perform BM25 search over documents in ChromaDB"""
-        try:
-            from rank_bm25 import BM25Okapi
-        except ImportError:
-            logger.warning("rank_bm25 library not available. Skipping lexical search.")
+        """Perform BM25 search using the persistent inverted index"""
+        hits = self.vector_store.lexical_index.search(query, top_k=top_k, document_ids=document_ids)
+        if not hits:
             return []
             
-        # Build where clause for filtering
-        where_clause = None
-        if document_ids:
-            if len(document_ids) == 1:
-                where_clause = {"document_id": document_ids[0]}
-            else:
-                where_clause = {"document_id": {"$in": document_ids}}
-                
-        # Get all matching chunks from ChromaDB
+        # Fetch content and metadata only for the winning chunks
         results = self.vector_store.collection.get(
-            where=where_clause,
+            ids=[chunk_id for chunk_id, _ in hits],
             include=['documents', 'metadatas']
         )
         
         if not results or not results['documents']:
             return []
             
-        documents = results['documents']
-        metadatas = results['metadatas']
-        ids = results['ids']
-        
-        # Tokenize corpus
-        tokenized_corpus = [self._tokenize(doc) for doc in documents]
-        bm25 = BM25Okapi(tokenized_corpus)
-        
-        # Score documents
-        tokenized_query = self._tokenize(query)
-        scores = bm25.get_scores(tokenized_query)
-        
-        # Sort and get top results
-        scored_docs = []
-        for idx, score in enumerate(scores):
-            if score > 0:  # Only keep documents with some keyword overlap
-                scored_docs.append((score, idx))
-                
-        scored_docs.sort(reverse=True, key=lambda x: x[0])
-        top_scored = scored_docs[:top_k]
+        found = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
         
         # Convert to RetrievalResult objects
         # Normalize scores to pseudo-similarity values between 0 and 1
-        max_score = max([s[0] for s in top_scored]) if top_scored else 1.0
+        max_score = hits[0][1]
         
         retrieval_results = []
-        for score, idx in top_scored:
+        for chunk_id, score in hits:
+            if chunk_id not in found:
+                continue
+            document, metadata = found[chunk_id]
             norm_score = score / max_score if max_score > 0 else 0.0
-            # Normalize to match similarity threshold if needed
             result = RetrievalResult(
-                chunk_id=ids[idx],
-                document_id=metadatas[idx]['document_id'],
-                content=documents[idx],
+                chunk_id=chunk_id,
+                document_id=metadata['document_id'],
+                content=document,
                 similarity_score=norm_score,
-                metadata=metadatas[idx]
+                metadata=metadata
             )
             retrieval_results.append(result)
             
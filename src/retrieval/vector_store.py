@@ -1,7 +1,11 @@
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 from src.core.models import DocumentChunk, RetrievalResult
 from src.core.config import Config
+from src.core.registry import ResourceRegistry
+from src.retrieval.bm25_index import BM25Index
+from src.retrieval.embedding_cache import EmbeddingStore, QueryEmbeddingCache, content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -15,48 +19,32 @@ class VectorStore:
         self.client = None
         self.collection = None
         self.embedding_model = None
-        self._heavy_deps_checked = False
+        self.lexical_index = BM25Index.shared(Config.BM25_INDEX_PATH)
+        self.query_embedding_cache = QueryEmbeddingCache(
+            max_bytes=Config.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+            spill_path=Config.QUERY_EMBEDDING_CACHE_SPILL_PATH or None
+        )
+        self._chunk_embedding_cache: Optional[EmbeddingStore] = None
+        self._init_lock = threading.Lock()
         
     def _ensure_initialized(self):
-        """Lazy initialize resources"""
+        """Lazy initialize resources from the shared registry"""
         global HEAVY_DEPS_AVAILABLE
         
-        if not self._heavy_deps_checked:
-            try:
-                global chromadb, Settings, SentenceTransformer
-                import chromadb
-                logger.info("ChromaDB imported successfully")
-                from chromadb.config import Settings
-                from sentence_transformers import SentenceTransformer
-                logger.info("SentenceTransformers imported successfully")
-                HEAVY_DEPS_AVAILABLE = True
-            except ImportError as e:
-                logger.warning(f"Heavy dependencies not found: {e}. Running in lightweight mode.")
-                HEAVY_DEPS_AVAILABLE = False
-            except Exception as e:
-                logger.error(f"Error during initialization of heavy dependencies: {e}", exc_info=True)
-                HEAVY_DEPS_AVAILABLE = False
-
-            logger.info(f"VectorStore initialized. HEAVY_DEPS_AVAILABLE: {HEAVY_DEPS_AVAILABLE}")
-            self._heavy_deps_checked = True
-
+        HEAVY_DEPS_AVAILABLE = ResourceRegistry.heavy_deps_available()
         if not HEAVY_DEPS_AVAILABLE:
             return
 
-        if self.client is None:
-            logger.info("Initializing ChromaDB client...")
-            self.client = chromadb.PersistentClient(
-                path=Config.CHROMA_PERSIST_DIRECTORY,
-                settings=Settings(anonymized_telemetry=False)
-            )
-            self.collection = self.client.get_or_create_collection(
-                name=Config.COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}
-            )
-            
-        if self.embedding_model is None:
-            logger.info(f"Loading embedding model: {Config.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        if self.collection is None or self.embedding_model is None:
+            with self._init_lock:
+                if self.collection is None:
+                    self.client = ResourceRegistry.get_chroma_client()
+                    collection = ResourceRegistry.get_collection()
+                    self._sync_lexical_index(collection)
+                    self.collection = collection
+                    
+                if self.embedding_model is None:
+                    self.embedding_model = ResourceRegistry.get_embedding_model()
     
     def add_documents(self, chunks: List[DocumentChunk]) -> None:
         """Add document chunks to vector store"""
@@ -69,12 +57,28 @@ class VectorStore:
         if not chunks:
             return
         
-        # Generate embeddings
-        texts = [chunk.content for chunk in chunks]
-        embeddings = self._generate_embeddings(texts)
+        embeddings = self.embed_documents(chunks)
+        self.write_documents(chunks, embeddings)
+    
+    def embed_documents(self, chunks: List[DocumentChunk]) -> List[List[float]]:
+        """Generate embeddings for chunks, reusing stored vectors for previously seen text"""
+        self._ensure_initialized()
+        return self._embed_chunks([chunk.content for chunk in chunks])
+    
+    def write_documents(self, chunks: List[DocumentChunk], embeddings: List[List[float]]) -> None:
+        """Write pre-embedded chunks to the collection and the lexical index"""
+        self._ensure_initialized()
+        
+        if not HEAVY_DEPS_AVAILABLE:
+            logger.warning("write_documents ignored in lightweight mode")
+            return
+
+        if not chunks:
+            return
         
         # Prepare data for ChromaDB
         ids = [chunk.chunk_id for chunk in chunks]
+        texts = [chunk.content for chunk in chunks]
         metadatas = []
         
         for chunk in chunks:
@@ -94,6 +98,11 @@ class VectorStore:
         except Exception as e:
             logger.error(f"Failed to add documents to ChromaDB: {e}")
             raise
+
+        self.lexical_index.add(
+            (chunk_id, metadata['document_id'], text)
+            for chunk_id, metadata, text in zip(ids, metadatas, texts)
+        )
     
     def search(self, query: str, top_k: int = None, 
                document_ids: Optional[List[str]] = None) -> List[RetrievalResult]:
@@ -107,8 +116,8 @@ class VectorStore:
         if top_k is None:
             top_k = Config.TOP_K_RESULTS
         
-        # Generate query embedding
-        query_embedding = self._generate_embeddings([query])[0]
+        # Generate query embedding (served from the LRU cache for repeated queries)
+        query_embedding = self._embed_query(query)
         
         # Prepare where clause for filtering
         where_clause = None
@@ -152,7 +161,64 @@ class VectorStore:
             return
 
         self.collection.delete(where={"document_id": document_id})
+        self.lexical_index.remove_document(document_id)
+    
+    def get_document_chunks(self, document_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Return `(chunk_id, text, metadata)` for every stored chunk of a document"""
+        self._ensure_initialized()
+        
+        if not HEAVY_DEPS_AVAILABLE:
+            return []
+
+        results = self.collection.get(where={"document_id": document_id}, include=['documents', 'metadatas'])
+        return list(zip(results['ids'], results['documents'], results['metadatas']))
+    
+    def update_chunk_metadata(self, chunks: List[DocumentChunk]) -> None:
+        """Replace the metadata of stored chunks without touching their text or embeddings"""
+        self._ensure_initialized()
+        
+        if not HEAVY_DEPS_AVAILABLE or not chunks:
+            return
+
+        metadatas = []
+        for chunk in chunks:
+            metadata = chunk.metadata.copy()
+            metadata['document_id'] = chunk.document_id
+            metadatas.append(metadata)
+        self.collection.update(ids=[chunk.chunk_id for chunk in chunks], metadatas=metadatas)
+    
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        """Delete individual chunks from the collection and the lexical index"""
+        self._ensure_initialized()
+        
+        if not HEAVY_DEPS_AVAILABLE or not chunk_ids:
+            return
+
+        self.collection.delete(ids=chunk_ids)
+        self.lexical_index.remove_chunks(chunk_ids)
     
+    def _sync_lexical_index(self, collection) -> None:
+        """Rebuild the BM25 index from the collection if the two have diverged.
+
+        This covers a first start after upgrading, a missing or corrupt index
+        file and a vector store restored from a cloud backup.
+        """
+        try:
+            self.lexical_index.refresh()
+            count = collection.count()
+            if not isinstance(count, int) or count == self.lexical_index.chunk_count:
+                return
+
+            logger.info(f"Rebuilding BM25 index ({self.lexical_index.chunk_count} indexed, {count} in collection)")
+            results = collection.get(include=['documents', 'metadatas'])
+            self.lexical_index.clear()
+            self.lexical_index.add(
+                (chunk_id, metadata['document_id'], text)
+                for chunk_id, metadata, text in zip(results['ids'], results['metadatas'], results['documents'])
+            )
+        except Exception as e:
+            logger.error(f"Failed to synchronize BM25 index with ChromaDB: {e}", exc_info=True)
+
     def get_document_count(self) -> int:
         """Get total number of documents in store"""
         self._ensure_initialized()
@@ -162,6 +228,47 @@ class VectorStore:
             
         return self.collection.count()
     
+    @property
+    def chunk_embedding_cache(self) -> Optional[EmbeddingStore]:
+        """Persistent content-addressed chunk embedding store, opened on first use"""
+        if self._chunk_embedding_cache is None and Config.EMBEDDING_CACHE_PATH:
+            with self._init_lock:
+                if self._chunk_embedding_cache is None:
+                    try:
+                        self._chunk_embedding_cache = EmbeddingStore(Config.EMBEDDING_CACHE_PATH)
+                    except Exception as e:
+                        logger.error(f"Could not open chunk embedding cache: {e}")
+                        return None
+        return self._chunk_embedding_cache
+    
+    def _embed_chunks(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunk texts, only encoding content not already in the embedding cache"""
+        cache = self.chunk_embedding_cache
+        if cache is None:
+            return self._generate_embeddings(texts)
+        
+        keys = [content_hash(text) for text in texts]
+        embeddings = cache.get_many(keys, Config.EMBEDDING_MODEL)
+        
+        # Encode each unseen text once, even if it repeats within the batch
+        missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+        if missing:
+            new_embeddings = self._generate_embeddings(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_embeddings))
+            cache.put_many(computed.items(), Config.EMBEDDING_MODEL)
+            embeddings.update(computed)
+        
+        logger.info(f"Embedded {len(missing)} new chunk texts; reused {len(texts) - len(missing)} cached embeddings")
+        return [embeddings[key] for key in keys]
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing cached embeddings for repeated query text"""
+        embedding = self.query_embedding_cache.get(query, Config.EMBEDDING_MODEL)
+        if embedding is None:
+            embedding = self._generate_embeddings([query])[0]
+            self.query_embedding_cache.put(query, Config.EMBEDDING_MODEL, embedding)
+        return embedding
+    
     def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings using local model"""
         # _ensure_initialized is called by public methods
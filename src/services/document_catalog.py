@@ -0,0 +1,158 @@
+"""
+Catalog of indexed documents keyed by content hash
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.core.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentCatalog:
+    """Maps file content hashes to the document_id they were indexed under.
+
+    A hash is registered before its document is indexed, so concurrent
+    uploads of the same bytes resolve to a single document. Entries are
+    released when indexing fails for good or the document is deleted, and
+    every duplicate that is detected is logged for reporting.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.DOCUMENT_CATALOG_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " content_hash TEXT PRIMARY KEY,"
+                " document_id TEXT NOT NULL UNIQUE,"
+                " filename TEXT,"
+                " file_path TEXT,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS duplicates ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " content_hash TEXT NOT NULL,"
+                " document_id TEXT NOT NULL,"
+                " filename TEXT,"
+                " detected_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def register(self, content_hash: str, document_id: str,
+                 filename: Optional[str] = None, file_path: Optional[str] = None) -> Tuple[str, bool]:
+        """Claim `content_hash` for `document_id`.
+
+        Returns the document_id the content is indexed under and whether it
+        was newly registered. When the hash is already known, the existing
+        document_id is returned and the duplicate is logged.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT document_id FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "INSERT INTO duplicates (content_hash, document_id, filename, detected_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (content_hash, row["document_id"], filename, now)
+                )
+                return row["document_id"], False
+            conn.execute(
+                "INSERT INTO documents (content_hash, document_id, filename, file_path, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (content_hash, document_id, filename, file_path, now)
+            )
+            return document_id, True
+
+    def reassign(self, document_id: str, content_hash: str,
+                 filename: Optional[str] = None, file_path: Optional[str] = None) -> str:
+        """Point `document_id` at new content after an update.
+
+        Returns the document_id that owns `content_hash` afterwards; this is
+        another document when the new content is already indexed elsewhere,
+        in which case nothing is changed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT document_id FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is not None:
+                return row["document_id"]
+            conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            conn.execute(
+                "INSERT INTO documents (content_hash, document_id, filename, file_path, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (content_hash, document_id, filename, file_path, now)
+            )
+            return document_id
+
+    def release(self, document_id: str) -> bool:
+        """Forget a document so its content can be indexed again"""
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            return cursor.rowcount > 0
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def duplicates(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent duplicate uploads, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT content_hash, document_id, filename, detected_at FROM duplicates"
+                " ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            duplicates = conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+        return {"documents": documents, "duplicates_detected": duplicates}
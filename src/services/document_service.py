@@ -1,74 +1,330 @@
 import os
 import uuid
+from bisect import bisect_right
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from src.core.models import DocumentChunk
+from src.document_processor.base import BaseDocumentProcessor
+from src.document_processor.chunker import page_span
 from src.document_processor.processor_factory import ProcessorFactory
+from src.retrieval.embedding_cache import content_hash as chunk_content_hash
 from src.retrieval.vector_store import VectorStore
+from src.services.document_catalog import DocumentCatalog
 from src.core.config import Config
+from src.core.registry import ResourceRegistry
 from src.utils.logger import get_logger
+from src.utils.worker_pools import WorkerPools
 
 logger = get_logger(__name__)
 
+# Structural hints of ParsedDocument that are carried in the metadata until chunking
+_STRUCTURE_KEYS = ('page_offsets', 'attachments', 'headings', 'section_offsets')
+
+
+def extract_document(file_path: str) -> Tuple[str, Dict[str, Any]]:
+    """Extract text and metadata for one file (safe to run in a worker process)"""
+    processor = ProcessorFactory.get_processor_by_extension(Path(file_path).suffix)
+    parsed = processor.parse(file_path)
+    metadata = dict(parsed.metadata)
+    for key in _STRUCTURE_KEYS:
+        if getattr(parsed, key):
+            metadata[key] = getattr(parsed, key)
+    return parsed.text, metadata
+
+
+def prepare_document(file_path: str, document_id: str,
+                     content_hash: Optional[str] = None) -> List[DocumentChunk]:
+    """Parse and chunk a file (safe to run in a worker process)"""
+    processor = ProcessorFactory.get_processor_by_extension(Path(file_path).suffix)
+    text, metadata = extract_document(file_path)
+    if content_hash:
+        metadata['file_sha256'] = content_hash
+    logger.info(f"Extracted text length: {len(text)} chars from {file_path}")
+    return DocumentService.build_chunks(processor, file_path, document_id, text, metadata)
+
+
 class DocumentService:
     """Service for document processing and management"""
     
-    def __init__(self):
-        self.vector_store = VectorStore()
+    def __init__(self, vector_store: Optional[VectorStore] = None,
+                 catalog: Optional[DocumentCatalog] = None):
+        self.vector_store = vector_store or ResourceRegistry.get_vector_store()
+        self._catalog = catalog
+    
+    @property
+    def catalog(self) -> DocumentCatalog:
+        """Content-hash catalog of indexed files (opened on first use)"""
+        if self._catalog is None:
+            self._catalog = DocumentCatalog()
+        return self._catalog
     
-    async def process_document(self, file_path: str, document_id: Optional[str] = None) -> str:
-        """Process a document and add it to the vector store"""
+    async def process_document(self, file_path: str, document_id: Optional[str] = None,
+                               content_hash: Optional[str] = None) -> str:
+        """Process a document and add it to the vector store.
+
+        Parsing and chunking run in the ingestion process pool; embedding and
+        the Chroma write run on the ingestion thread pool, so the event loop
+        only awaits the results. Files of at least
+        STREAMING_INGESTION_MIN_BYTES are streamed instead (see
+        `ingest_stream`). `content_hash` is the SHA-256 of the file computed
+        at upload time, recorded in the chunk metadata.
+        """
         try:
             # Generate unique document ID if not provided
             if not document_id:
                 document_id = str(uuid.uuid4())
             
-            # Get appropriate processor
-            file_extension = Path(file_path).suffix
-            processor = ProcessorFactory.get_processor_by_extension(file_extension)
-            
-            # Extract text and metadata
-            text = processor.extract_text(file_path)
-            metadata = processor.extract_metadata(file_path)
-            logger.info(f"Extracted text length: {len(text)} chars from {file_path}")
+            if self.is_streamed(file_path):
+                await WorkerPools.run_io(self.ingest_stream, file_path, document_id, content_hash)
+                return document_id
             
-            # Add document ID to metadata
-            metadata['document_id'] = document_id
-            
-            # Recover original filename if it has uuid prefix
-            filename = Path(file_path).name
-            if len(filename) > 33 and filename[32] == '_':
-                try:
-                    int(filename[:32], 16)
-                    filename = filename[33:]
-                except ValueError:
-                    pass
-            metadata['original_filename'] = filename
-            
-            # Chunk the document
-            chunks = processor.chunk_document(
-                text=text,
-                document_id=document_id,
-                chunk_size=Config.CHUNK_SIZE,
-                chunk_overlap=Config.CHUNK_OVERLAP
-            )
-            
-            # Add metadata to each chunk
-            for chunk in chunks:
-                chunk.metadata.update(metadata)
+            # Extract, chunk and attach metadata off the event loop
+            chunks = await self._prepare(file_path, document_id, content_hash)
             
             # Add to vector store
-            self.vector_store.add_documents(chunks)
+            await WorkerPools.run_io(self.vector_store.add_documents, chunks)
             
             return document_id
             
         except Exception as e:
             raise Exception(f"Error processing document: {str(e)}") from e
     
+    @staticmethod
+    async def _prepare(file_path: str, document_id: str,
+                       content_hash: Optional[str]) -> List[DocumentChunk]:
+        if await DocumentService._shards_pages(file_path):
+            # Large PDFs are sharded over the process pool by page range from this thread
+            return await WorkerPools.run_io(prepare_document, file_path, document_id, content_hash)
+        return await WorkerPools.run_cpu(prepare_document, file_path, document_id, content_hash)
+    
+    @staticmethod
+    async def _shards_pages(file_path: str) -> bool:
+        """Whether a file is a PDF with enough pages to be split across the process pool"""
+        if Path(file_path).suffix.lower() != '.pdf':
+            return False
+        from src.document_processor.pdf_processor import page_count
+        try:
+            pages = await WorkerPools.run_io(page_count, file_path)
+        except Exception as e:
+            # Let the worker process report the parse error
+            logger.warning(f"Could not count pages of {file_path}: {e}")
+            return False
+        return pages >= Config.PDF_PARALLEL_MIN_PAGES
+    
+    @staticmethod
+    def build_chunks(processor: BaseDocumentProcessor, file_path: str, document_id: str,
+                     text: str, metadata: Dict[str, Any]) -> List[DocumentChunk]:
+        """Chunk extracted text and attach document-level metadata to every chunk"""
+        metadata = dict(metadata)
+        structure = {key: metadata.pop(key) for key in _STRUCTURE_KEYS if key in metadata}
+        return list(DocumentService._iter_chunks(processor, [text], file_path, document_id, metadata, structure))
+    
+    @staticmethod
+    def iter_file_chunks(file_path: str, document_id: str,
+                         content_hash: Optional[str] = None) -> Iterator[DocumentChunk]:
+        """Stream a file's chunks without extracting its full text first"""
+        processor = ProcessorFactory.get_processor_by_extension(Path(file_path).suffix)
+        metadata = processor.extract_metadata(file_path)
+        if content_hash:
+            metadata['file_sha256'] = content_hash
+        return DocumentService.iter_document_chunks(processor, file_path, document_id, metadata)
+    
+    @staticmethod
+    def is_streamed(file_path: str) -> bool:
+        """Whether a file is large enough to be ingested by streaming"""
+        return os.path.getsize(file_path) >= Config.STREAMING_INGESTION_MIN_BYTES
+    
+    @staticmethod
+    def iter_document_chunks(processor: BaseDocumentProcessor, file_path: str, document_id: str,
+                             metadata: Dict[str, Any]) -> Iterator[DocumentChunk]:
+        """Stream a file's chunks, with document-level metadata, as the file is read"""
+        # For paged formats each segment is a page, so segment offsets are page offsets
+        page_offsets: Optional[List[int]] = [] if processor.paged else None
+        return DocumentService._iter_chunks(processor, processor.iter_segments(file_path), file_path,
+                                            document_id, metadata, {'page_offsets': page_offsets},
+                                            segment_offsets=page_offsets)
+    
+    @staticmethod
+    def _iter_chunks(processor: BaseDocumentProcessor, segments: Iterable[str], file_path: str,
+                     document_id: str, metadata: Dict[str, Any], structure: Optional[Dict[str, Any]] = None,
+                     segment_offsets: Optional[List[int]] = None) -> Iterator[DocumentChunk]:
+        """Chunk text segments, tagging each chunk with the page, attachment, heading and section it is in.
+
+        `structure` holds the structural hints of the parsed document (see
+        `_STRUCTURE_KEYS`); all offsets are positions in the document text.
+        """
+        metadata = DocumentService._document_metadata(file_path, document_id, metadata)
+        structure = structure or {}
+        page_offsets = structure.get('page_offsets')
+        section_offsets = structure.get('section_offsets')
+        attachments = structure.get('attachments') or []
+        attachment_starts = [attachment['start'] for attachment in attachments]
+        headings = structure.get('headings') or []
+        heading_starts = [heading['start'] for heading in headings]
+        breaks = sorted(set(heading_starts) | set(section_offsets or [])) or None
+        chunker = processor.make_chunker(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        for record in chunker.iter_records(segments, segment_offsets, breaks):
+            chunk_metadata = dict(metadata)
+            # The content hash lets updates diff chunks
+            chunk_metadata['content_hash'] = chunk_content_hash(record.text)
+            if page_offsets:
+                chunk_metadata['page_start'], chunk_metadata['page_end'] = \
+                    page_span(record.start, record.end, page_offsets)
+            if section_offsets:
+                chunk_metadata['section'] = bisect_right(section_offsets, record.start)
+            position = bisect_right(heading_starts, record.start) - 1
+            if position >= 0:
+                chunk_metadata['heading'] = headings[position]['text']
+            position = bisect_right(attachment_starts, record.start) - 1
+            if position >= 0:
+                chunk_metadata.update(DocumentService._attachment_metadata(attachments[position], record.start, record.end))
+            yield record.to_chunk(document_id, chunk_metadata)
+    
+    @staticmethod
+    def _attachment_metadata(attachment: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+        """Metadata of the attachment a chunk starts in, including the attachment pages it covers"""
+        metadata = {
+            'attachment_index': attachment['index'],
+            'attachment_filename': attachment['filename'],
+            'attachment_content_type': attachment['content_type'],
+            'attachment_file_type': attachment['file_type'],
+        }
+        if attachment.get('page_offsets'):
+            metadata['page_start'], metadata['page_end'] = \
+                page_span(start, min(end, attachment['end']), attachment['page_offsets'])
+        return metadata
+    
+    def ingest_stream(self, file_path: str, document_id: str, content_hash: Optional[str] = None) -> int:
+        """Index a file with memory bounded by the embedding batch size.
+
+        Segments are chunked as they are read, and chunks are embedded and
+        written in batches of EMBEDDING_BATCH_SIZE, so neither the full text
+        nor the full chunk list is ever held. A failure part way removes the
+        chunks already written. Returns the number of chunks indexed.
+        """
+        batch: List[DocumentChunk] = []
+        written = 0
+        try:
+            for chunk in self.iter_file_chunks(file_path, document_id, content_hash):
+                batch.append(chunk)
+                if len(batch) >= Config.EMBEDDING_BATCH_SIZE:
+                    written += self._write_batch(batch)
+                    batch = []
+            if batch:
+                written += self._write_batch(batch)
+        except Exception:
+            if written:
+                self.vector_store.delete_document(document_id)
+            raise
+        
+        logger.info(f"Streamed {written} chunks from {file_path}")
+        return written
+    
+    def _write_batch(self, chunks: List[DocumentChunk]) -> int:
+        embeddings = self.vector_store.embed_documents(chunks)
+        self.vector_store.write_documents(chunks, embeddings)
+        return len(chunks)
+    
+    @staticmethod
+    def _document_metadata(file_path: str, document_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = dict(metadata)
+        
+        # Add document ID to metadata
+        metadata['document_id'] = document_id
+        metadata['original_filename'] = DocumentService._original_filename(file_path)
+        return metadata
+    
+    async def update_document(self, file_path: str, document_id: str,
+                              content_hash: Optional[str] = None) -> Dict[str, int]:
+        """Re-index a changed version of an existing document.
+
+        The new file is re-chunked and diffed against the stored chunks by
+        content hash, so only added or changed chunks are embedded and
+        written and only vanished chunks are deleted. Files of at least
+        STREAMING_INGESTION_MIN_BYTES are diffed as they are read. Returns
+        the number of chunks added, removed and left unchanged.
+        """
+        try:
+            if self.is_streamed(file_path):
+                return await WorkerPools.run_io(
+                    self.apply_chunk_diff, document_id, self.iter_file_chunks(file_path, document_id, content_hash)
+                )
+            chunks = await self._prepare(file_path, document_id, content_hash)
+            return await WorkerPools.run_io(self.apply_chunk_diff, document_id, chunks)
+        except Exception as e:
+            raise Exception(f"Error updating document: {str(e)}") from e
+    
+    def apply_chunk_diff(self, document_id: str, chunks: Iterable[DocumentChunk]) -> Dict[str, int]:
+        """Bring the stored chunks of a document in line with `chunks`.
+
+        Chunks are consumed in batches of EMBEDDING_BATCH_SIZE, so a streamed
+        file is never held in memory as a whole.
+        """
+        stored = self.vector_store.get_document_chunks(document_id)
+        
+        # Stored chunk IDs by content hash; a hash may occur more than once
+        available: Dict[str, List[str]] = defaultdict(list)
+        for chunk_id, text, metadata in stored:
+            available[metadata.get('content_hash') or chunk_content_hash(text)].append(chunk_id)
+        # New chunks must not collide with any ID that is stored or kept
+        used_ids = {chunk_id for chunk_id, _, _ in stored}
+        
+        counts = {"added": 0, "unchanged": 0}
+        unchanged: List[DocumentChunk] = []
+        added: List[DocumentChunk] = []
+        
+        def flush() -> None:
+            if added:
+                embeddings = self.vector_store.embed_documents(added)
+                self.vector_store.write_documents(added, embeddings)
+            if unchanged:
+                self.vector_store.update_chunk_metadata(unchanged)
+            counts["added"] += len(added)
+            counts["unchanged"] += len(unchanged)
+            added.clear()
+            unchanged.clear()
+        
+        for chunk in chunks:
+            matches = available.get(chunk.metadata['content_hash'])
+            if matches:
+                chunk.chunk_id = matches.pop()
+                unchanged.append(chunk)
+            else:
+                if chunk.chunk_id in used_ids:
+                    chunk.chunk_id = f"{chunk.chunk_id}_{chunk.metadata['content_hash'][:12]}"
+                used_ids.add(chunk.chunk_id)
+                added.append(chunk)
+            if len(added) + len(unchanged) >= Config.EMBEDDING_BATCH_SIZE:
+                flush()
+        flush()
+        
+        # Add before deleting, so a failure part way never loses content
+        removed = [chunk_id for chunk_ids in available.values() for chunk_id in chunk_ids]
+        self.vector_store.delete_chunks(removed)
+        
+        logger.info(f"Updated document {document_id}: {counts['added']} chunks added, "
+                    f"{len(removed)} removed, {counts['unchanged']} unchanged")
+        return {"added": counts["added"], "removed": len(removed), "unchanged": counts["unchanged"]}
+    
+    @staticmethod
+    def _original_filename(file_path: str) -> str:
+        """Recover original filename if it has uuid prefix"""
+        filename = Path(file_path).name
+        if len(filename) > 33 and filename[32] == '_':
+            try:
+                int(filename[:32], 16)
+                filename = filename[33:]
+            except ValueError:
+                pass
+        return filename
+    
     async def delete_document(self, document_id: str) -> None:
-        """Delete a document from the vector store"""
+        """Delete a document from the vector store and release its catalog entry"""
         try:
-            self.vector_store.delete_document(document_id)
+            await WorkerPools.run_io(self.vector_store.delete_document, document_id)
+            await WorkerPools.run_io(self.catalog.release, document_id)
         except Exception as e:
             raise Exception(f"Error deleting document: {str(e)}") from e
     
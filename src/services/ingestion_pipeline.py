@@ -0,0 +1,295 @@
+"""
+Staged bulk ingestion pipeline used by seed_db.py
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.config import Config
+from src.core.models import DocumentChunk
+from src.document_processor.processor_factory import ProcessorFactory
+from src.services.document_catalog import file_sha256
+from src.services.document_service import DocumentService, extract_document
+from src.utils.logger import get_logger
+from src.utils.worker_pools import WorkerPools
+
+logger = get_logger(__name__)
+
+# Marks the end of the stream between pipeline stages
+_DONE = object()
+
+
+@dataclass
+class IngestionStats:
+    """Counters and throughput for a bulk ingestion run"""
+    files: int = 0
+    failed_files: List[str] = field(default_factory=list)
+    duplicates: int = 0
+    pages: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    written: int = 0
+    elapsed: float = 0.0
+
+    def rate(self, count: int) -> float:
+        return count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "files": self.files,
+            "failed_files": len(self.failed_files),
+            "duplicates": self.duplicates,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "embeddings": self.embeddings,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "pages_per_second": round(self.rate(self.pages), 2),
+            "chunks_per_second": round(self.rate(self.chunks), 2),
+            "embeddings_per_second": round(self.rate(self.embeddings), 2),
+        }
+
+
+class BulkIngestionPipeline:
+    """Index many files through bounded, concurrently running stages.
+
+    1. Extraction runs in a process pool, one file per task.
+    2. Chunking consumes extracted files as they complete and streams each
+       file's chunks downstream.
+    3. An embedding batcher groups chunks into `batch_size` batches.
+    4. A single writer thread performs batched `collection.add` calls and
+       persists the lexical index once at the end.
+
+    Files of at least STREAMING_INGESTION_MIN_BYTES skip the process pool
+    and are chunked as they are read, so their full text is never held.
+
+    Stages are connected by bounded queues, so a slow stage applies
+    back-pressure instead of letting memory grow. Files whose content hash is
+    already in the document catalog are skipped before extraction; documents
+    that are not completely written by the end of a run are removed again
+    and released from the catalog.
+    """
+
+    def __init__(self, document_service: DocumentService,
+                 workers: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 queue_size: int = 8):
+        self.document_service = document_service
+        self.vector_store = document_service.vector_store
+        self.workers = max(1, workers or Config.INGESTION_WORKERS)
+        self.batch_size = max(1, batch_size or Config.EMBEDDING_BATCH_SIZE)
+        self.queue_size = queue_size
+        self.stats = IngestionStats()
+        self._stats_lock = threading.Lock()
+        self._abort = threading.Event()
+        # Chunks of each registered document not yet written (None until extracted)
+        self._unwritten: Dict[str, Optional[int]] = {}
+
+    def run(self, file_paths: List[str]) -> IngestionStats:
+        """Run the pipeline over `file_paths` and return its statistics"""
+        self.stats = IngestionStats()
+        self._abort.clear()
+        self._unwritten = {}
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size * self.batch_size)
+        write_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+
+        embedder = threading.Thread(
+            target=self._guard, args=(self._embed_stage, errors, chunk_queue, write_queue),
+            name="ingest-embedder", daemon=True
+        )
+        writer = threading.Thread(
+            target=self._guard, args=(self._write_stage, errors, write_queue),
+            name="ingest-writer", daemon=True
+        )
+
+        start = time.perf_counter()
+        embedder.start()
+        writer.start()
+        try:
+            self._extract_and_chunk(file_paths, chunk_queue)
+        except BaseException:
+            self._abort.set()
+            raise
+        finally:
+            self._put(chunk_queue, _DONE)
+            embedder.join()
+            writer.join()
+            self._release_incomplete()
+            self.stats.elapsed = time.perf_counter() - start
+
+        if errors:
+            raise errors[0]
+        return self.stats
+
+    def _guard(self, stage, errors: List[BaseException], *queues) -> None:
+        try:
+            stage(*queues)
+        except BaseException as e:
+            logger.error(f"Ingestion stage {threading.current_thread().name} failed: {e}", exc_info=True)
+            errors.append(e)
+            # Unblock the other stages; they stop at their next queue operation
+            self._abort.set()
+
+    def _put(self, q: "queue.Queue", item: Any) -> None:
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: "queue.Queue") -> Any:
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._abort.is_set():
+                    return _DONE
+
+    def _register(self, file_path: str) -> Optional[Tuple[str, str]]:
+        """Claim a file in the catalog; returns (document_id, content_hash) or None to skip it"""
+        try:
+            content_hash = file_sha256(file_path)
+        except OSError as e:
+            logger.error(f"Failed to read {file_path}: {e}")
+            self.stats.failed_files.append(file_path)
+            return None
+        document_id, is_new = self.document_service.catalog.register(
+            content_hash, str(uuid.uuid4()), Path(file_path).name, file_path
+        )
+        if not is_new:
+            logger.info(f"Skipping {Path(file_path).name}: already indexed as document {document_id}")
+            self.stats.duplicates += 1
+            return None
+        self._unwritten[document_id] = None
+        return document_id, content_hash
+
+    def _release_incomplete(self) -> None:
+        for document_id, unwritten in self._unwritten.items():
+            if unwritten == 0:
+                continue
+            try:
+                if unwritten is not None:
+                    self.vector_store.delete_document(document_id)
+                self.document_service.catalog.release(document_id)
+            except Exception as e:
+                logger.error(f"Failed to roll back partially indexed document {document_id}: {e}")
+
+    def _extract_and_chunk(self, file_paths: List[str], chunk_queue: "queue.Queue") -> None:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                 initializer=WorkerPools.init_worker,
+                                 initargs=(ProcessorFactory.registrations(), self.workers)) as pool:
+            pending = {}
+            paths = iter(file_paths)
+
+            def submit_next() -> None:
+                for path in paths:
+                    registered = self._register(path)
+                    if registered is None:
+                        continue
+                    if DocumentService.is_streamed(path):
+                        self._stream_file(path, *registered, chunk_queue)
+                        continue
+                    pending[pool.submit(extract_document, path)] = (path, *registered)
+                    return
+
+            # Keep a bounded number of extracted documents in flight
+            for _ in range(self.workers * 2):
+                submit_next()
+
+            while pending:
+                if self._abort.is_set():
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    return
+                future = next(as_completed(pending))
+                file_path, document_id, content_hash = pending.pop(future)
+                submit_next()
+                try:
+                    text, metadata = future.result()
+                    metadata['file_sha256'] = content_hash
+                    processor = ProcessorFactory.get_processor_by_extension(Path(file_path).suffix)
+                    chunks = self.document_service.build_chunks(
+                        processor, file_path, document_id, text, metadata
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to extract {file_path}: {e}")
+                    self.stats.failed_files.append(file_path)
+                    self.document_service.catalog.release(document_id)
+                    del self._unwritten[document_id]
+                    continue
+
+                with self._stats_lock:
+                    self._unwritten[document_id] = len(chunks)
+                    self.stats.files += 1
+                    self.stats.pages += int(metadata.get("page_count", 1) or 1)
+                    self.stats.chunks += len(chunks)
+                logger.info(f"Extracted {len(chunks)} chunks from {Path(file_path).name}")
+
+                for chunk in chunks:
+                    self._put(chunk_queue, chunk)
+
+    def _stream_file(self, file_path: str, document_id: str, content_hash: str,
+                     chunk_queue: "queue.Queue") -> None:
+        """Chunk a large file as it is read and queue its chunks"""
+        # One extra count holds the document incomplete until every chunk is queued
+        with self._stats_lock:
+            self._unwritten[document_id] = 1
+        count = 0
+        pages = 1
+        try:
+            for chunk in self.document_service.iter_file_chunks(file_path, document_id, content_hash):
+                if self._abort.is_set():
+                    return
+                with self._stats_lock:
+                    self._unwritten[document_id] += 1
+                count += 1
+                pages = chunk.metadata.get('page_end', pages)
+                self._put(chunk_queue, chunk)
+        except Exception as e:
+            # Chunks already queued are rolled back with the document at the end of the run
+            logger.error(f"Failed to extract {file_path}: {e}")
+            self.stats.failed_files.append(file_path)
+            return
+
+        with self._stats_lock:
+            self._unwritten[document_id] -= 1
+            self.stats.files += 1
+            self.stats.pages += int(pages or 1)
+            self.stats.chunks += count
+        logger.info(f"Streamed {count} chunks from {Path(file_path).name}")
+
+    def _embed_stage(self, chunk_queue: "queue.Queue", write_queue: "queue.Queue") -> None:
+        batch: List[DocumentChunk] = []
+        while True:
+            item = self._get(chunk_queue)
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (item is _DONE or len(batch) >= self.batch_size):
+                embeddings = self.vector_store.embed_documents(batch)
+                with self._stats_lock:
+                    self.stats.embeddings += len(embeddings)
+                self._put(write_queue, (batch, embeddings))
+                batch = []
+            if item is _DONE:
+                self._put(write_queue, _DONE)
+                return
+
+    def _write_stage(self, write_queue: "queue.Queue") -> None:
+        while True:
+            item = self._get(write_queue)
+            if item is _DONE:
+                return
+            chunks, embeddings = item
+            self.vector_store.write_documents(chunks, embeddings)
+            with self._stats_lock:
+                self.stats.written += len(chunks)
+                for document_id, count in Counter(c.metadata['document_id'] for c in chunks).items():
+                    self._unwritten[document_id] -= count
@@ -0,0 +1,357 @@
+"""
+Durable SQLite-backed queue of document ingestion jobs
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.core.config import Config
+from src.utils.cloud_sync import CloudSyncService
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobOperation:
+    INDEX = "index"
+    UPDATE = "update"
+
+
+class JobQueue:
+    """Ingestion jobs persisted in SQLite.
+
+    The queue survives restarts and is shared by every uvicorn worker on the
+    host. Jobs are claimed atomically with a lease; a job whose lease expires
+    (its worker crashed or was killed) is put back in the queue. Failed
+    attempts are retried with exponential backoff, and finished jobs are
+    deleted once they are older than the configured TTL.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 max_attempts: Optional[int] = None,
+                 retry_backoff: Optional[float] = None,
+                 lease_seconds: Optional[float] = None):
+        self.path = path or Config.JOB_QUEUE_PATH
+        self.max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        self.retry_backoff = retry_backoff if retry_backoff is not None else Config.JOB_RETRY_BACKOFF_SECONDS
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " document_id TEXT PRIMARY KEY,"
+                " file_path TEXT NOT NULL,"
+                " filename TEXT,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " error TEXT,"
+                " worker_id TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " available_at REAL NOT NULL,"
+                " lease_expires_at REAL,"
+                " content_hash TEXT,"
+                " operation TEXT NOT NULL DEFAULT 'index')"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at)")
+            # Columns added after the first release
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in (("content_hash", "TEXT"),
+                                       ("operation", "TEXT NOT NULL DEFAULT 'index'")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so claims never race
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, document_id: str, file_path: str, filename: Optional[str] = None,
+                content_hash: Optional[str] = None, operation: str = JobOperation.INDEX) -> None:
+        """Queue a job for a document.
+
+        A finished job for the same document is replaced; a ValueError is
+        raised while an earlier job for the document is still pending.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (document_id, file_path, filename, content_hash, operation, status,"
+                " created_at, updated_at, available_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (document_id) DO UPDATE SET file_path = excluded.file_path,"
+                " filename = excluded.filename, content_hash = excluded.content_hash,"
+                " operation = excluded.operation, status = excluded.status, attempts = 0,"
+                " error = NULL, worker_id = NULL, lease_expires_at = NULL,"
+                " created_at = excluded.created_at, updated_at = excluded.updated_at,"
+                " available_at = excluded.available_at"
+                " WHERE jobs.status IN (?, ?)",
+                (document_id, file_path, filename, content_hash, operation, JobStatus.QUEUED,
+                 now, now, now, JobStatus.COMPLETED, JobStatus.FAILED)
+            )
+            if cursor.rowcount == 0:
+                raise ValueError(f"Document {document_id} already has a pending job")
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest runnable job, or return None"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT document_id FROM jobs WHERE status = ? AND available_at <= ?"
+                " ORDER BY available_at, created_at LIMIT 1",
+                (JobStatus.QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker_id = ?,"
+                " lease_expires_at = ?, updated_at = ? WHERE document_id = ?",
+                (JobStatus.PROCESSING, worker_id, now + self.lease_seconds, now, row["document_id"])
+            )
+            return self._row_to_job(conn.execute(
+                "SELECT * FROM jobs WHERE document_id = ?", (row["document_id"],)
+            ).fetchone())
+
+    def heartbeat(self, document_id: str, worker_id: str) -> None:
+        """Extend the lease of a job that is still being processed"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ?"
+                " WHERE document_id = ? AND worker_id = ? AND status = ?",
+                (now + self.lease_seconds, now, document_id, worker_id, JobStatus.PROCESSING)
+            )
+
+    def complete(self, document_id: str) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE document_id = ?",
+                (JobStatus.COMPLETED, now, document_id)
+            )
+
+    def fail(self, document_id: str, error: str) -> str:
+        """Record a failed attempt; requeue with backoff unless attempts are exhausted.
+
+        Returns the job's new status.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE document_id = ?", (document_id,)).fetchone()
+            if row is None:
+                return JobStatus.FAILED
+            attempts = row["attempts"]
+            if attempts < self.max_attempts:
+                status = JobStatus.QUEUED
+                # Exponential backoff with jitter
+                delay = self.retry_backoff * (2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+            else:
+                status = JobStatus.FAILED
+                delay = 0.0
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL,"
+                " available_at = ?, updated_at = ? WHERE document_id = ?",
+                (status, error, now + delay, now, document_id)
+            )
+            return status
+
+    def recover_stale(self) -> int:
+        """Requeue processing jobs whose lease has expired. Returns the number recovered."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, lease_expires_at = NULL,"
+                " available_at = ?, updated_at = ? WHERE status = ? AND lease_expires_at < ?",
+                (JobStatus.QUEUED, now, now, JobStatus.PROCESSING, now)
+            )
+            recovered = cursor.rowcount
+        if recovered:
+            logger.warning(f"Recovered {recovered} ingestion jobs with expired leases")
+        return recovered
+
+    def release_worker(self, worker_id: str) -> int:
+        """Requeue the jobs a stopping worker still holds. Returns the number requeued.
+
+        The interrupted attempt does not count towards the job's attempts.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), worker_id = NULL,"
+                " lease_expires_at = NULL, available_at = ?, updated_at = ?"
+                " WHERE worker_id = ? AND status = ?",
+                (JobStatus.QUEUED, now, now, worker_id, JobStatus.PROCESSING)
+            )
+            return cursor.rowcount
+
+    def cleanup(self, ttl_seconds: Optional[float] = None) -> int:
+        """Delete completed and failed jobs older than the TTL. Returns the number deleted."""
+        ttl = ttl_seconds if ttl_seconds is not None else Config.JOB_TTL_SECONDS
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JobStatus.COMPLETED, JobStatus.FAILED, time.time() - ttl)
+            )
+            return cursor.rowcount
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE document_id = ?", (document_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        return dict(row)
+
+
+class IngestionWorker:
+    """Runs queued ingestion jobs with a fixed concurrency limit.
+
+    Each uvicorn worker process runs one of these. Jobs are claimed from the
+    shared queue, so several processes can drain the same backlog without
+    double-processing a document.
+    """
+
+    def __init__(self, job_queue: JobQueue, document_service,
+                 concurrency: Optional[int] = None,
+                 poll_interval: float = 1.0,
+                 maintenance_interval: float = 60.0):
+        self.job_queue = job_queue
+        self.document_service = document_service
+        self.concurrency = max(1, concurrency or Config.INGESTION_CONCURRENCY)
+        self.poll_interval = poll_interval
+        self.maintenance_interval = maintenance_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        await asyncio.to_thread(self.job_queue.recover_stale)
+        self._tasks = [asyncio.create_task(self._run_slot()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+        logger.info(f"Ingestion worker {self.worker_id} started with concurrency {self.concurrency}")
+
+    async def stop(self) -> None:
+        """Cancel the running jobs and hand them back to the queue for the next worker"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        released = await asyncio.to_thread(self.job_queue.release_worker, self.worker_id)
+        if released:
+            logger.info(f"Ingestion worker {self.worker_id} requeued {released} interrupted jobs")
+
+    def notify(self) -> None:
+        """Wake idle slots after a job was enqueued in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_slot(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.job_queue.claim, self.worker_id)
+            except Exception as e:
+                logger.error(f"Failed to claim ingestion job: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        document_id = job["document_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(document_id))
+        try:
+            if job["operation"] == JobOperation.UPDATE:
+                await self.document_service.update_document(
+                    job["file_path"], document_id, content_hash=job["content_hash"]
+                )
+            else:
+                await self.document_service.process_document(
+                    job["file_path"], document_id=document_id, content_hash=job["content_hash"]
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = await asyncio.to_thread(self.job_queue.fail, document_id, str(e))
+            logger.error(f"Indexing attempt {job['attempts']} failed for document {document_id} ({status}): {e}",
+                         exc_info=True)
+            if status == JobStatus.FAILED:
+                # Let a later upload of the same bytes try again
+                await asyncio.to_thread(self._release, document_id)
+            return
+        finally:
+            heartbeat.cancel()
+
+        # Trigger background upload sync if configured
+        try:
+            await asyncio.to_thread(CloudSyncService.upload_vector_store)
+        except Exception as se:
+            logger.error(f"Failed to sync vector store update to S3: {se}")
+
+        await asyncio.to_thread(self.job_queue.complete, document_id)
+        logger.info(f"Background indexing completed successfully for document {document_id}")
+
+    def _release(self, document_id: str) -> None:
+        try:
+            self.document_service.catalog.release(document_id)
+        except Exception as e:
+            logger.error(f"Failed to release catalog entry for document {document_id}: {e}")
+
+    async def _heartbeat(self, document_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.job_queue.lease_seconds / 3)
+            await asyncio.to_thread(self.job_queue.heartbeat, document_id, self.worker_id)
+
+    async def _maintenance(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await asyncio.to_thread(self.job_queue.recover_stale)
+                removed = await asyncio.to_thread(self.job_queue.cleanup)
+                if removed:
+                    logger.info(f"Removed {removed} expired ingestion jobs")
+            except Exception as e:
+                logger.error(f"Ingestion queue maintenance failed: {e}", exc_info=True)
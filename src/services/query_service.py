@@ -1,45 +1,48 @@
 import asyncio
-from typing import List
-from src.core.models import QueryRequest, ProcessingResponse, RetrievalResult
+from typing import Any, Dict, List, Optional, Tuple
+from src.core.models import DecisionResult, ParsedQuery, QueryRequest, ProcessingResponse, RetrievalResult
 from src.query_engine.parser import QueryParser
 from src.retrieval.vector_store import VectorStore
 from src.retrieval.hybrid_search import HybridSearcher
 from src.decision_engine.evaluator import DecisionEvaluator
+from src.decision_engine.rules import RulesEngine
+from src.core.config import Config
+from src.core.registry import ResourceRegistry
+from src.utils.logger import get_logger
+from src.utils.stage_graph import StageGraph
+
+logger = get_logger(__name__)
 
 class QueryService:
     """Service for processing natural language queries"""
     
-    def __init__(self):
+    def __init__(self, vector_store: Optional[VectorStore] = None):
         self.query_parser = QueryParser()
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or ResourceRegistry.get_vector_store()
         self.hybrid_searcher = HybridSearcher(self.vector_store)
         self.decision_evaluator = DecisionEvaluator()
     
     async def process_query(self, request: QueryRequest) -> ProcessingResponse:
-        """Process a complete query request"""
+        """Process a complete query request.
+
+        Parsing and retrieval are independent and run concurrently; the
+        decision waits for both. If either fails, the other is cancelled.
+        In "combined" PIPELINE_MODE the query is parsed locally and a single
+        LLM call extracts the query fields and makes the decision.
+        """
         try:
-            # Parse the query using thread pool to avoid blocking event loop
-            parsed_query = await asyncio.to_thread(self.query_parser.parse_query, request.query)
-            
-            # Retrieve relevant documents
-            retrieved_docs = await asyncio.to_thread(
-                self.hybrid_searcher.search,
-                query=request.query,
-                document_ids=request.document_ids
-            )
+            if Config.RULES_FAST_PATH:
+                response = self.prescreen(request)
+                if response is not None:
+                    return response
             
-            # Make decision based on retrieved documents
-            decision = await asyncio.to_thread(
-                self.decision_evaluator.evaluate, 
-                parsed_query, 
-                retrieved_docs, 
-                request.context
-            )
+            results = await self.build_stage_graph(request).run()
+            parsed_query, decision = results["decide"]
             
             return ProcessingResponse(
                 query=request.query,
                 parsed_query=parsed_query,
-                retrieved_documents=retrieved_docs,
+                retrieved_documents=results["retrieve"],
                 decision=decision,
                 processing_time=0.0  # Will be set by the API route
             )
@@ -47,6 +50,73 @@ class QueryService:
         except Exception as e:
             raise Exception(f"Error processing query: {str(e)}") from e
     
+    def prescreen(self, request: QueryRequest) -> Optional[ProcessingResponse]:
+        """Decide the query from the regex parse and request context alone, if a rule settles it.
+
+        Exclusions and age/amount escalations need neither the LLM parse nor
+        retrieval, so when a rule fires the response is returned without
+        either; otherwise None. Only unambiguous values are used: the claim
+        amount must carry a currency marker or come from the context.
+        """
+        parsed_query = self.query_parser.parse_query_strict(request.query)
+        decision = RulesEngine.evaluate_rules(parsed_query, request.context)
+        if decision is None:
+            return None
+        
+        decision.metadata = {**(decision.metadata or {}), "fast_path": True}
+        logger.info(f"Query settled by rule {decision.metadata.get('rule_triggered')} without LLM or retrieval")
+        return ProcessingResponse(
+            query=request.query,
+            parsed_query=parsed_query,
+            retrieved_documents=[],
+            decision=decision,
+            processing_time=0.0  # Will be set by the API route
+        )
+    
+    def build_stage_graph(self, request: QueryRequest) -> StageGraph:
+        """Stages of a query; LLM calls are awaited and blocking search runs in a thread.
+
+        The decide stage returns the final parsed query with the decision.
+        """
+        combined = Config.PIPELINE_MODE == "combined"
+        
+        async def parse() -> ParsedQuery:
+            if combined:
+                return self.query_parser.parse_query_fast(request.query)
+            return await self.query_parser.parse_query_async(request.query)
+        
+        async def retrieve() -> List[RetrievalResult]:
+            # Search only needs the raw query text, not the parse result
+            return await asyncio.to_thread(
+                self.hybrid_searcher.search,
+                query=request.query,
+                document_ids=request.document_ids
+            )
+        
+        async def decide(parse: ParsedQuery,
+                         retrieve: List[RetrievalResult]) -> Tuple[ParsedQuery, DecisionResult]:
+            if combined:
+                return await self.decision_evaluator.evaluate_combined_async(
+                    parse,
+                    retrieve,
+                    request.context
+                )
+            decision = await self.decision_evaluator.evaluate_async(
+                parse,
+                retrieve,
+                request.context
+            )
+            return parse, decision
+        
+        return (StageGraph()
+                .add("parse", parse)
+                .add("retrieve", retrieve)
+                .add("decide", decide, after=("parse", "retrieve")))
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get query embedding cache statistics"""
+        return self.vector_store.query_embedding_cache.stats()
+    
     def search_documents(self, query: str, top_k: int = 5, 
                         document_ids: List[str] = None) -> List[RetrievalResult]:
         """Search for relevant documents"""
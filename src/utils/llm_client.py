@@ -0,0 +1,223 @@
+"""
+Shared async LLM client with connection pooling, rate scheduling, timeouts and retries
+"""
+import asyncio
+import contextvars
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, TypeVar
+
+from src.core.config import Config
+from src.utils.logger import get_logger
+from src.utils.rate_scheduler import CallOutcome, LLMPriority, RateScheduler, current_priority
+from src.utils.worker_pools import WorkerPools
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+def _default_client_factory() -> Any:
+    import httpx
+    from groq import AsyncGroq
+
+    limits = httpx.Limits(
+        max_connections=Config.LLM_MAX_CONCURRENCY,
+        max_keepalive_connections=Config.LLM_MAX_CONCURRENCY,
+    )
+    # Retries are handled here, with jitter, so the SDK's own are disabled
+    return AsyncGroq(
+        api_key=Config.GROQ_API_KEY,
+        max_retries=0,
+        http_client=httpx.AsyncClient(limits=limits, timeout=Config.LLM_TIMEOUT_SECONDS),
+    )
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    try:
+        import groq
+    except ImportError:
+        return False
+    if isinstance(error, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code in (408, 409)
+
+
+async def _call(func: Callable[[], Any]) -> Any:
+    result = func()
+    return await result if asyncio.iscoroutine(result) else result
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _error_headers(error: BaseException) -> Optional[Mapping[str, str]]:
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+
+def budget_share() -> float:
+    """This process's share of the configured LLM budgets.
+
+    Each process has its own client and scheduler, so the limits are split:
+    ingestion worker processes divide LLM_INGESTION_SHARE evenly and the app
+    process keeps the rest.
+    """
+    share = min(max(Config.LLM_INGESTION_SHARE, 0.0), 1.0)
+    pool_size = WorkerPools.worker_pool_size()
+    if pool_size is None:
+        return 1.0 - share
+    return share / max(1, pool_size)
+
+
+def _scaled(limit: int, share: float) -> int:
+    return max(1, int(limit * share)) if limit else 0
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt size (about four characters per token) plus the expected completion"""
+    characters = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            characters += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    return characters // 4 + Config.LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+class LLMClient:
+    """One async chat-completion client for the whole process.
+
+    All calls run on a private event loop thread that owns an AsyncGroq
+    client, so every caller shares one keep-alive HTTP connection pool no
+    matter which event loop or thread it calls from. Calls are admitted by
+    a `RateScheduler`, which orders them by `LLMPriority`, keeps them under
+    the requests/tokens per minute budgets and adapts concurrency (at most
+    `max_concurrency`) to 429s. The configured budgets are split between
+    processes (see `budget_share`) and priorities only order calls within
+    one process. Each attempt is bounded by `timeout`, and
+    connection errors, timeouts, rate limits and server errors are retried
+    with exponential backoff and full jitter.
+
+    Async callers await `chat` without occupying a thread while the request
+    is in flight; code running in threads or worker processes uses
+    `chat_sync`.
+    """
+
+    def __init__(self, client_factory: Optional[Callable[[], Any]] = None,
+                 max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None,
+                 backoff: Optional[float] = None):
+        self._client_factory = client_factory or _default_client_factory
+        share = budget_share()
+        self.max_concurrency = max(1, max_concurrency or _scaled(Config.LLM_MAX_CONCURRENCY, share))
+        self.timeout = timeout or Config.LLM_TIMEOUT_SECONDS
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.LLM_RETRY_BACKOFF_SECONDS if backoff is None else backoff
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Any = None
+        self.scheduler = RateScheduler(self.max_concurrency, _scaled(Config.LLM_RPM_LIMIT, share),
+                                       _scaled(Config.LLM_TPM_LIMIT, share), budget_share=share)
+
+    async def chat(self, messages: List[Dict[str, Any]], model: Optional[str] = None,
+                   json_response: bool = False, timeout: Optional[float] = None,
+                   priority: Optional[LLMPriority] = None) -> str:
+        """Send a chat completion and return the reply text.
+
+        `priority` defaults to the one set with `llm_priority` in the caller's context.
+        """
+        coroutine = self._chat(messages, model or Config.GROQ_MODEL, json_response, timeout or self.timeout,
+                               current_priority() if priority is None else priority)
+        loop = self._ensure_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+    def chat_sync(self, messages: List[Dict[str, Any]], model: Optional[str] = None,
+                  json_response: bool = False, timeout: Optional[float] = None,
+                  priority: Optional[LLMPriority] = None) -> str:
+        """Blocking form of `chat` for code running outside an event loop"""
+        return self.run(self.chat(messages, model, json_response, timeout, priority))
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Run a coroutine on the client's loop and wait for its result (not from an event loop).
+
+        The coroutine runs in a copy of the caller's context, so its priority carries over.
+        """
+        context = contextvars.copy_context()
+
+        async def in_caller_context() -> T:
+            return await context.run(asyncio.ensure_future, coroutine)
+
+        future: Future = asyncio.run_coroutine_threadsafe(in_caller_context(), self._ensure_loop())
+        return future.result()
+
+    async def _chat(self, messages: List[Dict[str, Any]], model: str,
+                    json_response: bool, timeout: float, priority: LLMPriority) -> str:
+        kwargs: Dict[str, Any] = {"model": model, "messages": messages}
+        if json_response:
+            kwargs["response_format"] = {"type": "json_object"}
+        tokens = _estimate_tokens(messages)
+
+        attempt = 0
+        while True:
+            reservation = await self.scheduler.acquire(tokens, priority)
+            try:
+                raw = await asyncio.wait_for(self._client.chat.completions.with_raw_response.create(**kwargs), timeout)
+                response = await raw.parse()
+            except BaseException as e:
+                outcome = CallOutcome.RATE_LIMITED if _is_rate_limit(e) else CallOutcome.FAILED
+                self.scheduler.release(reservation, _error_headers(e), outcome=outcome)
+                if not isinstance(e, Exception) or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                attempt += 1
+                logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage", None)
+            self.scheduler.release(reservation, raw.headers, used_tokens=getattr(usage, "total_tokens", None))
+            return response.choices[0].message.content or ""
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="llm-client", daemon=True)
+                    thread.start()
+                    self._client = self._client_factory()
+                    self._thread = thread
+                    self._loop = loop
+        return self._loop
+
+    def close(self) -> None:
+        """Close the HTTP connections and stop the client's loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            client, self._client = self._client, None
+            close = getattr(client, "close", None)
+            if close is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(_call(close), loop).result(timeout=5)
+                except Exception as e:
+                    logger.warning(f"Error closing LLM client: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+            self._thread = None
@@ -0,0 +1,237 @@
+"""
+Client-side rate scheduling for LLM calls: priorities, RPM/TPM budgets and adaptive concurrency
+"""
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum, IntEnum
+from typing import Any, Callable, Deque, Iterator, List, Mapping, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_WINDOW_SECONDS = 60.0
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class LLMPriority(IntEnum):
+    """Queue order for LLM calls; lower values are dispatched first"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class CallOutcome(Enum):
+    """How a dispatched call ended, reported to `RateScheduler.release`"""
+    SUCCESS = "success"
+    RATE_LIMITED = "rate_limited"
+    FAILED = "failed"  # Any other error, or cancelled before it was sent
+
+
+_priority: ContextVar[LLMPriority] = ContextVar("llm_priority", default=LLMPriority.NORMAL)
+
+
+@contextmanager
+def llm_priority(priority: LLMPriority) -> Iterator[None]:
+    """Run LLM calls made in this context (and tasks it starts) at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> LLMPriority:
+    return _priority.get()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate limit reset value such as "7.66s", "2m59.56s" or "120ms" (or plain seconds)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Reservation:
+    """A dispatched call's share of the budget, handed back to `RateScheduler.release`"""
+    __slots__ = ("tokens", "dispatched_at", "window_entry")
+
+    def __init__(self, tokens: int, dispatched_at: float, window_entry: List[float]):
+        self.tokens = tokens
+        self.dispatched_at = dispatched_at
+        self.window_entry = window_entry
+
+
+class RateScheduler:
+    """Admission control for LLM calls, driven from a single event loop.
+
+    Calls wait in a priority queue (FIFO within a priority) and the head of
+    the queue is dispatched only when all of these allow it:
+
+    - concurrency: in-flight calls stay under an AIMD window, halved on a
+      429 and grown by 1/window on each success, up to `max_concurrency`.
+      Other failures (timeouts, connection and server errors) leave it as is;
+    - local budgets: calls and tokens started in the last minute stay
+      under `rpm_limit` / `tpm_limit`. Token counts start as estimates and
+      are corrected from the response usage. When none is configured, the
+      provider's reported TPM limit times `budget_share` is used;
+    - provider budgets: the remaining requests/tokens reported in the last
+      response's `x-ratelimit-*` headers, less what is still in flight, are
+      not overdrawn before their reset time;
+    - `retry-after` on a 429 pauses all dispatch until it passes.
+
+    Strict priority means bulk calls only run when no interactive call is
+    waiting, so interactive traffic keeps its latency under load. All of
+    this is per scheduler, i.e. per process: calls from other processes are
+    only seen through the provider's headers.
+    """
+
+    def __init__(self, max_concurrency: int, rpm_limit: int = 0, tpm_limit: int = 0,
+                 clock: Callable[[], float] = time.monotonic, budget_share: float = 1.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self._configured_tpm = tpm_limit
+        self.budget_share = budget_share
+        self.active = 0
+        self.rate_limited = 0
+        self._clock = clock
+        self._waiters: List[Any] = []
+        self._sequence = itertools.count()
+        self._window: Deque[List[float]] = deque()  # [start time, tokens] per call in the last minute
+        self._in_flight_tokens = 0
+        self._remaining_requests: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._remaining_tokens: Optional[int] = None
+        self._tokens_reset_at = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, tokens: int, priority: LLMPriority = LLMPriority.NORMAL) -> Reservation:
+        """Wait until a call estimated at `tokens` tokens may start"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), tokens, future))
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result(), outcome=CallOutcome.FAILED)
+            else:
+                self._dispatch()
+            raise
+
+    def release(self, reservation: Reservation, headers: Optional[Mapping[str, str]] = None,
+                used_tokens: Optional[int] = None, outcome: CallOutcome = CallOutcome.SUCCESS) -> None:
+        """Return a call's slot, updating the budgets from its response"""
+        now = self._clock()
+        self.active -= 1
+        self._in_flight_tokens -= reservation.tokens
+        if used_tokens is not None:
+            reservation.window_entry[1] = used_tokens
+        if headers is not None:
+            self._update_from_headers(headers, now)
+
+        if outcome is CallOutcome.RATE_LIMITED:
+            self.rate_limited += 1
+            # Only one decrease per round of calls: those started before the last decrease saw the old window
+            if reservation.dispatched_at >= self._last_decrease:
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = now
+                logger.warning(f"LLM rate limited; concurrency window reduced to {int(self.limit)}")
+            retry_after = parse_duration((headers or {}).get("retry-after"))
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+        elif outcome is CallOutcome.SUCCESS:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def _update_from_headers(self, headers: Mapping[str, str], now: float) -> None:
+        limit_tokens = _header_int(headers, "x-ratelimit-limit-tokens")
+        if limit_tokens and not self._configured_tpm:
+            self.tpm_limit = max(1, int(limit_tokens * self.budget_share))
+
+        # The snapshot predates the calls still in flight, so their share is taken off
+        remaining = _header_int(headers, "x-ratelimit-remaining-requests")
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if remaining is not None:
+            self._remaining_requests = remaining - self.active
+            self._requests_reset_at = now + (reset or _WINDOW_SECONDS)
+        remaining = _header_int(headers, "x-ratelimit-remaining-tokens")
+        reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        if remaining is not None:
+            self._remaining_tokens = remaining - self._in_flight_tokens
+            self._tokens_reset_at = now + (reset or _WINDOW_SECONDS)
+
+    def _dispatch(self) -> None:
+        """Start queued calls in priority order while the budgets allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            now = self._clock()
+            delay = self._delay(tokens, now)
+            if delay is None:
+                return  # Woken again by the next release
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            entry = [now, tokens]
+            self._window.append(entry)
+            self.active += 1
+            self._in_flight_tokens += tokens
+            if self._remaining_requests is not None:
+                self._remaining_requests -= 1
+            if self._remaining_tokens is not None:
+                self._remaining_tokens -= tokens
+            future.set_result(Reservation(tokens, now, entry))
+
+    def _delay(self, tokens: int, now: float) -> Optional[float]:
+        """0 if a call can start now, seconds until it might, or None to wait for a release"""
+        if self.active >= int(self.limit):
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        while self._window and self._window[0][0] <= now - _WINDOW_SECONDS:
+            self._window.popleft()
+        waits = []
+        if self._window:
+            expires = self._window[0][0] + _WINDOW_SECONDS - now
+            if self.rpm_limit and len(self._window) >= self.rpm_limit:
+                waits.append(expires)
+            if self.tpm_limit and sum(entry[1] for entry in self._window) + tokens > self.tpm_limit:
+                waits.append(expires)
+        if self._remaining_requests is not None and self._remaining_requests <= 0 and now < self._requests_reset_at:
+            waits.append(self._requests_reset_at - now)
+        if self._remaining_tokens is not None and self._remaining_tokens < tokens and now < self._tokens_reset_at:
+            waits.append(self._tokens_reset_at - now)
+        return max(waits, default=0.0)
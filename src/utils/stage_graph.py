@@ -0,0 +1,80 @@
+"""
+Concurrent execution of dependent async stages
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class StageError(Exception):
+    """Raised when a stage fails; the original exception is chained"""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+
+
+class StageGraph:
+    """A small DAG of named async stages.
+
+    Each stage starts as soon as the stages it depends on have finished and
+    receives their results as keyword arguments named after them, so
+    independent stages run concurrently. If any stage fails, every stage
+    still running or waiting is cancelled and the failure is raised.
+    Blocking work wrapped in `asyncio.to_thread` is only abandoned, not
+    interrupted, when its stage is cancelled.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], after: Iterable[str] = ()) -> "StageGraph":
+        """Add a stage; dependencies must already be added, which keeps the graph acyclic"""
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        after = tuple(after)
+        missing = [dependency for dependency in after if dependency not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {missing}")
+        self._stages[name] = (func, after)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage and return their results by name"""
+        self.timings = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> Any:
+            func, after = self._stages[name]
+            inputs = {dependency: await tasks[dependency] for dependency in after}
+            start = time.perf_counter()
+            try:
+                return await func(**inputs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                raise StageError(name, e) from e
+            finally:
+                self.timings[name] = time.perf_counter() - start
+
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name), name=f"stage-{name}")
+
+        try:
+            done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            # On failure (or if the caller is cancelled) stop everything still running
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        logger.debug("Stage timings: " + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.timings.items()))
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,113 @@
+"""
+Dedicated executors that keep blocking ingestion work off the event loop
+"""
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.core.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class WorkerPools:
+    """Process-wide thread and process pools for ingestion.
+
+    The thread pool handles IO-bound steps and work that must use
+    in-process shared resources (embedding with the shared model, Chroma
+    writes). The process pool handles CPU-bound parsing and chunking so it
+    neither blocks the event loop nor contends for the GIL. Both are separate
+    from the default executor used by `asyncio.to_thread`, so uploads cannot
+    starve query handling of threads.
+    """
+
+    _lock = threading.Lock()
+    _io_executor: Optional[ThreadPoolExecutor] = None
+    _cpu_executor: Optional[ProcessPoolExecutor] = None
+    _ocr_executor: Optional[ThreadPoolExecutor] = None
+    _pool_size: Optional[int] = None  # Set in ingestion worker processes to the size of their pool
+
+    @classmethod
+    def io_executor(cls) -> ThreadPoolExecutor:
+        if cls._io_executor is None:
+            with cls._lock:
+                if cls._io_executor is None:
+                    cls._io_executor = ThreadPoolExecutor(
+                        max_workers=Config.INGESTION_IO_THREADS,
+                        thread_name_prefix="ingest-io"
+                    )
+        return cls._io_executor
+
+    @classmethod
+    def cpu_executor(cls) -> ProcessPoolExecutor:
+        if cls._cpu_executor is None:
+            with cls._lock:
+                if cls._cpu_executor is None:
+                    from src.document_processor.processor_factory import ProcessorFactory
+                    # spawn avoids forking a process that holds model and client threads;
+                    # fresh workers replay the processors registered here
+                    cls._cpu_executor = ProcessPoolExecutor(
+                        max_workers=Config.INGESTION_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=cls.init_worker,
+                        initargs=(ProcessorFactory.registrations(), Config.INGESTION_WORKERS)
+                    )
+        return cls._cpu_executor
+
+    @classmethod
+    def init_worker(cls, registrations: Dict[str, Any], pool_size: int) -> None:
+        """Initializer of ingestion worker processes"""
+        from src.document_processor.processor_factory import ProcessorFactory
+        cls._pool_size = pool_size
+        ProcessorFactory.register_all(registrations)
+
+    @classmethod
+    def worker_pool_size(cls) -> Optional[int]:
+        """Size of the ingestion pool this process belongs to, or None outside a worker"""
+        return cls._pool_size
+
+    @classmethod
+    def ocr_executor(cls) -> ThreadPoolExecutor:
+        """Threads for OCR calls; its size bounds the OCR requests in flight"""
+        if cls._ocr_executor is None:
+            with cls._lock:
+                if cls._ocr_executor is None:
+                    cls._ocr_executor = ThreadPoolExecutor(
+                        max_workers=max(1, Config.OCR_CONCURRENCY),
+                        thread_name_prefix="ocr"
+                    )
+        return cls._ocr_executor
+
+    @classmethod
+    async def run_io(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call on the IO thread pool"""
+        return await cls._run(cls.io_executor(), func, *args, **kwargs)
+
+    @classmethod
+    async def run_cpu(cls, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a picklable CPU-bound call on the process pool"""
+        return await cls._run(cls.cpu_executor(), func, *args, **kwargs)
+
+    @staticmethod
+    async def _run(executor: Executor, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    @classmethod
+    def shutdown(cls, wait: bool = True) -> None:
+        """Stop both pools (called on application shutdown)"""
+        with cls._lock:
+            if cls._io_executor is not None:
+                cls._io_executor.shutdown(wait=wait)
+                cls._io_executor = None
+            if cls._cpu_executor is not None:
+                cls._cpu_executor.shutdown(wait=wait)
+                cls._cpu_executor = None
+            if cls._ocr_executor is not None:
+                cls._ocr_executor.shutdown(wait=wait)
+                cls._ocr_executor = None
+        logger.info("Ingestion worker pools shut down")
@@ -136,3 +136,307 @@ def test_reciprocal_rank_fusion():
     merged = searcher._reciprocal_rank_fusion(vector_results, bm25_results, top_k=2)
     assert len(merged) == 2
     assert merged[0].chunk_id == "chunk1"
+
+def test_resource_registry_shares_instances_across_threads():
+    """Concurrent first use creates a single vector store and LLM client"""
+    from concurrent.futures import ThreadPoolExecutor
+    from src.core.registry import ResourceRegistry
+
+    ResourceRegistry.reset()
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            stores = list(pool.map(lambda _: ResourceRegistry.get_vector_store(), range(16)))
+            clients = list(pool.map(lambda _: ResourceRegistry.get_llm_client(), range(16)))
+        assert all(store is stores[0] for store in stores)
+        assert all(client is clients[0] for client in clients)
+    finally:
+        ResourceRegistry.reset()
+
+def test_query_parse_and_retrieval_run_concurrently():
+    """Parse and retrieval overlap: each stage waits for the other to have started"""
+    import asyncio
+    import threading
+    from src.services.query_service import QueryService
+
+    parse_started = threading.Event()
+    search_started = threading.Event()
+    overlapped = {}
+
+    def search(*args, **kwargs):
+        search_started.set()
+        overlapped["search"] = parse_started.wait(timeout=5)
+        return []
+
+    async def parse(*args, **kwargs):
+        parse_started.set()
+        overlapped["parse"] = await asyncio.to_thread(search_started.wait, 5)
+        return parsed
+
+    parsed = ParsedQuery(original_query="knee surgery", structured_data={},
+                         query_type=QueryType.INSURANCE_CLAIM, key_entities=[], intent="approval_check")
+    decision = DecisionResult(decision="approved", payment_mode="Cashless", justification="Covered",
+                              source_clauses=[], confidence_score=0.9)
+    service = QueryService.__new__(QueryService)
+    service.query_parser = MagicMock(parse_query_async=parse, parse_query_fast=lambda query: parsed)
+    service.hybrid_searcher = MagicMock(search=search)
+    service.decision_evaluator = MagicMock()
+    service.decision_evaluator.evaluate_async = unittest.mock.AsyncMock(return_value=decision)
+
+    response = asyncio.run(service.process_query(QueryRequest(query="knee surgery")))
+    assert overlapped == {"parse": True, "search": True}
+    assert response.decision == decision
+    service.decision_evaluator.evaluate_async.assert_awaited_once_with(parsed, [], None)
+
+def test_stage_graph_cancels_remaining_stages_on_failure():
+    """A failing stage cancels the stages still running and those waiting on it"""
+    import asyncio
+    from src.utils.stage_graph import StageError, StageGraph
+
+    cancelled = []
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM unavailable")
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def decide(fail, slow):
+        cancelled.append("decide ran")
+
+    graph = StageGraph().add("fail", fail).add("slow", slow).add("decide", decide, after=("fail", "slow"))
+    with pytest.raises(StageError) as error:
+        asyncio.run(asyncio.wait_for(graph.run(), timeout=2))
+    assert error.value.stage == "fail"
+    assert isinstance(error.value.__cause__, RuntimeError)
+    assert cancelled == ["slow"]
+
+    with pytest.raises(ValueError):
+        StageGraph().add("decide", decide, after=("parse",))
+
+def test_rules_fast_path_skips_llm_and_retrieval():
+    """A claim a rule settles from the regex parse never reaches the LLM parser or the searcher"""
+    import asyncio
+    from src.query_engine.parser import QueryParser
+    from src.services.query_service import QueryService
+
+    service = QueryService.__new__(QueryService)
+    service.query_parser = QueryParser.__new__(QueryParser)
+    service.query_parser._llm_parse = MagicMock()
+    service.hybrid_searcher = MagicMock()
+    service.decision_evaluator = MagicMock()
+
+    response = asyncio.run(service.process_query(QueryRequest(query="Is my procedure covered under my policy?",
+                                                              context={"procedure": "Cosmetic surgery"})))
+    assert response.decision.decision == "rejected"
+    assert response.decision.metadata["fast_path"] is True
+    assert response.retrieved_documents == []
+
+    escalated = asyncio.run(service.process_query(QueryRequest(query="Claim for bypass", context={"claim_amount": 250000})))
+    assert escalated.decision.metadata["rule_triggered"] == "escalation_limit_exceeded"
+    escalated = asyncio.run(service.process_query(QueryRequest(query="Bypass surgery bill of Rs. 2,50,000")))
+    assert escalated.decision.amount == 250000.0
+
+    # Policy numbers and claim references are not claim amounts
+    for query in ("Policy 20231145: 46M knee surgery in Pune, is it covered?", "Claim ref 4500123 for cataract surgery"):
+        assert service.prescreen(QueryRequest(query=query)) is None
+
+    service.query_parser._llm_parse.assert_not_called()
+    service.hybrid_searcher.search.assert_not_called()
+    service.decision_evaluator.evaluate.assert_not_called()
+
+def test_combined_pipeline_mode_makes_one_llm_call():
+    """Combined mode parses locally and extracts fields and decides in a single completion"""
+    import asyncio
+    import json
+    from src.core.config import Config
+    from src.decision_engine.evaluator import DecisionEvaluator
+    from src.query_engine.parser import QueryParser
+    from src.services.query_service import QueryService
+
+    def completion(procedure):
+        reply = {
+            "extracted_fields": {"medical_procedure": procedure, "claim_type": "hospitalisation"},
+            "decision": "approved", "payment_mode": "reimbursement", "amount": 50000,
+            "justification": "Covered under section 4", "source_clauses": ["4.1"], "confidence_score": 0.8,
+        }
+        return json.dumps(reply)
+
+    evaluator = DecisionEvaluator.__new__(DecisionEvaluator)
+    evaluator.client = MagicMock(chat=unittest.mock.AsyncMock())
+    evaluator.model = "test-model"
+    service = QueryService.__new__(QueryService)
+    service.query_parser = QueryParser.__new__(QueryParser)
+    service.query_parser._llm_parse = MagicMock()
+    service.hybrid_searcher = MagicMock()
+    service.hybrid_searcher.search.return_value = [
+        RetrievalResult(chunk_id="c1", document_id="d1", content="Knee surgery is covered.",
+                        similarity_score=0.9, metadata={})
+    ]
+    service.decision_evaluator = evaluator
+
+    with unittest.mock.patch.object(Config, "PIPELINE_MODE", "combined"):
+        evaluator.client.chat.return_value = completion("knee replacement")
+        response = asyncio.run(service.process_query(QueryRequest(query="46M knee surgery in Pune")))
+        assert evaluator.client.chat.await_count == 1
+        prompt = evaluator.client.chat.call_args.args[0][1]["content"]
+        assert "extracted_fields" in prompt
+        assert response.decision.decision == "approved"
+        assert response.parsed_query.structured_data["medical_procedure"] == "knee replacement"
+        assert response.parsed_query.structured_data["age"] == 46
+
+        # An exclusion only the LLM extracted still triggers the rules
+        evaluator.client.chat.return_value = completion("cosmetic surgery")
+        response = asyncio.run(service.process_query(QueryRequest(query="46M nose job in Pune")))
+        assert response.decision.decision == "rejected"
+
+    service.query_parser._llm_parse.assert_not_called()
+
+def test_llm_client_limits_concurrency_and_retries_transient_errors():
+    """Calls from any thread share one concurrency limit; timeouts are retried, other errors are not"""
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from src.utils.llm_client import LLMClient
+
+    state = {"active": 0, "peak": 0, "calls": 0}
+    lock = threading.Lock()
+
+    async def create(**kwargs):
+        with lock:
+            state["calls"] += 1
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            calls = state["calls"]
+        try:
+            prompt = kwargs["messages"][0]["content"]
+            if prompt == "hang" and calls == 1:
+                await asyncio.sleep(5)
+            if prompt == "bad request":
+                raise ValueError("bad request")
+            await asyncio.sleep(0.02)
+        finally:
+            with lock:
+                state["active"] -= 1
+        completion = MagicMock(choices=[MagicMock(message=MagicMock(content="ok"))])
+        return MagicMock(headers={}, parse=unittest.mock.AsyncMock(return_value=completion))
+
+    api = MagicMock()
+    api.chat.completions.with_raw_response.create = create
+    client = LLMClient(client_factory=lambda: api, max_concurrency=2, timeout=0.2, max_retries=2, backoff=0.01)
+    try:
+        # The first attempt times out and the retry succeeds
+        assert client.chat_sync([{"role": "user", "content": "hang"}]) == "ok"
+        assert state["calls"] == 2
+
+        with pytest.raises(ValueError):
+            client.chat_sync([{"role": "user", "content": "bad request"}])
+        assert state["calls"] == 3
+
+        async def fan_out():
+            return await asyncio.gather(*(client.chat([{"role": "user", "content": "q"}]) for _ in range(4)))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            replies = list(pool.map(lambda _: client.chat_sync([{"role": "user", "content": "q"}]), range(4)))
+        replies += asyncio.run(fan_out())
+        assert replies == ["ok"] * 8
+        assert state["peak"] == 2
+    finally:
+        client.close()
+
+def test_rate_scheduler_orders_by_priority_and_backs_off_on_rate_limits():
+    """Interactive calls go first; a 429 halves concurrency and honours retry-after; header budgets are respected"""
+    import asyncio
+    import time
+    from src.utils.rate_scheduler import CallOutcome, LLMPriority, RateScheduler, parse_duration
+
+    assert parse_duration("2m59.5s") == 179.5
+    assert parse_duration("120ms") == 0.12
+
+    async def scenario():
+        scheduler = RateScheduler(max_concurrency=1)
+        order = []
+
+        async def call(name, priority):
+            reservation = await scheduler.acquire(10, priority)
+            order.append(name)
+            scheduler.release(reservation)
+
+        held = await scheduler.acquire(10)
+        tasks = [asyncio.create_task(call(name, priority)) for name, priority in
+                 [("bulk", LLMPriority.BULK), ("normal", LLMPriority.NORMAL), ("interactive", LLMPriority.INTERACTIVE)]]
+        await asyncio.sleep(0.01)
+        assert order == []
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "normal", "bulk"]
+
+        scheduler = RateScheduler(max_concurrency=8)
+        limited = await scheduler.acquire(10)
+        scheduler.release(limited, headers={"retry-after": "0.2"}, outcome=CallOutcome.RATE_LIMITED)
+        assert scheduler.limit == 4
+        start = time.perf_counter()
+        reservation = await scheduler.acquire(10)
+        assert time.perf_counter() - start >= 0.15
+        scheduler.release(await scheduler.acquire(10), outcome=CallOutcome.FAILED)
+        assert scheduler.limit == 4
+        scheduler.release(reservation, headers={
+            "x-ratelimit-limit-tokens": "6000",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "0.2s",
+        }, used_tokens=50)
+        assert scheduler.limit == 4.25
+        assert scheduler.tpm_limit == 6000
+        start = time.perf_counter()
+        scheduler.release(await scheduler.acquire(10))
+        assert time.perf_counter() - start >= 0.15
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_llm_budgets_are_split_between_app_and_ingestion_processes(monkeypatch):
+    """Ingestion workers share LLM_INGESTION_SHARE of the limits; the app process keeps the rest"""
+    from src.core.config import Config
+    from src.utils.llm_client import LLMClient
+    from src.utils.worker_pools import WorkerPools
+
+    monkeypatch.setattr(Config, "LLM_MAX_CONCURRENCY", 16)
+    monkeypatch.setattr(Config, "LLM_RPM_LIMIT", 100)
+    monkeypatch.setattr(Config, "LLM_TPM_LIMIT", 0)
+    monkeypatch.setattr(Config, "LLM_INGESTION_SHARE", 0.25)
+
+    app = LLMClient(client_factory=object)
+    assert (app.max_concurrency, app.scheduler.rpm_limit, app.scheduler.tpm_limit) == (12, 75, 0)
+
+    monkeypatch.setattr(WorkerPools, "_pool_size", 4)
+    worker = LLMClient(client_factory=object)
+    assert (worker.max_concurrency, worker.scheduler.rpm_limit) == (1, 6)
+    # The provider reports the account-wide TPM limit
+    worker.scheduler._update_from_headers({"x-ratelimit-limit-tokens": "8000"}, now=0.0)
+    assert worker.scheduler.tpm_limit == 500
+
+
+def test_rules_fast_path_ignores_excluded_procedures_mentioned_in_free_text():
+    """A negated or incidental mention of an exclusion is left to the full pipeline"""
+    from src.decision_engine.rules import RulesEngine
+    from src.query_engine.parser import QueryParser
+    from src.services.query_service import QueryService
+
+    query = "Reconstructive surgery after a car accident, not cosmetic surgery - is it covered?"
+    parser = QueryParser.__new__(QueryParser)
+    assert RulesEngine.evaluate_rules(parser.parse_query_fast(query)) is None
+
+    service = QueryService.__new__(QueryService)
+    service.query_parser = parser
+    assert service.prescreen(QueryRequest(query=query)) is None
+    for negated in ("Is non-cosmetic surgery covered?", "Dental claim excluding teeth whitening, is it payable?"):
+        assert service.prescreen(QueryRequest(query=negated)) is None
+
+    # An unambiguous mention is still settled without the LLM
+    response = service.prescreen(QueryRequest(query="Cosmetic surgery claim, is it covered?"))
+    assert response.decision.decision == "rejected"
+    assert response.parsed_query.structured_data["medical_procedure"] == "cosmetic surgery"
@@ -0,0 +1,864 @@
+"""
+Document ingestion tests
+"""
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.document_processor.ocr import StubOCRBackend
+from src.services.document_catalog import DocumentCatalog
+from src.services.document_service import DocumentService
+from src.services.ingestion_pipeline import BulkIngestionPipeline
+
+
+@pytest.fixture
+def fake_vector_store():
+    store = MagicMock()
+    store.written = []
+    store.embed_documents.side_effect = lambda chunks: [[0.0] * 3 for _ in chunks]
+    store.write_documents.side_effect = lambda chunks, embeddings: store.written.append(list(chunks))
+    return store
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return DocumentCatalog(str(tmp_path / "catalog.db"))
+
+
+def test_bulk_ingestion_pipeline_batches_writes(tmp_path, fake_vector_store, catalog):
+    """Every chunk is embedded and written in batches no larger than the batch size"""
+    files = []
+    for i in range(3):
+        path = tmp_path / f"policy_{i}.txt"
+        path.write_text(f"Policy {i} clause. " * 300)
+        files.append(str(path))
+    missing = str(tmp_path / "missing.txt")
+
+    service = DocumentService(vector_store=fake_vector_store, catalog=catalog)
+    pipeline = BulkIngestionPipeline(service, workers=2, batch_size=4)
+    stats = pipeline.run(files + [missing])
+
+    written = [chunk for batch in fake_vector_store.written for chunk in batch]
+    assert stats.files == 3
+    assert stats.failed_files == [missing]
+    assert stats.chunks == stats.embeddings == len(written) > 0
+    assert all(len(batch) <= 4 for batch in fake_vector_store.written)
+    assert {chunk.metadata["original_filename"] for chunk in written} == {f"policy_{i}.txt" for i in range(3)}
+    assert stats.summary()["chunks_per_second"] > 0
+
+
+def test_bulk_ingestion_pipeline_surfaces_stage_failures(tmp_path, fake_vector_store, catalog):
+    """A failing writer aborts the run instead of hanging the other stages"""
+    path = tmp_path / "policy.txt"
+    path.write_text("Clause text. " * 2000)
+    fake_vector_store.write_documents.side_effect = RuntimeError("disk full")
+
+    service = DocumentService(vector_store=fake_vector_store, catalog=catalog)
+    with pytest.raises(RuntimeError, match="disk full"):
+        BulkIngestionPipeline(service, workers=1, batch_size=2, queue_size=1).run([str(path)])
+    # The unfinished document is released so a later run indexes it again
+    assert catalog.stats()["documents"] == 0
+
+
+def test_bulk_ingestion_pipeline_skips_duplicate_content(tmp_path, fake_vector_store, catalog):
+    """Identical bytes are indexed once, within a run and across runs"""
+    original = tmp_path / "policy.txt"
+    original.write_text("Waiting period is 24 months. " * 100)
+    copy = tmp_path / "policy_copy.txt"
+    copy.write_bytes(original.read_bytes())
+
+    service = DocumentService(vector_store=fake_vector_store, catalog=catalog)
+    first = BulkIngestionPipeline(service, workers=1, batch_size=8).run([str(original), str(copy)])
+    second = BulkIngestionPipeline(service, workers=1, batch_size=8).run([str(copy)])
+
+    assert (first.files, first.duplicates) == (1, 1)
+    assert (second.files, second.duplicates, second.chunks) == (0, 1, 0)
+    written = {chunk.metadata["document_id"] for batch in fake_vector_store.written for chunk in batch}
+    assert len(written) == 1
+    assert [entry["document_id"] for entry in catalog.duplicates()] == [written.pop()] * 2
+
+
+def test_process_document_runs_off_the_event_loop(tmp_path, fake_vector_store):
+    """Parsing happens in the process pool and the vector store write on a worker thread"""
+    import asyncio
+    import threading
+    from src.utils.worker_pools import WorkerPools
+
+    path = tmp_path / "policy.txt"
+    path.write_text("Room rent is capped at 1% of the sum insured. " * 50)
+    write_threads = []
+    fake_vector_store.add_documents.side_effect = lambda chunks: write_threads.append(
+        (threading.current_thread().name, len(chunks))
+    )
+
+    service = DocumentService(vector_store=fake_vector_store)
+    try:
+        document_id = asyncio.run(service.process_document(str(path), document_id="doc-1"))
+    finally:
+        WorkerPools.shutdown()
+
+    assert document_id == "doc-1"
+    [(thread_name, chunk_count)] = write_threads
+    assert thread_name.startswith("ingest-io") and chunk_count > 0
+
+
+def test_job_queue_retries_with_backoff_and_recovers_stale_leases(tmp_path):
+    """Failed jobs are retried until attempts run out; expired leases are requeued"""
+    import time
+    from src.services.job_queue import JobOperation, JobQueue, JobStatus
+
+    jobs = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2, retry_backoff=0.0, lease_seconds=60)
+    jobs.enqueue("doc-1", "/tmp/a.pdf", "a.pdf")
+
+    job = jobs.claim("worker-a")
+    assert job["document_id"] == "doc-1" and job["attempts"] == 1
+    assert jobs.claim("worker-b") is None
+
+    assert jobs.fail("doc-1", "parse error") == JobStatus.QUEUED
+    assert jobs.claim("worker-b")["attempts"] == 2
+    assert jobs.fail("doc-1", "parse error again") == JobStatus.FAILED
+    assert jobs.get("doc-1")["error"] == "parse error again"
+
+    # A crashed worker's job comes back once its lease has expired
+    crashed = JobQueue(jobs.path, lease_seconds=0.01)
+    crashed.enqueue("doc-2", "/tmp/b.pdf", "b.pdf")
+    assert crashed.claim("worker-c")["document_id"] == "doc-2"
+    time.sleep(0.02)
+    assert jobs.recover_stale() == 1
+    assert jobs.get("doc-2")["status"] == JobStatus.QUEUED
+
+    # Only a finished job can be replaced, e.g. by an update of the document
+    with pytest.raises(ValueError):
+        jobs.enqueue("doc-2", "/tmp/b2.pdf", "b.pdf", operation=JobOperation.UPDATE)
+    jobs.enqueue("doc-1", "/tmp/a2.pdf", "a.pdf", operation=JobOperation.UPDATE)
+    replaced = jobs.get("doc-1")
+    assert (replaced["status"], replaced["attempts"], replaced["operation"]) == \
+        (JobStatus.QUEUED, 0, JobOperation.UPDATE)
+    jobs.complete("doc-1")
+
+    assert jobs.cleanup(ttl_seconds=0) == 1
+    assert jobs.get("doc-1") is None
+    assert jobs.counts() == {JobStatus.QUEUED: 1}
+
+
+def test_ingestion_worker_processes_queued_jobs(tmp_path):
+    """The worker drains the queue and records completion in the job table"""
+    import asyncio
+    from src.services.job_queue import IngestionWorker, JobQueue, JobStatus
+
+    jobs = JobQueue(str(tmp_path / "jobs.db"), max_attempts=1)
+    service = MagicMock()
+    processed = []
+
+    async def process_document(file_path, document_id=None, content_hash=None):
+        processed.append(document_id)
+        if document_id == "bad":
+            raise ValueError("unsupported layout")
+        return document_id
+    service.process_document.side_effect = process_document
+
+    async def run():
+        worker = IngestionWorker(jobs, service, concurrency=2, poll_interval=0.01)
+        await worker.start()
+        for document_id in ("good", "bad"):
+            jobs.enqueue(document_id, f"/tmp/{document_id}.pdf", f"{document_id}.pdf")
+        worker.notify()
+        for _ in range(200):
+            if jobs.counts().get(JobStatus.QUEUED) is None and len(processed) == 2 \
+                    and jobs.counts().get(JobStatus.PROCESSING) is None:
+                break
+            await asyncio.sleep(0.01)
+        await worker.stop()
+
+    asyncio.run(run())
+    assert sorted(processed) == ["bad", "good"]
+    assert jobs.get("good")["status"] == JobStatus.COMPLETED
+    assert jobs.get("bad")["status"] == JobStatus.FAILED
+
+
+def test_stopped_worker_requeues_its_jobs_at_once(tmp_path):
+    """Jobs cancelled at shutdown are runnable again without waiting for their lease to expire"""
+    import asyncio
+    from src.services.job_queue import IngestionWorker, JobQueue, JobStatus
+
+    jobs = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=300)
+    service = MagicMock()
+    started = []
+
+    async def process_document(file_path, document_id=None, content_hash=None):
+        started.append(document_id)
+        await asyncio.sleep(60)
+    service.process_document.side_effect = process_document
+
+    async def run():
+        worker = IngestionWorker(jobs, service, concurrency=1, poll_interval=0.01)
+        await worker.start()
+        jobs.enqueue("doc-1", "/tmp/doc-1.pdf", "doc-1.pdf")
+        worker.notify()
+        for _ in range(200):
+            if started:
+                break
+            await asyncio.sleep(0.01)
+        await worker.stop()
+
+    jobs.enqueue("doc-2", "/tmp/doc-2.pdf", "doc-2.pdf")
+    claimed = jobs.claim("other-worker")
+    asyncio.run(run())
+
+    job = jobs.get("doc-1")
+    assert started == ["doc-1"]
+    assert (job["status"], job["attempts"]) == (JobStatus.QUEUED, 0)
+    assert job["worker_id"] is None and job["lease_expires_at"] is None
+    assert jobs.claim("next-worker")["document_id"] == "doc-1"
+    assert jobs.get(claimed["document_id"])["status"] == JobStatus.PROCESSING
+
+
+@pytest.mark.asyncio
+async def test_save_upload_streams_and_hashes(tmp_path):
+    """Uploads are hashed while streaming and oversized ones leave nothing on disk"""
+    import hashlib
+    import io
+    from fastapi import UploadFile
+    from src.api.uploads import UploadTooLargeError, save_upload
+
+    payload = b"policy clause " * 1000
+    destination = tmp_path / "policy.txt"
+    size, digest = await save_upload(UploadFile(file=io.BytesIO(payload)), destination,
+                                     max_size=len(payload), block_size=1024)
+    assert size == len(payload)
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert destination.read_bytes() == payload
+
+    oversized = tmp_path / "oversized.txt"
+    with pytest.raises(UploadTooLargeError):
+        await save_upload(UploadFile(file=io.BytesIO(payload)), oversized,
+                          max_size=4096, block_size=1024)
+    assert list(tmp_path.iterdir()) == [destination]
+
+
+@pytest.mark.asyncio
+async def test_multipart_uploads_are_read_as_they_arrive(tmp_path):
+    """The file part is parsed from the request stream, and an oversized file stops the read early"""
+    import hashlib
+    from starlette.requests import Request
+    from src.api.uploads import (MultipartFileStream, UploadTooLargeError, check_content_length,
+                                 save_upload)
+
+    payload = b"policy clause " * 1000
+    body = (b"--XyZ\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nrenewal\r\n"
+            b"--XyZ\r\nContent-Disposition: form-data; name=\"file\"; filename=\"policy.txt\"\r\n"
+            b"Content-Type: text/plain\r\n\r\n" + payload + b"\r\n--XyZ--\r\n")
+
+    def request(content_length=len(body)):
+        chunks = [body[i:i + 256] for i in range(0, len(body), 256)]
+        received = []
+
+        async def receive():
+            chunk = chunks[len(received)]
+            received.append(chunk)
+            return {"type": "http.request", "body": chunk, "more_body": len(received) < len(chunks)}
+
+        headers = [(b"content-type", b"multipart/form-data; boundary=XyZ"),
+                   (b"content-length", str(content_length).encode())]
+        return Request({"type": "http", "method": "POST", "headers": headers}, receive), received, len(chunks)
+
+    http_request, _, _ = request()
+    upload = MultipartFileStream(http_request)
+    assert await upload.open() == "policy.txt"
+    size, digest = await save_upload(upload, tmp_path / "policy.txt", max_size=len(payload))
+    assert (size, digest) == (len(payload), hashlib.sha256(payload).hexdigest())
+    assert (tmp_path / "policy.txt").read_bytes() == payload
+
+    http_request, received, total = request()
+    upload = MultipartFileStream(http_request)
+    await upload.open()
+    with pytest.raises(UploadTooLargeError):
+        await save_upload(upload, tmp_path / "oversized.txt", max_size=2048)
+    assert len(received) < total / 2
+    assert not (tmp_path / "oversized.txt").exists()
+
+    with pytest.raises(UploadTooLargeError):
+        check_content_length(request(content_length=10 ** 9)[0], max_size=len(payload))
+
+
+def test_apply_chunk_diff_only_writes_changed_chunks(catalog):
+    """An update embeds added chunks, deletes vanished ones and keeps the rest"""
+    from src.core.models import DocumentChunk
+    from src.retrieval.embedding_cache import content_hash
+
+    store = MagicMock()
+    stored = {}
+    embedded = []
+    store.get_document_chunks.side_effect = lambda document_id: [
+        (chunk_id, text, metadata) for chunk_id, (text, metadata) in stored.items()
+    ]
+    store.embed_documents.side_effect = lambda chunks: embedded.extend(c.content for c in chunks) or \
+        [[0.0]] * len(chunks)
+    store.write_documents.side_effect = lambda chunks, embeddings: stored.update(
+        (c.chunk_id, (c.content, dict(c.metadata))) for c in chunks
+    )
+    store.update_chunk_metadata.side_effect = lambda chunks: stored.update(
+        (c.chunk_id, (stored[c.chunk_id][0], dict(c.metadata))) for c in chunks
+    )
+    store.delete_chunks.side_effect = lambda ids: [stored.pop(i) for i in ids]
+
+    def version(*texts):
+        return [
+            DocumentChunk(chunk_id=f"doc_chunk_{i}", document_id="doc", content=text,
+                          metadata={"chunk_index": i, "content_hash": content_hash(text)})
+            for i, text in enumerate(texts)
+        ]
+
+    service = DocumentService(vector_store=store, catalog=catalog)
+    assert service.apply_chunk_diff("doc", version("intro", "clause 1", "clause 2")) == \
+        {"added": 3, "removed": 0, "unchanged": 0}
+
+    embedded.clear()
+    summary = service.apply_chunk_diff("doc", version("intro", "endorsement", "clause 1 amended", "clause 2"))
+    assert summary == {"added": 2, "removed": 1, "unchanged": 2}
+    assert embedded == ["endorsement", "clause 1 amended"]
+    assert sorted(text for text, _ in stored.values()) == sorted(["intro", "endorsement", "clause 1 amended", "clause 2"])
+    # Kept chunks carry their new position; new chunks never reuse a stored ID
+    assert {text: metadata["chunk_index"] for text, metadata in stored.values()}["clause 2"] == 3
+    assert len(stored) == 4
+
+
+def _write_pdf(path, page_texts):
+    """Write a minimal PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(body)
+
+
+def test_pdf_pages_are_extracted_in_parallel_ranges(tmp_path, monkeypatch):
+    """Sharded extraction keeps page order and chunks record the pages they span"""
+    from src.core.config import Config
+    from src.document_processor.pdf_processor import PDFProcessor
+    from src.services.document_service import prepare_document
+    from src.utils.worker_pools import WorkerPools
+
+    path = tmp_path / "wording.pdf"
+    _write_pdf(path, [f"Section {i} covers hospitalisation expenses" for i in range(1, 13)])
+
+    monkeypatch.setattr(Config, "PDF_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr(Config, "INGESTION_WORKERS", 3)
+    monkeypatch.setattr(Config, "CHUNK_SIZE", 120)
+    monkeypatch.setattr(Config, "CHUNK_OVERLAP", 0)
+    assert PDFProcessor._page_ranges(12) == [(0, 4), (4, 8), (8, 12)]
+    try:
+        parsed = PDFProcessor().parse(str(path))
+        chunks = prepare_document(str(path), "doc-1")
+    finally:
+        WorkerPools.shutdown()
+
+    assert parsed.metadata["page_count"] == len(parsed.page_offsets) == 12
+    pages = [parsed.text[start:stop] for start, stop in zip(parsed.page_offsets, parsed.page_offsets[1:] + [None])]
+    assert [page.strip() for page in pages] == [f"Section {i} covers hospitalisation expenses" for i in range(1, 13)]
+    assert chunks[0].metadata["page_start"] == 1
+    assert chunks[-1].metadata["page_end"] == 12
+    for chunk in chunks:
+        first = int(chunk.content.split("Section ")[1].split()[0])
+        assert chunk.metadata["page_start"] <= first <= chunk.metadata["page_end"]
+
+
+def test_only_pdfs_large_enough_to_shard_are_prepared_on_a_thread(tmp_path, monkeypatch):
+    """Small PDFs are parsed in a worker process; large ones are sharded by page range from a thread"""
+    import asyncio
+    from src.core.config import Config
+    from src.utils.worker_pools import WorkerPools
+
+    small, large = tmp_path / "small.pdf", tmp_path / "large.pdf"
+    _write_pdf(small, ["Section 1 covers hospitalisation expenses"] * 2)
+    _write_pdf(large, ["Section 1 covers hospitalisation expenses"] * 6)
+    monkeypatch.setattr(Config, "PDF_PARALLEL_MIN_PAGES", 4)
+    calls = []
+
+    async def record(pool, func, *args):
+        calls.append(pool)
+        return []
+
+    monkeypatch.setattr(WorkerPools, "run_cpu", lambda func, *args: record("cpu", func, *args))
+    original_run_io = WorkerPools.run_io
+
+    async def run_io(func, *args):
+        if func.__name__ == "prepare_document":
+            return await record("io", func, *args)
+        return await original_run_io(func, *args)
+
+    monkeypatch.setattr(WorkerPools, "run_io", run_io)
+    try:
+        asyncio.run(DocumentService._prepare(str(small), "doc-1", None))
+        asyncio.run(DocumentService._prepare(str(large), "doc-2", None))
+    finally:
+        WorkerPools.shutdown()
+
+    assert calls == ["cpu", "io"]
+
+
+class _StubOCRBackend(StubOCRBackend):
+    """Stub OCR backend that records the images it is given"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def recognize(self, image, mime_type="image/jpeg"):
+        with self.lock:
+            self.calls.append(mime_type)
+            return f"Scanned claim form page {len(self.calls)}"
+
+
+def test_stub_ocr_backend_is_selectable_without_an_api_key(tmp_path, monkeypatch):
+    """OCR_BACKEND=stub needs no Groq key; backends must implement recognize"""
+    from PIL import Image
+    from src.core.config import Config
+    from src.document_processor.image_processor import ImageProcessor
+    from src.document_processor.ocr import OCRBackend, get_ocr_backend
+
+    monkeypatch.setattr(Config, "GROQ_API_KEY", None)
+    monkeypatch.setattr(Config, "OCR_BACKEND", "stub")
+    monkeypatch.setattr(Config, "OCR_CACHE_PATH", "")
+    path = tmp_path / "card.png"
+    Image.new("RGB", (64, 32), "white").save(path)
+
+    assert isinstance(get_ocr_backend(), StubOCRBackend)
+    assert ImageProcessor().extract_text(str(path)).startswith("[Image not transcribed: image/jpeg")
+    with pytest.raises(TypeError):
+        OCRBackend()
+
+
+def _write_mixed_pdf(tmp_path):
+    """PDF whose pages alternate a text layer and a scanned image: text, scan, text, scan"""
+    import pypdf
+    from PIL import Image
+
+    text_path = tmp_path / "text.pdf"
+    scan_path = tmp_path / "scan.pdf"
+    _write_pdf(text_path, ["Section 1 covers hospitalisation expenses"])
+    Image.new("RGB", (64, 32), "white").save(scan_path, "PDF")
+    writer = pypdf.PdfWriter()
+    for source in (text_path, scan_path, text_path, scan_path):
+        writer.append(str(source))
+    mixed_path = tmp_path / "mixed.pdf"
+    with open(mixed_path, "wb") as f:
+        writer.write(f)
+    return mixed_path
+
+
+def test_hybrid_pdf_ocrs_only_pages_without_text(tmp_path, monkeypatch):
+    """Scanned pages go through the OCR backend; pages with a text layer do not"""
+    import pypdf
+    from src.core.config import Config
+    from src.document_processor.pdf_processor import PDFProcessor
+    from src.utils.worker_pools import WorkerPools
+
+    mixed_path = _write_mixed_pdf(tmp_path)
+    monkeypatch.setattr(Config, "OCR_CONCURRENCY", 2)
+    monkeypatch.setattr(Config, "OCR_CACHE_PATH", "")
+    readers = []
+    real_reader = pypdf.PdfReader
+    monkeypatch.setattr(pypdf, "PdfReader", lambda *args, **kwargs: readers.append(1) or real_reader(*args, **kwargs))
+    backend = _StubOCRBackend()
+    try:
+        parsed = PDFProcessor(ocr_backend=backend).parse(str(mixed_path))
+        assert len(readers) == 1
+        monkeypatch.setattr(Config, "PDF_OCR_MODE", "off")
+        plain = PDFProcessor(ocr_backend=backend).parse(str(mixed_path))
+    finally:
+        WorkerPools.shutdown()
+
+    assert backend.calls == ["image/jpeg", "image/jpeg"]
+    assert parsed.metadata["ocr_pages"] == [2, 4]
+    assert parsed.metadata["ocr_backend"] == "stub"
+    pages = [parsed.text[start:stop].strip()
+             for start, stop in zip(parsed.page_offsets, parsed.page_offsets[1:] + [None])]
+    assert pages[0] == pages[2] == "Section 1 covers hospitalisation expenses"
+    assert pages[1].startswith("Scanned claim form page")
+    assert "ocr_pages" not in plain.metadata
+
+
+def test_streamed_pdf_ocrs_later_pages_while_earlier_ones_wait(tmp_path, monkeypatch):
+    """iter_segments keeps a window of OCR pages in flight and still yields pages in order"""
+    from src.core.config import Config
+    from src.document_processor.pdf_processor import PDFProcessor
+    from src.utils.worker_pools import WorkerPools
+
+    class OverlapBackend(_StubOCRBackend):
+        """The first OCR call waits for the second one to start"""
+
+        def __init__(self):
+            super().__init__()
+            self.started = 0
+            self.second_started = threading.Event()
+            self.overlapped = None
+
+        def recognize(self, image, mime_type="image/jpeg"):
+            with self.lock:
+                self.started += 1
+                first = self.started == 1
+            if first:
+                self.overlapped = self.second_started.wait(timeout=5)
+            else:
+                self.second_started.set()
+            return super().recognize(image, mime_type)
+
+    mixed_path = _write_mixed_pdf(tmp_path)
+    monkeypatch.setattr(Config, "OCR_CONCURRENCY", 2)
+    monkeypatch.setattr(Config, "OCR_CACHE_PATH", "")
+    backend = OverlapBackend()
+    try:
+        segments = [segment.strip() for segment in PDFProcessor(ocr_backend=backend).iter_segments(str(mixed_path))]
+    finally:
+        WorkerPools.shutdown()
+
+    assert backend.overlapped is True
+    assert segments[0] == segments[2] == "Section 1 covers hospitalisation expenses"
+    assert segments[1].startswith("Scanned claim form page")
+    assert segments[3].startswith("Scanned claim form page")
+
+
+def test_image_ocr_is_preprocessed_and_cached(tmp_path, monkeypatch):
+    """Images are shrunk to grayscale JPEG before OCR, and identical images are OCRed once"""
+    import io
+    from PIL import Image
+    from src.core.config import Config
+    from src.document_processor.image_processor import ImageProcessor
+
+    monkeypatch.setattr(Config, "OCR_CACHE_PATH", str(tmp_path / "ocr_cache.db"))
+    monkeypatch.setattr(Config, "OCR_MAX_IMAGE_SIDE", 400)
+    sent = []
+
+    class RecordingBackend(_StubOCRBackend):
+        def recognize(self, image, mime_type="image/jpeg"):
+            sent.append(image)
+            return super().recognize(image, mime_type)
+
+    photo = Image.new("RGB", (1600, 1200), (200, 30, 30))
+    first, second = tmp_path / "claim.png", tmp_path / "claim-again.png"
+    photo.save(first)
+    photo.save(second)
+
+    processor = ImageProcessor(ocr_backend=RecordingBackend())
+    text = processor.extract_text(str(first))
+    assert processor.extract_text(str(second)) == text
+
+    assert len(sent) == 1
+    with Image.open(io.BytesIO(sent[0])) as image:
+        assert image.format == "JPEG"
+        assert image.mode == "L"
+        assert max(image.size) == 400
+    assert len(sent[0]) < first.stat().st_size
+
+    class UnreadableBackend(RecordingBackend):
+        def recognize(self, image, mime_type="image/jpeg"):
+            super().recognize(image, mime_type)
+            return ""
+
+    # Empty output is not cached, so the image is sent again
+    blank = tmp_path / "blank.png"
+    Image.new("RGB", (32, 32), "white").save(blank)
+    processor = ImageProcessor(ocr_backend=UnreadableBackend())
+    assert processor.extract_text(str(blank)) == processor.extract_text(str(blank)) == ""
+    assert len(sent) == 3
+
+
+def test_processor_factory_reuses_instances_and_registers_extensions(monkeypatch):
+    """Shareable processors are created once; new formats are registered without editing the factory"""
+    from src.document_processor.processor_factory import ProcessorFactory
+    from src.document_processor.text_processor import TextProcessor
+
+    class CsvProcessor(TextProcessor):
+        reusable = False
+
+    monkeypatch.setattr(ProcessorFactory, "_extensions", dict(ProcessorFactory._extensions))
+    monkeypatch.setattr(ProcessorFactory, "_registered", {})
+    ProcessorFactory.reset()
+
+    text = ProcessorFactory.get_processor_by_extension(".TXT")
+    assert isinstance(text, TextProcessor)
+    assert ProcessorFactory.get_processor_by_extension(".txt") is text
+
+    assert not ProcessorFactory.is_supported(".csv")
+    ProcessorFactory.register("csv", CsvProcessor)
+    assert ProcessorFactory.is_supported(".csv")
+    first = ProcessorFactory.get_processor_by_extension(".csv")
+    assert isinstance(first, CsvProcessor)
+    assert ProcessorFactory.get_processor_by_extension(".csv") is not first
+
+    ProcessorFactory.register(".log", "src.document_processor.text_processor:TextProcessor")
+    assert ProcessorFactory.get_processor_by_extension(".log") is text
+
+
+def test_registered_processors_reach_worker_processes(tmp_path, monkeypatch):
+    """Registrations and PROCESSOR_PLUGINS apply in the spawned ingestion workers too"""
+    import asyncio
+    from src.core.config import Config
+    from src.document_processor.processor_factory import ProcessorFactory
+    from src.services.document_service import prepare_document
+    from src.utils.worker_pools import WorkerPools
+
+    plugin = ".md=src.document_processor.text_processor:TextProcessor"
+    monkeypatch.setenv("PROCESSOR_PLUGINS", plugin)
+    monkeypatch.setattr(Config, "PROCESSOR_PLUGINS", plugin)
+    monkeypatch.setattr(ProcessorFactory, "_extensions", dict(ProcessorFactory._extensions))
+    monkeypatch.setattr(ProcessorFactory, "_registered", {})
+    monkeypatch.setattr(ProcessorFactory, "_plugins_loaded", False)
+    ProcessorFactory.register(".log", "src.document_processor.text_processor:TextProcessor")
+    assert ProcessorFactory.is_supported(".md")
+
+    log_path, md_path = tmp_path / "claims.log", tmp_path / "notes.md"
+    log_path.write_text("Claim 42 approved for cashless treatment.")
+    md_path.write_text("Room rent is capped at 1% of the sum insured.")
+
+    async def prepare_all():
+        return await asyncio.gather(*(WorkerPools.run_cpu(prepare_document, str(path), path.stem)
+                                      for path in (log_path, md_path)))
+
+    WorkerPools.shutdown()
+    try:
+        log_chunks, md_chunks = asyncio.run(prepare_all())
+    finally:
+        WorkerPools.shutdown()
+    assert log_chunks[0].content.startswith("Claim 42")
+    assert md_chunks[0].content.startswith("Room rent")
+
+
+def test_email_attachments_are_indexed_under_the_parent(tmp_path, monkeypatch):
+    """Attachments are extracted by their own processors and their chunks carry attachment metadata"""
+    from email.message import EmailMessage
+    from src.core.config import Config
+    from src.services.document_service import prepare_document
+
+    pdf_path = tmp_path / "bill.pdf"
+    _write_pdf(pdf_path, ["Room rent INR 4000 per day", "Surgery charges INR 90000"])
+
+    forwarded = EmailMessage()
+    forwarded["Subject"] = "Discharge summary"
+    forwarded.set_content("Patient discharged after knee surgery.")
+
+    msg = EmailMessage()
+    msg["From"] = "claimant@example.com"
+    msg["To"] = "claims@insurer.example"
+    msg["Subject"] = "Claim packet"
+    msg.set_content("Please find my hospital bill and notes attached.")
+    msg.add_attachment(pdf_path.read_bytes(), maintype="application", subtype="pdf", filename="bill.pdf")
+    msg.add_attachment("Policy number HLT-42 active since 2021.", filename="notes.txt")
+    msg.add_attachment(b"PK\x03\x04", maintype="application", subtype="zip", filename="scans.zip")
+    msg.add_attachment(forwarded)
+    path = tmp_path / "claim.eml"
+    path.write_bytes(bytes(msg))
+
+    monkeypatch.setattr(Config, "CHUNK_SIZE", 60)
+    monkeypatch.setattr(Config, "CHUNK_OVERLAP", 0)
+    chunks = prepare_document(str(path), "claim-1")
+
+    text = " ".join(chunk.content for chunk in chunks)
+    assert "hospital bill" in text and "Patient discharged" in text and "HLT-42" in text
+    assert all(chunk.document_id == "claim-1" for chunk in chunks)
+    assert chunks[0].metadata["attachment_count"] == 3
+    assert chunks[0].metadata["attachments_extracted"] == 2
+    assert "attachment_filename" not in chunks[0].metadata
+
+    bill = [c for c in chunks if c.metadata.get("attachment_filename") == "bill.pdf"]
+    assert bill and all(c.metadata["attachment_file_type"] == "pdf" for c in bill)
+    surgery = next(c for c in bill if "Surgery charges" in c.content)
+    assert surgery.metadata["page_end"] == 2
+    notes = [c for c in chunks if c.metadata.get("attachment_filename") == "notes.txt"]
+    assert notes and "HLT-42" in " ".join(c.content for c in notes)
+
+
+def test_email_inline_images_are_skipped_unless_they_are_the_only_content(tmp_path):
+    """Signature logos referenced by Content-ID are not attachments, but a message of only images keeps them"""
+    from email.message import EmailMessage
+    from src.document_processor.email_processor import EmailProcessor
+
+    def message(body):
+        msg = EmailMessage()
+        msg["Subject"] = "Claim update"
+        msg.set_content(body)
+        msg.add_related(b"\x89PNG logo", maintype="image", subtype="png", cid="<image001@example>",
+                        disposition="inline", filename="image001.png")
+        return msg
+
+    signed = message("Claim approved.\n\nRegards,\nClaims desk")
+    signed.add_attachment("Policy number HLT-42", filename="notes.txt")
+    signed_path = tmp_path / "signed.eml"
+    signed_path.write_bytes(bytes(signed))
+    scan_path = tmp_path / "scan.eml"
+    scan_path.write_bytes(bytes(message("")))
+
+    assert EmailProcessor().extract_metadata(str(signed_path))["attachment_count"] == 1
+    assert EmailProcessor().extract_metadata(str(scan_path))["attachment_count"] == 1
+
+
+def test_docx_is_read_in_document_order_with_structure(tmp_path, monkeypatch):
+    """Paragraphs and tables keep their order, merged cells appear once and headings tag chunks"""
+    import docx
+    from docx.enum.section import WD_SECTION
+    from src.core.config import Config
+    from src.document_processor.docx_processor import DocxProcessor
+    from src.services.document_service import prepare_document
+
+    path = tmp_path / "schedule.docx"
+    document = docx.Document()
+    document.core_properties.title = "Schedule"
+    document.add_heading("Schedule of benefits", level=1)
+    document.add_paragraph("Limits apply per policy year.")
+    table = document.add_table(rows=3, cols=3)
+    for r, row in enumerate([["Benefit", "Limit", ""], ["Room rent", "1%", "Daily"], ["", "ICU 2%", "Daily"]]):
+        for c, value in enumerate(row):
+            table.cell(r, c).text = value
+    table.cell(0, 1).merge(table.cell(0, 2))
+    table.cell(1, 0).merge(table.cell(2, 0))
+    document.add_paragraph("Sub-limits are listed above.")
+    document.add_section(WD_SECTION.NEW_PAGE)
+    document.add_heading("Exclusions", level=2)
+    document.add_paragraph("Cosmetic surgery is not covered.")
+    document.save(str(path))
+
+    parsed = DocxProcessor().parse(str(path))
+
+    assert parsed.text == (
+        "Schedule of benefits\n"
+        "Limits apply per policy year.\n"
+        "Benefit | Limit\nRoom rent | 1% | Daily\nICU 2% | Daily\n"
+        "Sub-limits are listed above.\n\n"
+        "Exclusions\n"
+        "Cosmetic surgery is not covered."
+    )
+    assert parsed.tables == [[["Benefit", "Limit"], ["Room rent", "1%", "Daily"], ["ICU 2%", "Daily"]]]
+    assert [(h["level"], h["text"]) for h in parsed.headings] == [(1, "Schedule of benefits"), (2, "Exclusions")]
+    assert parsed.text[parsed.headings[1]["start"]:].startswith("Exclusions")
+    assert parsed.section_offsets == [0, parsed.headings[1]["start"] - 2]
+    assert parsed.metadata["title"] == "Schedule"
+    assert parsed.metadata["table_count"] == 1
+    assert "".join(DocxProcessor().iter_segments(str(path))) == parsed.text
+    # Streaming reads the metadata first, which must not parse the body
+    with monkeypatch.context() as patch:
+        patch.setattr(DocxProcessor, "parse", MagicMock(side_effect=AssertionError("full parse")))
+        assert DocxProcessor().extract_metadata(str(path)) == parsed.metadata
+
+    monkeypatch.setattr(Config, "CHUNK_SIZE", 60)
+    monkeypatch.setattr(Config, "CHUNK_OVERLAP", 0)
+    chunks = prepare_document(str(path), "doc-1")
+    exclusions = next(chunk for chunk in chunks if chunk.content.startswith("Exclusions"))
+    assert exclusions.metadata["heading"] == chunks[-1].metadata["heading"] == "Exclusions"
+    assert exclusions.metadata["section"] == 2
+    assert chunks[0].metadata["heading"] == "Schedule of benefits"
+
+
+def test_large_files_are_streamed_in_bounded_batches(tmp_path, fake_vector_store, catalog, monkeypatch):
+    """Streaming ingestion writes batches while the file is still being read"""
+    import asyncio
+    from src.core.config import Config
+    from src.document_processor.text_processor import TextProcessor
+    from src.utils.worker_pools import WorkerPools
+
+    path = tmp_path / "bundle.txt"
+    text = "".join(f"Endorsement {i} extends cover to day care procedures.\n" for i in range(400))
+    path.write_text(text)
+
+    monkeypatch.setattr(Config, "STREAMING_INGESTION_MIN_BYTES", 1)
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_SIZE", 4)
+    monkeypatch.setattr(TextProcessor, "BLOCK_SIZE", 512)
+    events = []
+    read_block = TextProcessor.iter_segments
+    monkeypatch.setattr(TextProcessor, "iter_segments",
+                        lambda self, p: (events.append("read") or block for block in read_block(self, p)))
+    write = fake_vector_store.write_documents.side_effect
+    fake_vector_store.write_documents.side_effect = lambda *a, **kw: events.append("write") or write(*a, **kw)
+
+    service = DocumentService(vector_store=fake_vector_store, catalog=catalog)
+    try:
+        asyncio.run(service.process_document(str(path), document_id="doc-1"))
+    finally:
+        WorkerPools.shutdown()
+
+    written = [chunk for batch in fake_vector_store.written for chunk in batch]
+    expected = TextProcessor().chunk_document(text, "doc-1", Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+    assert [chunk.content for chunk in written] == [chunk.content for chunk in expected]
+    assert all(len(batch) <= 4 for batch in fake_vector_store.written)
+    assert events.index("write") < len(events) - 1 - events[::-1].index("read")
+    fake_vector_store.add_documents.assert_not_called()
+
+
+def test_bulk_ingestion_and_updates_stream_large_files(tmp_path, fake_vector_store, catalog, monkeypatch):
+    """Seeding and updating a large file never extract its full text"""
+    import asyncio
+    from src.core.config import Config
+    from src.document_processor.text_processor import TextProcessor
+    from src.utils.worker_pools import WorkerPools
+
+    path = tmp_path / "bundle.txt"
+    path.write_text("".join(f"Endorsement {i} extends cover to day care procedures.\n" for i in range(200)))
+    monkeypatch.setattr(Config, "STREAMING_INGESTION_MIN_BYTES", 1)
+    monkeypatch.setattr(TextProcessor, "parse", MagicMock(side_effect=AssertionError("full extraction")))
+
+    service = DocumentService(vector_store=fake_vector_store, catalog=catalog)
+    stats = BulkIngestionPipeline(service, workers=1, batch_size=4).run([str(path)])
+    written = [chunk for batch in fake_vector_store.written for chunk in batch]
+    assert stats.files == 1 and not stats.failed_files
+    assert stats.chunks == len(written) > 4
+    assert catalog.stats()["documents"] == 1
+
+    fake_vector_store.get_document_chunks.return_value = [
+        (chunk.chunk_id, chunk.content, chunk.metadata) for chunk in written
+    ]
+    try:
+        summary = asyncio.run(service.update_document(str(path), written[0].metadata["document_id"]))
+    finally:
+        WorkerPools.shutdown()
+    assert summary == {"added": 0, "removed": 0, "unchanged": len(written)}
+
+
+def test_chunker_respects_token_limit_when_streaming():
+    """Chunks never exceed the token cap, however the text is segmented"""
+    import re
+    from src.document_processor.chunker import TextChunker
+
+    text = "".join(f"Clause {i}: co-payment of 10% applies to claims above Rs. 50,000.\n" for i in range(2000))
+    segments = [text[i:i + 3001] for i in range(0, len(text), 3001)]
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200, max_tokens=60)
+
+    whole = list(chunker.iter_records([text]))
+    streamed = list(chunker.iter_records(segments))
+
+    assert [(r.start, r.end, r.text) for r in whole] == [(r.start, r.end, r.text) for r in streamed]
+    assert max(len(re.findall(r"\w+|[^\w\s]", r.text)) for r in whole) <= 60
+    assert whole[-1].text.endswith("Clause 1999: co-payment of 10% applies to claims above Rs. 50,000.")
+    assert [r.index for r in whole] == list(range(len(whole)))
+
+
+def test_token_cap_that_never_binds_keeps_uncapped_chunk_boundaries():
+    """With the default token cap, prose chunks exactly as it would uncapped and stays under the cap"""
+    import re
+    from src.document_processor.chunker import TextChunker
+
+    clause = ("The insured person is entitled to reimbursement of reasonable and customary charges incurred for "
+              "hospitalisation, subject to the sum insured and the waiting periods described in the schedule. "
+              "Pre-existing conditions are covered after thirty six months of continuous coverage.\n\n")
+    text = clause * (1_000_000 // len(clause))
+
+    expected = list(TextChunker(chunk_size=1000, chunk_overlap=200).iter_records([text]))
+    records = list(TextChunker(chunk_size=1000, chunk_overlap=200, max_tokens=250).iter_records([text]))
+    assert [(r.start, r.end) for r in records] == [(r.start, r.end) for r in expected]
+    assert max(len(re.findall(r"\w+|[^\w\s]", r.text)) for r in records) <= 250
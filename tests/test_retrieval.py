@@ -0,0 +1,171 @@
+"""
+Lexical retrieval tests
+"""
+import pytest
+from unittest.mock import MagicMock
+
+from src.retrieval.bm25_index import BM25Index
+from src.retrieval.hybrid_search import HybridSearcher
+
+
+@pytest.fixture
+def corpus():
+    return [
+        ("doc1_chunk_0", "doc1", "Cosmetic surgery is excluded from coverage."),
+        ("doc1_chunk_1", "doc1", "Knee surgery is covered after a waiting period of two years."),
+        ("doc2_chunk_0", "doc2", "Maternity benefits are covered up to the sum insured."),
+        ("doc2_chunk_1", "doc2", "Dental treatment is not covered unless caused by an accident."),
+    ]
+
+
+def test_bm25_index_ranks_matching_chunks(corpus):
+    """Only chunks sharing a term with the query are returned, best first"""
+    index = BM25Index()
+    index.add(corpus)
+
+    hits = index.search("knee surgery", top_k=5)
+    assert [chunk_id for chunk_id, _ in hits] == ["doc1_chunk_1", "doc1_chunk_0"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_bm25_index_document_filter_and_removal(corpus):
+    """Filters restrict hits to documents and removal updates postings and stats"""
+    index = BM25Index()
+    index.add(corpus)
+
+    hits = index.search("covered", top_k=5, document_ids=["doc2"])
+    assert {chunk_id for chunk_id, _ in hits} == {"doc2_chunk_0", "doc2_chunk_1"}
+
+    assert index.remove_document("doc2") == 2
+    assert index.chunk_count == 2
+    assert index.document_frequency("maternity") == 0
+    assert index.search("maternity", top_k=5) == []
+
+
+def test_bm25_index_persists_across_instances(tmp_path, corpus):
+    """Changes are written as they are made and reload with identical rankings"""
+    path = str(tmp_path / "bm25_index.db")
+    index = BM25Index(path)
+    index.add(corpus)
+
+    reloaded = BM25Index(path)
+    reloaded.refresh()
+    assert reloaded.chunk_count == len(corpus)
+    assert reloaded.search("surgery covered", top_k=3) == index.search("surgery covered", top_k=3)
+
+
+def test_bm25_index_writers_sharing_a_file_keep_each_others_changes(tmp_path, corpus, monkeypatch):
+    """Each writer applies the others' changes before its own, so no update is lost"""
+    path = str(tmp_path / "bm25_index.db")
+    app, seeder = BM25Index(path), BM25Index(path)
+
+    app.add(corpus[:2])
+    seeder.add(corpus[2:])
+    app.remove_chunks(["doc2_chunk_1"])
+    seeder.add([("doc1_chunk_0", "doc1", "Cosmetic surgery is covered after an accident.")])
+
+    fresh = BM25Index(path)
+    fresh.refresh()
+    for index in (app, seeder, fresh):
+        assert index.chunk_count == 3
+        assert index.search("dental", top_k=5) == []
+        assert index.search("accident surgery", top_k=5) == fresh.search("accident surgery", top_k=5)
+    assert fresh.search("accident", top_k=1)[0][0] == "doc1_chunk_0"
+
+    # A reader that fell behind the pruned change log reloads instead
+    monkeypatch.setattr(BM25Index, "LOG_RETENTION", 1)
+    for i in range(5):
+        seeder.add([(f"doc3_chunk_{i}", "doc3", "Room rent is capped.")])
+    assert seeder._log_floor(seeder._conn) > app._last_seq
+    assert app.search("rent", top_k=10) == seeder.search("rent", top_k=10)
+    assert app.chunk_count == 8
+
+
+def test_hybrid_bm25_search_uses_index(corpus):
+    """Lexical search only fetches the winning chunks from the collection"""
+    index = BM25Index()
+    index.add(corpus)
+    vector_store = MagicMock()
+    vector_store.lexical_index = index
+    vector_store.collection.get.return_value = {
+        "ids": ["doc1_chunk_1"],
+        "documents": [corpus[1][2]],
+        "metadatas": [{"document_id": "doc1"}],
+    }
+
+    results = HybridSearcher(vector_store=vector_store)._bm25_search("knee", top_k=2)
+    vector_store.collection.get.assert_called_once()
+    assert vector_store.collection.get.call_args.kwargs["ids"] == ["doc1_chunk_1"]
+    assert results[0].chunk_id == "doc1_chunk_1"
+    assert results[0].similarity_score == 1.0
+
+
+def test_block_max_wand_matches_exhaustive_ranking():
+    """Dynamic pruning returns exactly the exhaustive BM25 top-k"""
+    import random
+
+    rng = random.Random(7)
+    vocabulary = ["policy", "claim", "surgery", "hospital", "room", "rent", "waiting",
+                  "period", "cashless", "network", "exclusion", "maternity", "dental"]
+    # Skewed term distribution so common terms span many postings blocks
+    weights = [40, 30, 10, 25, 5, 5, 8, 8, 6, 6, 3, 2, 1]
+    index = BM25Index()
+    index.add(
+        (f"doc{i % 7}_chunk_{i}", f"doc{i % 7}",
+         " ".join(rng.choices(vocabulary, weights=weights, k=rng.randint(3, 40))))
+        for i in range(1500)
+    )
+    index.remove_document("doc3")
+
+    for query in ["policy claim", "room rent", "dental exclusion policy", "claim claim hospital"]:
+        for top_k in (1, 5, 20):
+            for document_ids in (None, ["doc1", "doc5"]):
+                assert index.search(query, top_k, document_ids) == \
+                    index.search_exhaustive(query, top_k, document_ids)
+
+
+def test_query_embedding_cache_lru_and_spill(tmp_path):
+    """The cache normalizes keys, evicts by byte budget and serves spilled entries"""
+    from src.retrieval.embedding_cache import QueryEmbeddingCache
+
+    vector = [0.25] * 384
+    entry_size = len("query 0") + 4 * 384 + QueryEmbeddingCache.ENTRY_OVERHEAD
+    cache = QueryEmbeddingCache(max_bytes=entry_size * 2, spill_path=str(tmp_path / "spill.db"))
+
+    assert cache.get("Query 0", "model") is None
+    cache.put("  query   0 ", "model", vector)
+    assert cache.get("QUERY 0", "model") == vector
+    assert cache.get("query 0", "other-model") is None
+
+    cache.put("query 1", "model", vector)
+    cache.put("query 2", "model", vector)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+    # Evicted entry comes back from the on-disk spill
+    assert cache.get("query 0", "model") == vector
+    stats = cache.stats()
+    assert stats["spill_hits"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 2
+
+
+def test_chunk_embeddings_are_reused_by_content(tmp_path):
+    """Only chunk texts without a cached embedding reach the model"""
+    import unittest.mock
+    from src.core.config import Config
+    from src.retrieval.vector_store import VectorStore
+
+    store = VectorStore()
+    store.embedding_model = MagicMock()
+    store.embedding_model.encode.side_effect = lambda texts: MagicMock(
+        tolist=lambda: [[float(len(t))] * 3 for t in texts]
+    )
+    with unittest.mock.patch.object(Config, "EMBEDDING_CACHE_PATH", str(tmp_path / "cache.db")):
+        first = store._embed_chunks(["room rent cap", "co-payment 10%", "room rent cap"])
+        second = store._embed_chunks(["co-payment 10%", "ambulance cover"])
+
+    assert first[0] == first[2] == [13.0] * 3
+    assert second == [[14.0] * 3, [15.0] * 3]
+    encoded = [call.args[0] for call in store.embedding_model.encode.call_args_list]
+    assert encoded == [["room rent cap", "co-payment 10%"], ["ambulance cover"]]